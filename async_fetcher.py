@@ -0,0 +1,299 @@
+"""
+Async HTTP Fetch Engine
+Concurrent fetching for the multi-source collectors with a shared session,
+per-provider concurrency limits, token-bucket rate limiting and retries
+with exponential backoff and jitter
+"""
+
+import asyncio
+import logging
+import queue
+import random
+import threading
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Per-provider limits: max in-flight requests, sustained requests/second and burst size
+DEFAULT_PROVIDER_LIMITS = {
+    'openweather': {'concurrency': 10, 'rate': 1.0, 'burst': 60},  # free tier: 60 calls/min
+    'iqair': {'concurrency': 2, 'rate': 1.0, 'burst': 10},
+    'cpcb': {'concurrency': 4, 'rate': 2.0, 'burst': 10},
+}
+
+# Status codes worth retrying; everything else is returned to the caller as-is
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate, capacity):
+        if rate <= 0 or capacity < 1:
+            raise ValueError(f"Invalid token bucket: rate={rate}, capacity={capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class _Provider:
+    """Concurrency and rate limits for a single upstream API"""
+
+    def __init__(self, name, concurrency, rate, burst):
+        self.name = name
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+
+
+class AsyncFetchEngine:
+    """
+    Shared aiohttp session with per-provider limits and retries.
+
+    Usage:
+        async with AsyncFetchEngine() as engine:
+            data = await engine.get_json('openweather', url, params)
+    """
+
+    def __init__(self, provider_limits=None, max_retries=3, backoff_base=0.5,
+                 backoff_max=10.0, timeout=10, max_connections=50):
+        self.provider_limits = dict(DEFAULT_PROVIDER_LIMITS)
+        self.provider_limits.update(provider_limits or {})
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        self._session = None
+        self._providers = {}
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._session.close()
+        self._session = None
+
+    def _get_provider(self, name):
+        provider = self._providers.get(name)
+        if provider is None:
+            limits = self.provider_limits.get(name, {'concurrency': 5, 'rate': 5.0, 'burst': 5})
+            provider = _Provider(name, limits['concurrency'], limits['rate'], limits['burst'])
+            self._providers[name] = provider
+        return provider
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """Exponential backoff with full jitter, honouring Retry-After when given"""
+        if retry_after is not None:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def get_json(self, provider_name, url, params=None, timeout=None):
+        """
+        GET a JSON document through the named provider's limits.
+
+        Returns (status_code, data). `data` is None for non-200 responses;
+        `status_code` is None if every attempt failed at the transport level.
+        """
+        provider = self._get_provider(provider_name)
+        # Only override the session's ClientTimeout when a per-call value is given;
+        # passing timeout=None would disable the timeout altogether
+        request_kwargs = {'timeout': aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with provider.semaphore:
+                await provider.bucket.acquire()
+                try:
+                    async with self._session.get(url, params=params, **request_kwargs) as response:
+                        if response.status == 200:
+                            return response.status, await response.json(content_type=None)
+
+                        if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                            logger.warning(f"{provider_name}: HTTP {response.status} from {url}")
+                            return response.status, None
+
+                        retry_after = response.headers.get('Retry-After')
+                        reason = f"HTTP {response.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    if attempt == self.max_retries:
+                        logger.warning(f"{provider_name}: giving up on {url}: {e!r}")
+                        return None, None
+                    reason = repr(e)
+
+            delay = self._backoff_delay(attempt, retry_after)
+            logger.info(f"{provider_name}: {reason}, retrying in {delay:.2f}s "
+                        f"(attempt {attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+        return None, None
+
+
+def fetch_all(requests, provider_limits=None, **engine_kwargs):
+    """
+    Run a batch of GET requests concurrently from synchronous code.
+
+    `requests` is an iterable of (key, provider, url, params) tuples. Returns
+    a dict mapping each key to its (status_code, data) result.
+    """
+    requests = list(requests)
+
+    async def _run():
+        async with AsyncFetchEngine(provider_limits, **engine_kwargs) as engine:
+            results = await asyncio.gather(*(
+                engine.get_json(provider, url, params)
+                for _, provider, url, params in requests
+            ))
+        return {key: result for (key, _, _, _), result in zip(requests, results)}
+
+    return asyncio.run(_run())
+
+
+async def iter_pages(engine, provider_name, url, params=None, page_size=1000,
+                     max_parallel=4, records_key='records', total_key='total'):
+    """
+    Async generator over the record pages of an offset/limit paginated API.
+
+    The first page is fetched alone to discover the total record count; the
+    remaining pages are fetched with at most `max_parallel` in flight and
+    yielded in completion order as soon as each one arrives. Responses
+    without a usable total are paged sequentially until a short page.
+    """
+    params = dict(params or {})
+
+    async def fetch_page(offset):
+        return offset, await engine.get_json(
+            provider_name, url, {**params, 'limit': page_size, 'offset': offset}
+        )
+
+    _, (status, data) = await fetch_page(0)
+    if data is None:
+        logger.warning(f"{provider_name}: first page failed (HTTP {status}), nothing fetched")
+        return
+
+    try:
+        total = int(data[total_key])
+    except (KeyError, TypeError, ValueError):
+        total = None
+    records = data.get(records_key) or []
+    del data
+    
+    if total is None:
+        # Without a total the page count is unknown: page sequentially until
+        # a short or empty page (or a failed one) marks the end
+        logger.warning(f"{provider_name}: response has no usable '{total_key}', paging sequentially")
+        offset = 0
+        while records:
+            yield records
+            if len(records) < page_size:
+                return
+            offset += page_size
+            _, (status, data) = await fetch_page(offset)
+            if data is None:
+                logger.warning(f"{provider_name}: page at offset {offset} failed (HTTP {status}), stopping")
+                return
+            records = data.get(records_key) or []
+        return
+    
+    logger.info(f"{provider_name}: {total} records in {max(1, -(-total // page_size))} pages")
+    yield records
+    del records
+
+    offsets = iter(range(page_size, total, page_size))
+    pending = {asyncio.ensure_future(fetch_page(offset))
+               for offset in (next(offsets, None) for _ in range(max_parallel))
+               if offset is not None}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                offset, (status, data) = task.result()
+
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    pending.add(asyncio.ensure_future(fetch_page(next_offset)))
+
+                if data is None:
+                    logger.warning(f"{provider_name}: page at offset {offset} failed (HTTP {status})")
+                    continue
+                yield data.get(records_key) or []
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def stream_paginated_records(provider_name, url, params=None, page_size=1000, max_parallel=4,
+                             provider_limits=None, **engine_kwargs):
+    """
+    Iterate over every record of a paginated API from synchronous code.
+
+    Pages are downloaded concurrently on a background event loop and handed
+    over through a bounded queue, so at most a few pages are held in memory
+    while the caller consumes records (e.g. streaming them into COPY).
+    """
+    pages = queue.Queue(maxsize=max_parallel * 2)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def produce():
+        async with AsyncFetchEngine(provider_limits, **engine_kwargs) as engine:
+            async for page in iter_pages(engine, provider_name, url, params,
+                                         page_size=page_size, max_parallel=max_parallel):
+                if not await asyncio.to_thread(put, page):
+                    return
+
+    def run():
+        try:
+            asyncio.run(produce())
+        except BaseException as e:
+            put(e)
+        else:
+            put(done)
+
+    worker = threading.Thread(target=run, name=f"{provider_name}-pager", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield from item
+    finally:
+        stop.set()
+        worker.join(timeout=5)
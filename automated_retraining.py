@@ -15,10 +15,12 @@ from pathlib import Path
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import joblib
-from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+import xgboost as xgb
+from feature_cache import FeatureMatrixCache, fingerprint_source
+from training_orchestrator import train_in_parallel
 
 # Setup logging
 logging.basicConfig(
@@ -37,12 +39,124 @@ MODEL_PATH = Path(os.getenv('MODEL_PATH', './models'))
 RETRAIN_INTERVAL_HOURS = int(os.getenv('RETRAIN_INTERVAL_HOURS', '24'))
 MIN_NEW_SAMPLES = int(os.getenv('MIN_NEW_SAMPLES', '100'))
 PERFORMANCE_THRESHOLD = float(os.getenv('PERFORMANCE_THRESHOLD', '0.1'))  # 10% degradation triggers retrain
+FEATURE_CACHE_DIR = os.getenv('FEATURE_CACHE_DIR', './feature_cache')
+MAX_TRAINING_ROWS = int(os.getenv('MAX_TRAINING_ROWS', '500000'))  # most recent rows used by full refits
+BOOST_ROUNDS_PER_UPDATE = int(os.getenv('BOOST_ROUNDS_PER_UPDATE', '20'))  # trees added per incremental run
+FULL_RETRAIN_EVERY = int(os.getenv('FULL_RETRAIN_EVERY', '7'))  # incremental runs between full rebuilds
+TEST_FRACTION = 0.2  # newest share of the training window held out for scoring
+
+# Boosted models are continued on new rows between full rebuilds
+BOOSTED_MODELS = ('gradient_boosting', 'xgboost')
+
+FEATURE_COLUMNS = [
+    'pm25', 'pm10', 'no2', 'so2', 'co', 'o3',
+    'temperature', 'humidity', 'wind_speed',
+    'hour', 'day_of_week', 'month',
+    'latitude', 'longitude'
+]
+
+# Inputs imputed with the training data's median when missing
+FILL_COLUMNS = ['pm10', 'no2', 'so2', 'co', 'o3', 'temperature', 'humidity', 'wind_speed']
 
 # Ensure directories exist
 MODEL_PATH.mkdir(exist_ok=True)
 Path('logs').mkdir(exist_ok=True)
 
 
+MODEL_NAMES = ('linear_regression', 'random_forest', 'gradient_boosting', 'xgboost')
+
+# Estimators that use more than one thread (given a share of the CPU budget)
+PARALLEL_MODELS = ('random_forest', 'xgboost')
+
+
+def build_model(name, n_jobs=1):
+    """Untrained estimator for a model name"""
+    if name == 'linear_regression':
+        return LinearRegression()
+    if name == 'random_forest':
+        return RandomForestRegressor(
+            n_estimators=100,
+            max_depth=20,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+    if name == 'gradient_boosting':
+        return GradientBoostingRegressor(
+            n_estimators=100,
+            max_depth=10,
+            learning_rate=0.1,
+            random_state=42
+        )
+    if name == 'xgboost':
+        return xgb.XGBRegressor(
+            n_estimators=100,
+            max_depth=6,
+            learning_rate=0.1,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+    raise ValueError(f"Unknown model: {name}")
+
+
+def fit_retraining_model(arrays, n_threads, name, feature_names, previous_path=None):
+    """
+    Train one model in a worker process (arrays are shared-memory views).
+    Boosted models continue from `previous_path` on X_boost when given.
+    """
+    def frame(key):
+        return pd.DataFrame(arrays[key], columns=feature_names, copy=False)
+    
+    X_train, y_train = frame('X_train'), arrays['y_train']
+    X_test, y_test = frame('X_test'), arrays['y_test']
+    
+    model = build_model(name, n_jobs=n_threads)
+    previous = None
+    if previous_path and 'X_boost' in arrays:
+        try:
+            previous = joblib.load(previous_path)
+        except Exception as e:
+            # Corrupt or incompatible pickle: fall back to a full fit
+            logger.warning(f"Could not load previous {name} model: {e}")
+    mode = 'full'
+    
+    # Train model
+    start_time = time.time()
+    if isinstance(previous, GradientBoostingRegressor):
+        model = previous
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + BOOST_ROUNDS_PER_UPDATE)
+        model.fit(frame('X_boost'), arrays['y_boost'])
+        mode = 'incremental'
+    elif isinstance(previous, xgb.XGBRegressor):
+        model.set_params(n_estimators=BOOST_ROUNDS_PER_UPDATE)
+        model.fit(frame('X_boost'), arrays['y_boost'], xgb_model=previous.get_booster())
+        mode = 'incremental'
+    else:
+        model.fit(X_train, y_train)
+    training_time = time.time() - start_time
+    
+    # Predictions
+    y_pred_train = model.predict(X_train)
+    y_pred_test = model.predict(X_test)
+    
+    # Metrics
+    metrics = {
+        'train_rmse': float(np.sqrt(mean_squared_error(y_train, y_pred_train))),
+        'test_rmse': float(np.sqrt(mean_squared_error(y_test, y_pred_test))),
+        'train_mae': float(mean_absolute_error(y_train, y_pred_train)),
+        'test_mae': float(mean_absolute_error(y_test, y_pred_test)),
+        'train_r2': float(r2_score(y_train, y_pred_train)),
+        'test_r2': float(r2_score(y_test, y_pred_test)),
+        'training_time': training_time,
+        'training_samples': len(arrays['X_boost']) if mode == 'incremental' else len(X_train),
+        'test_samples': len(X_test),
+        'training_mode': mode
+    }
+    
+    return model, metrics
+
+
 class ModelRetrainer:
     """Automated model retraining pipeline"""
     
@@ -53,6 +167,7 @@ class ModelRetrainer:
         self.metrics_path = MODEL_PATH / 'metrics.json'
         self.models = {}
         self.metadata = self.load_metadata()
+        self.feature_cache = FeatureMatrixCache(FEATURE_CACHE_DIR)
         
     def load_metadata(self):
         """Load training metadata"""
@@ -63,6 +178,7 @@ class ModelRetrainer:
             'last_training_time': None,
             'last_data_timestamp': None,
             'training_samples': 0,
+            'incremental_runs': 0,
             'model_versions': {}
         }
     
@@ -129,14 +245,20 @@ class ModelRetrainer:
             logger.error(f"Error checking new data: {e}")
             return False, 0
     
-    def fetch_training_data(self):
-        """Fetch data from database for training"""
+    def fetch_training_data(self, after_id=None):
+        """
+        Fetch data from database for training, in id order (only rows with
+        an id above `after_id` if given). Missing inputs are left as NaN;
+        see fill_missing_values.
+        """
+        since = after_id is not None
         try:
-            logger.info("Fetching training data from database...")
+            logger.info(f"Fetching training data from database{f' after id {after_id}' if since else ''}...")
             conn = self.get_db_connection()
             
             query = """
                 SELECT 
+                    aqd.id,
                     aqd.pm25,
                     aqd.pm10,
                     aqd.no2,
@@ -155,13 +277,17 @@ class ModelRetrainer:
                 JOIN stations s ON aqd.station_id = s.station_id
                 WHERE aqd.pm25 IS NOT NULL 
                   AND aqd.aqi IS NOT NULL
-                ORDER BY aqd.timestamp DESC
-            """
+                  {since_filter}
+                ORDER BY aqd.id
+            """.format(since_filter='AND aqd.id > %(after_id)s' if since else '')
             
-            df = pd.read_sql_query(query, conn)
+            df = pd.read_sql_query(query, conn, params={'after_id': after_id} if since else None)
             conn.close()
             
             if df.empty:
+                if since:
+                    logger.info("No new rows since the cached feature matrix")
+                    return df
                 logger.error("No data retrieved from database")
                 return None
             
@@ -173,30 +299,30 @@ class ModelRetrainer:
             df['day_of_week'] = df['timestamp'].dt.dayofweek
             df['month'] = df['timestamp'].dt.month
             
-            # Fill missing values with median
-            numeric_cols = ['pm10', 'no2', 'so2', 'co', 'o3', 'temperature', 
-                          'humidity', 'wind_speed']
-            for col in numeric_cols:
-                if col in df.columns:
-                    df[col].fillna(df[col].median(), inplace=True)
-            
             return df
             
         except Exception as e:
             logger.error(f"Error fetching training data: {e}")
             return None
     
+    @staticmethod
+    def fill_missing_values(df, fill_values=None):
+        """
+        Fill missing inputs in place, with `fill_values` when given (so rows
+        appended to the cache are imputed like the rows already in it) or
+        with this batch's medians. Returns the values used.
+        """
+        if fill_values is None:
+            fill_values = {col: float(df[col].median()) for col in FILL_COLUMNS if col in df.columns}
+        for col, value in fill_values.items():
+            if col in df.columns:
+                df[col] = df[col].fillna(value)
+        return fill_values
+    
     def prepare_features(self, df):
         """Prepare features and target for training"""
-        feature_columns = [
-            'pm25', 'pm10', 'no2', 'so2', 'co', 'o3',
-            'temperature', 'humidity', 'wind_speed',
-            'hour', 'day_of_week', 'month',
-            'latitude', 'longitude'
-        ]
-        
         # Ensure all feature columns exist
-        available_features = [col for col in feature_columns if col in df.columns]
+        available_features = [col for col in FEATURE_COLUMNS if col in df.columns]
         
         X = df[available_features].copy()
         y = df['aqi'].copy()
@@ -208,63 +334,97 @@ class ModelRetrainer:
         
         return X, y, available_features
     
-    def train_models(self, X_train, y_train, X_test, y_test):
-        """Train multiple models"""
-        models_config = {
-            'linear_regression': LinearRegression(),
-            'random_forest': RandomForestRegressor(
-                n_estimators=100,
-                max_depth=20,
-                min_samples_split=5,
-                min_samples_leaf=2,
-                random_state=42,
-                n_jobs=-1
-            ),
-            'gradient_boosting': GradientBoostingRegressor(
-                n_estimators=100,
-                max_depth=10,
-                learning_rate=0.1,
-                random_state=42
+    def load_training_matrix(self, refresh=False):
+        """
+        Feature matrix from the memory-mapped cache, extended with rows whose
+        id is above the cache's watermark; only those rows are fetched and
+        featurized. Ids are monotonic, so rows written late for an earlier
+        hour are still picked up. With `refresh` the cache is rebuilt from
+        every row (also picking up rows updated in place).
+        Returns (X, y, timestamps, feature_names, cache_meta) or None, rows in
+        id order; cache_meta is None when the cache was bypassed.
+        """
+        source_hash = fingerprint_source(f"{self.db_url}|{FEATURE_COLUMNS}")
+        cached = None if refresh else self.feature_cache.load('retraining', FEATURE_COLUMNS, 'aqi', source_hash)
+        
+        after_id = None
+        if cached is not None:
+            after_id = cached[3].get('watermark')
+            if after_id is None:
+                # Entry predates id watermarks: rebuild it
+                cached = None
+            else:
+                logger.info(f"Feature cache has {cached[3]['rows']} rows up to id {after_id}")
+        
+        df = self.fetch_training_data(after_id=after_id)
+        if df is None:
+            return None
+        
+        if len(df):
+            fill_values = None
+            if after_id is not None:
+                fill_values = cached[3].get('fill_values')
+                if fill_values is None:
+                    # Entry predates stored fill values: use the cached rows' medians
+                    fill_values = {col: float(np.median(cached[0][:, FEATURE_COLUMNS.index(col)]))
+                                   for col in FILL_COLUMNS}
+            fill_values = self.fill_missing_values(df, fill_values)
+            X_new, y_new, feature_names = self.prepare_features(df)
+            if feature_names != FEATURE_COLUMNS:
+                # Schema without some features: train on this fetch, bypassing the cache
+                logger.warning(f"Missing features {set(FEATURE_COLUMNS) - set(feature_names)}; feature cache not used")
+                return (X_new.reset_index(drop=True), y_new.reset_index(drop=True),
+                        pd.to_datetime(df.loc[X_new.index, 'timestamp']).to_numpy(), feature_names, None)
+            
+            write = self.feature_cache.store if after_id is None else self.feature_cache.append
+            cached = write(
+                'retraining', X_new.to_numpy(), y_new.to_numpy(), df.loc[X_new.index, 'timestamp'],
+                FEATURE_COLUMNS, 'aqi', source_hash, fill_values=fill_values,
+                watermark=int(df['id'].max())
             )
+            logger.info(f"{'Cached' if after_id is None else 'Appended'} {len(X_new)} rows in the feature cache")
+        
+        if cached is None:
+            return None
+        
+        X, y, timestamps, meta = cached
+        return (pd.DataFrame(X, columns=FEATURE_COLUMNS, copy=False),
+                pd.Series(y, name='aqi', copy=False), timestamps, list(FEATURE_COLUMNS), meta)
+    
+    def train_models(self, X_train, y_train, X_test, y_test, X_boost=None, y_boost=None):
+        """
+        Train all models in parallel worker processes (see training_orchestrator).
+        With X_boost/y_boost (incremental run), boosted models that were
+        trained before add BOOST_ROUNDS_PER_UPDATE trees fitted on those new
+        rows instead of being rebuilt; other models are refit on X_train.
+        """
+        feature_names = list(X_train.columns)
+        arrays = {
+            'X_train': X_train.to_numpy(dtype=np.float64),
+            'y_train': y_train.to_numpy(dtype=np.float64),
+            'X_test': X_test.to_numpy(dtype=np.float64),
+            'y_test': y_test.to_numpy(dtype=np.float64)
         }
+        if X_boost is not None:
+            arrays['X_boost'] = X_boost.to_numpy(dtype=np.float64)
+            arrays['y_boost'] = y_boost.to_numpy(dtype=np.float64)
         
-        results = {}
+        tasks = {}
+        for name in MODEL_NAMES:
+            previous_path = None
+            if X_boost is not None and name in BOOSTED_MODELS:
+                model_file = self.model_path / f'{name}_model.pkl'
+                previous_path = str(model_file) if model_file.exists() else None
+            tasks[name] = (fit_retraining_model, name in PARALLEL_MODELS,
+                           {'name': name, 'feature_names': feature_names, 'previous_path': previous_path})
         
-        for name, model in models_config.items():
-            try:
-                logger.info(f"Training {name}...")
-                
-                # Train model
-                start_time = time.time()
-                model.fit(X_train, y_train)
-                training_time = time.time() - start_time
-                
-                # Predictions
-                y_pred_train = model.predict(X_train)
-                y_pred_test = model.predict(X_test)
-                
-                # Metrics
-                metrics = {
-                    'train_rmse': float(np.sqrt(mean_squared_error(y_train, y_pred_train))),
-                    'test_rmse': float(np.sqrt(mean_squared_error(y_test, y_pred_test))),
-                    'train_mae': float(mean_absolute_error(y_train, y_pred_train)),
-                    'test_mae': float(mean_absolute_error(y_test, y_pred_test)),
-                    'train_r2': float(r2_score(y_train, y_pred_train)),
-                    'test_r2': float(r2_score(y_test, y_pred_test)),
-                    'training_time': training_time,
-                    'training_samples': len(X_train),
-                    'test_samples': len(X_test)
-                }
-                
-                logger.info(f"{name} - Test RMSE: {metrics['test_rmse']:.2f}, R²: {metrics['test_r2']:.4f}")
-                
-                results[name] = {
-                    'model': model,
-                    'metrics': metrics
-                }
-                
-            except Exception as e:
-                logger.error(f"Error training {name}: {e}")
+        results = {}
+        for name, (model, metrics) in train_in_parallel(arrays, tasks).items():
+            logger.info(f"{name} - Test RMSE: {metrics['test_rmse']:.2f}, R²: {metrics['test_r2']:.4f}")
+            results[name] = {
+                'model': model,
+                'metrics': metrics
+            }
         
         return results
     
@@ -336,23 +496,62 @@ class ModelRetrainer:
             
             logger.info(f"Retraining triggered - New samples: {new_samples}, Time-based: {needs_retrain}")
             
-            # Fetch data
-            df = self.fetch_training_data()
-            if df is None or len(df) < 100:
+            # Boosted models continue on new rows unless a periodic full
+            # rebuild is due; full rebuilds also rebuild the feature cache
+            trained_rows = self.metadata.get('trained_rows')
+            incremental = (
+                trained_rows is not None
+                and self.metadata.get('incremental_runs', 0) < FULL_RETRAIN_EVERY
+            )
+            
+            # Fetch data (new rows only) and map the cached feature matrix
+            training_matrix = self.load_training_matrix(refresh=not incremental)
+            if training_matrix is None or len(training_matrix[0]) < 100:
                 logger.error("Insufficient data for training")
                 return False
             
-            # Prepare features
-            X, y, feature_names = self.prepare_features(df)
+            X, y, timestamps, feature_names, cache_meta = training_matrix
             logger.info(f"Prepared {len(X)} samples with {len(feature_names)} features")
             
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42
+            # The cache is append-only, so rows past the count trained on last
+            # time are new, as long as it is still the same cache entry
+            cache_created_at = cache_meta['created_at'] if cache_meta else None
+            first_new = trained_rows or 0
+            incremental = (
+                incremental
+                and cache_created_at is not None
+                and cache_created_at == self.metadata.get('cache_created_at')
+                and first_new < len(X)
             )
             
+            # Full refits use the most recent MAX_TRAINING_ROWS rows; the newest
+            # TEST_FRACTION of them is held out in time order, so every model
+            # (full or continued) is scored on rows it has never been fitted on
+            window_start = max(0, len(X) - MAX_TRAINING_ROWS)
+            holdout_start = len(X) - max(1, int((len(X) - window_start) * TEST_FRACTION))
+            train_idx = np.arange(window_start, holdout_start)
+            test_idx = np.arange(holdout_start, len(X))
+            
+            X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
+            y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
+            
+            X_boost = y_boost = None
+            if incremental:
+                # Boost on every row the previous models have not been fitted
+                # on: the last run's holdout plus new rows outside this one
+                first_unseen = min(first_new, self.metadata.get('holdout_start_row', first_new))
+                boost_idx = np.arange(first_unseen, holdout_start)
+                if len(boost_idx) == 0:
+                    logger.info("No unseen rows outside the holdout; full rebuild instead")
+                    incremental = False
+            if incremental:
+                X_boost, y_boost = X.iloc[boost_idx], y.iloc[boost_idx]
+                logger.info(f"Incremental run: {len(X) - first_new} new rows since the last training")
+            else:
+                logger.info("Full rebuild of all models")
+            
             # Train models
-            results = self.train_models(X_train, y_train, X_test, y_test)
+            results = self.train_models(X_train, y_train, X_test, y_test, X_boost, y_boost)
             
             if not results:
                 logger.error("No models were successfully trained")
@@ -362,8 +561,12 @@ class ModelRetrainer:
             self.save_models(results, feature_names)
             
             # Update metadata with latest data timestamp
-            self.metadata['last_data_timestamp'] = df['timestamp'].max().isoformat()
+            self.metadata['last_data_timestamp'] = pd.Timestamp(timestamps.max()).isoformat()
             self.metadata['training_samples'] = len(X)
+            self.metadata['holdout_start_row'] = int(holdout_start)
+            self.metadata['trained_rows'] = len(X)
+            self.metadata['cache_created_at'] = cache_created_at
+            self.metadata['incremental_runs'] = self.metadata.get('incremental_runs', 0) + 1 if incremental else 0
             self.save_metadata()
             
             logger.info("=" * 80)
@@ -58,20 +58,12 @@ def generate_predictions():
                 metrics = engine.evaluate_model(X_test, y_test)
                 engine.save_model(metrics)
         
-        # Generate predictions for all cities
-        cities = [
-            'Delhi', 'Mumbai', 'Bangalore', 'Chennai', 'Kolkata',
-            'Hyderabad', 'Pune', 'Ahmedabad', 'Jaipur', 'Lucknow'
-        ]
-        
-        for city in cities:
-            logger.info(f"Generating predictions for {city}...")
-            predictions = engine.predict_future(city, hours_ahead=48)
-            if predictions:
-                engine.store_predictions(predictions)
-                logger.info(f"  ✓ Stored {len(predictions)} predictions")
-            else:
-                logger.warning(f"  ✗ No predictions generated for {city}")
+        # Generate predictions for every city with recent data in one batch
+        predictions = engine.forecast_all_cities(hours_ahead=48)
+        if predictions:
+            logger.info(f"  ✓ Stored {len(predictions)} predictions")
+        else:
+            logger.warning("  ✗ No predictions generated (no recent data)")
         
         logger.info("="*70)
         logger.info("PREDICTION GENERATION COMPLETED")
@@ -88,16 +80,13 @@ def retrain_models():
         logger.info("MODEL RETRAINING STARTED")
         logger.info("="*70)
         
-        # Train all model types
+        # Train all model types in parallel from a single fetch of the training data
         model_types = ['xgboost', 'random_forest', 'linear']
+        engine = AQIPredictionEngine()
+        metrics = engine.train_all_models(model_types)
         
         for model_type in model_types:
-            logger.info(f"\nRetraining {model_type} model...")
-            engine = AQIPredictionEngine(model_type=model_type)
-            
-            success = engine.auto_retrain(retrain_threshold_days=7)
-            
-            if success:
+            if model_type in metrics:
                 logger.info(f"✓ {model_type} model retrained successfully")
             else:
                 logger.warning(f"✗ {model_type} model retraining skipped")
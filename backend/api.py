@@ -3,21 +3,27 @@ Air Quality Monitoring System - Flask REST API
 Production-ready backend with ML predictions, data retrieval, and analytics
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import os
+import json
 import logging
 import pickle
 import numpy as np
 import pandas as pd
 from functools import wraps
 import traceback
+from itertools import islice
+import base64
 
 # Import database manager
 import sys
+sys.path.append(os.path.dirname(__file__))
 sys.path.append(os.path.join(os.path.dirname(__file__), 'database'))
-from db_manager import get_db_manager
+from db_manager import get_db_manager, DATA_CHANGED_CHANNEL
+from response_cache import ResponseCache
+from json_provider import FastJSONProvider
 
 # Configure logging
 logging.basicConfig(
@@ -28,6 +34,7 @@ logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # Enable CORS for React frontend
 CORS(app, resources={
@@ -42,9 +49,18 @@ CORS(app, resources={
 app.config['JSON_SORT_KEYS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request size
 
+# Keyset pagination and streaming for reading queries
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
 # Get database manager
 db = get_db_manager()
 
+# Response cache for read-heavy endpoints, invalidated when new data is committed
+cache = ResponseCache.from_env()
+cache.listen(db.connection_string, DATA_CHANGED_CHANNEL)
+
 # Load ML models globally
 ML_MODELS = {}
 SCALER = None
@@ -94,6 +110,11 @@ def handle_errors(f):
     def decorated_function(*args, **kwargs):
         try:
             return f(*args, **kwargs)
+        except InvalidCursor as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
         except Exception as e:
             logger.error(f"Error in {f.__name__}: {str(e)}")
             logger.error(traceback.format_exc())
@@ -104,17 +125,87 @@ def handle_errors(f):
             }), 500
     return decorated_function
 
+class InvalidCursor(ValueError):
+    """A pagination cursor that was not issued by this API"""
+
+def encode_cursor(row):
+    """Opaque cursor for the keyset (recorded_at, id) of the last row of a page"""
+    key = f"{row['recorded_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Cursor -> (recorded_at, id)"""
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        recorded_at, row_id = key.split('|')
+        return datetime.fromisoformat(recorded_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
 def validate_pagination():
-    """Get and validate pagination parameters"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 50, type=int)
+    """
+    Get and validate keyset pagination parameters.
+    Returns (paginate, per_page, after): `paginate` is True when the client
+    asked for pages (per_page or cursor given), `after` the decoded cursor.
+    """
+    per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+    per_page = min(max(1, per_page), MAX_PAGE_SIZE)
+    
+    cursor = request.args.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
     
-    page = max(1, page)
-    per_page = min(max(1, per_page), 100)  # Max 100 per page
+    paginate = 'per_page' in request.args or cursor is not None
+    return paginate, per_page, after
+
+def wants_ndjson():
+    """Client asked for newline-delimited JSON (?format=ndjson or Accept header)"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+def ndjson_response(rows, batch_size=500):
+    """Stream rows as NDJSON, one object per line, flushed in batches"""
+    def generate():
+        batch = []
+        for row in rows:
+            batch.append(app.json.dumps_bytes(row))
+            if len(batch) >= batch_size:
+                yield b'\n'.join(batch) + b'\n'
+                batch = []
+        if batch:
+            yield b'\n'.join(batch) + b'\n'
     
-    offset = (page - 1) * per_page
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+def format_rows(rows):
+    """
+    Rows in the shape the client asked for: a list of objects by default,
+    or with ?format=columnar one array per column ({column: [values]}),
+    which is smaller and faster to encode and to feed into charts
+    """
+    if request.args.get('format') != 'columnar':
+        return rows
     
-    return page, per_page, offset
+    columns = list(rows[0].keys()) if rows else []
+    arrays = zip(*(row.values() for row in rows))
+    return {column: list(values) for column, values in zip(columns, arrays)}
+
+def page_response(rows, per_page, **fields):
+    """Success payload for one keyset page (rows holds up to per_page + 1 rows)"""
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    return jsonify({
+        'status': 'success',
+        **fields,
+        'count': len(rows),
+        'data': format_rows(rows),
+        'pagination': {
+            'per_page': per_page,
+            'has_more': has_more,
+            'next_cursor': encode_cursor(rows[-1]) if has_more else None
+        }
+    })
 
 # ============================================================================
 # ROOT & HEALTH ENDPOINTS
@@ -144,6 +235,7 @@ def root():
             },
             'predictions': {
                 'POST /api/predict': 'Generate AQI prediction',
+                'POST /api/predict/batch': 'Generate AQI predictions for many stations at once',
                 'GET /api/predictions': 'Get saved predictions',
                 'GET /api/predictions/<station_id>': 'Get station predictions'
             },
@@ -178,6 +270,8 @@ def health_check():
             'ml_models': f'{models_loaded} models loaded',
             'api': 'operational'
         },
+        'connection_pool': db.get_pool_metrics(),
+        'response_cache': cache.get_stats(),
         'statistics': {
             'total_stations': stats.get('total_stations', 0),
             'total_readings': stats.get('total_readings', 0),
@@ -192,6 +286,7 @@ def health_check():
 
 @app.route('/api/stations')
 @handle_errors
+@cache.cached(ttl=3600)
 def get_stations():
     """Get all monitoring stations"""
     active_only = request.args.get('active_only', 'true').lower() == 'true'
@@ -218,16 +313,17 @@ def get_station(station_id):
         }), 404
     
     # Get recent readings
-    recent_readings = db.get_station_readings(station_id, hours=24)
+    recent_readings = db.get_station_readings(station_id, hours=24, limit=10)
     
     return jsonify({
         'status': 'success',
         'station': station,
-        'recent_readings': recent_readings[:10]
+        'recent_readings': recent_readings
     })
 
 @app.route('/api/cities')
 @handle_errors
+@cache.cached(ttl=3600)
 def get_cities():
     """Get list of all cities with monitoring stations"""
     cities = db.get_cities_list()
@@ -244,29 +340,48 @@ def get_cities():
 
 @app.route('/api/data/latest')
 @handle_errors
+@cache.cached(ttl=300)
 def get_latest_data():
     """Get latest air quality readings"""
     limit = request.args.get('limit', 50, type=int)
     limit = min(limit, 200)  # Max 200 records
     
     city = request.args.get('city')
+    per_station = request.args.get('per_station', 'false').lower() == 'true'
     
-    readings = db.get_latest_readings(limit=limit, city=city)
+    # per_station=true: each station/pollutant's newest reading, not the latest N rows
+    fetch = db.get_latest_station_readings if per_station else db.get_latest_readings
+    readings, metadata = fetch(limit=limit, city=city, with_metadata=True)
     
     return jsonify({
         'status': 'success',
         'count': len(readings),
-        'data': readings
+        'data': format_rows(readings),
+        'metadata': metadata
     })
 
 @app.route('/api/data/station/<station_id>')
 @handle_errors
 def get_station_data(station_id):
-    """Get readings for a specific station"""
+    """
+    Get readings for a specific station, newest first.
+    
+    Pass per_page and/or cursor for keyset pages, or ?format=ndjson
+    (Accept: application/x-ndjson) to stream every reading.
+    """
     hours = request.args.get('hours', 24, type=int)
     hours = min(hours, 168)  # Max 7 days
+    paginate, per_page, after = validate_pagination()
     
-    readings = db.get_station_readings(station_id, hours=hours)
+    if wants_ndjson():
+        return ndjson_response(db.stream_station_readings(station_id, hours=hours, after=after))
+    
+    if paginate:
+        readings = db.get_station_readings(station_id, hours=hours, after=after, limit=per_page + 1)
+        if readings or after is not None:
+            return page_response(readings, per_page, station_id=station_id)
+    else:
+        readings = db.get_station_readings(station_id, hours=hours)
     
     if not readings:
         return jsonify({
@@ -278,16 +393,32 @@ def get_station_data(station_id):
         'status': 'success',
         'station_id': station_id,
         'count': len(readings),
-        'data': readings
+        'data': format_rows(readings)
     })
 
 @app.route('/api/data/city/<city>')
 @handle_errors
 def get_city_data(city):
-    """Get air quality data for a city"""
+    """
+    Get air quality data for a city.
+    
+    Without pagination parameters, returns the latest `limit` readings.
+    Pass per_page and/or cursor for keyset pages over the city's whole
+    history (optionally the last `days`), or ?format=ndjson to stream it.
+    """
     limit = request.args.get('limit', 100, type=int)
+    days = request.args.get('days', type=int)
+    paginate, per_page, after = validate_pagination()
     
-    readings = db.get_latest_readings(limit=limit, city=city)
+    if wants_ndjson():
+        return ndjson_response(db.stream_city_readings(city, days=days, after=after))
+    
+    if paginate:
+        readings = db.get_city_readings(city, days=days, after=after, limit=per_page + 1)
+        if readings or after is not None:
+            return page_response(readings, per_page, city=city)
+    else:
+        readings, metadata = db.get_latest_readings(limit=limit, city=city, with_metadata=True)
     
     if not readings:
         return jsonify({
@@ -299,14 +430,20 @@ def get_city_data(city):
         'status': 'success',
         'city': city,
         'count': len(readings),
-        'data': readings
+        'data': format_rows(readings),
+        'metadata': metadata
     })
 
 @app.route('/api/data/timeseries')
 @handle_errors
 def get_timeseries_data():
-    """Get time-series data for ML training/analysis"""
-    station_id = request.args.get('station_id', required=True)
+    """
+    Get time-series data for ML training/analysis, oldest first.
+    
+    Pass per_page and/or cursor for keyset pages, or ?format=ndjson
+    (Accept: application/x-ndjson) to stream multi-month ranges.
+    """
+    station_id = request.args.get('station_id')
     pollutant_id = request.args.get('pollutant_id', 'PM2.5')
     days = request.args.get('days', 7, type=int)
     
@@ -316,6 +453,16 @@ def get_timeseries_data():
             'message': 'station_id parameter is required'
         }), 400
     
+    paginate, per_page, after = validate_pagination()
+    
+    if wants_ndjson():
+        return ndjson_response(db.stream_time_series_data(station_id, pollutant_id, days=days, after=after))
+    
+    if paginate:
+        data = db.get_time_series_data(station_id, pollutant_id, days=days, after=after, limit=per_page + 1)
+        return page_response(data, per_page, station_id=station_id,
+                             pollutant_id=pollutant_id, days=days)
+    
     data = db.get_time_series_data(station_id, pollutant_id, days=days)
     
     return jsonify({
@@ -324,7 +471,7 @@ def get_timeseries_data():
         'pollutant_id': pollutant_id,
         'days': days,
         'count': len(data),
-        'data': data
+        'data': format_rows(data)
     })
 
 # ============================================================================
@@ -435,6 +582,206 @@ def predict_aqi():
             'message': f'Prediction failed: {str(e)}'
         }), 500
 
+# Upper bounds of the AQI categories, as used by /api/predict
+AQI_CATEGORY_BOUNDS = np.array([50, 100, 200, 300, 400])
+AQI_CATEGORY_NAMES = np.array(['Good', 'Satisfactory', 'Moderate', 'Poor', 'Very Poor', 'Severe'])
+
+MAX_BATCH_PREDICTIONS = 20000
+MAX_HOURS_AHEAD = 48
+
+def validate_batch_request(hours_ahead, items, station_ids):
+    """Error message for a malformed /api/predict/batch body, or None"""
+    if isinstance(hours_ahead, bool) or not isinstance(hours_ahead, int) \
+            or not 1 <= hours_ahead <= MAX_HOURS_AHEAD:
+        return f'hours_ahead must be an integer between 1 and {MAX_HOURS_AHEAD}'
+    if items is not None:
+        if not isinstance(items, list) or not all(
+                isinstance(item, dict)
+                and isinstance(item.get('station_id'), str)
+                and isinstance(item.get('features') or {}, dict)
+                for item in items):
+            return 'items must be a list of {"station_id": string, "features": object}'
+    if station_ids is not None:
+        if not isinstance(station_ids, list) or not all(isinstance(s, str) for s in station_ids):
+            return 'station_ids must be a list of strings'
+    return None
+
+def categorize_aqi(values):
+    """AQI category names for an array of AQI values"""
+    return AQI_CATEGORY_NAMES[np.searchsorted(AQI_CATEGORY_BOUNDS, values, side='left')]
+
+def build_station_features(snapshots):
+    """Model feature frame from db.get_station_feature_snapshots() rows"""
+    df = pd.DataFrame.from_records(snapshots)
+    if df.empty:
+        return df
+    
+    numeric_cols = df.columns.difference(['station_id', 'recorded_at'])
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
+    
+    recorded_at = pd.to_datetime(df['recorded_at'])
+    df['hour'] = recorded_at.dt.hour
+    df['day_of_week'] = recorded_at.dt.dayofweek
+    df['month'] = recorded_at.dt.month
+    df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
+    df['is_rush_hour'] = ((df['hour'].between(7, 10)) | (df['hour'].between(17, 20))).astype(int)
+    df['hour_sin'] = np.sin(2 * np.pi * df['hour'] / 24)
+    df['hour_cos'] = np.cos(2 * np.pi * df['hour'] / 24)
+    
+    # Short histories: fall back to the current value
+    for col in ['pm25_lag_1h', 'pm25_lag_3h', 'pm25_lag_24h',
+                'pm25_rolling_mean_6h', 'pm25_rolling_mean_24h']:
+        df[col] = df[col].fillna(df['pm25'])
+    df['temperature_lag_1h'] = df['temperature_lag_1h'].fillna(df['temperature'])
+    df['pm25_rolling_std_6h'] = df['pm25_rolling_std_6h'].fillna(0.0)
+    
+    df['pm25_pm10_ratio'] = df['pm25'] / (df['pm10'] + 1e-6)
+    df['heat_index'] = 0.5 * (df['temperature'] + 61.0 + ((df['temperature'] - 68.0) * 1.2)
+                              + (df['humidity'] * 0.094))
+    return df.drop(columns=['recorded_at'])
+
+@app.route('/api/predict/batch', methods=['POST'])
+@handle_errors
+def predict_aqi_batch():
+    """
+    Generate AQI predictions for many stations at once.
+    
+    Body: {"items": [{"station_id", "features"}, ...]} with explicit feature
+    vectors, or {"station_ids": [...]} to predict from each station's latest
+    readings; optional "model", "hours_ahead" and "save". All rows are
+    scaled and predicted in one vectorized call and saved with a single
+    INSERT; the response is streamed.
+    """
+    if not ML_MODELS:
+        return jsonify({
+            'status': 'error',
+            'message': 'ML models not loaded'
+        }), 503
+    
+    data = request.get_json(silent=True) or {}
+    model_name = data.get('model', 'linear_regression')
+    hours_ahead = data.get('hours_ahead', 1)
+    save = data.get('save', True)
+    items = data.get('items')
+    station_ids = data.get('station_ids')
+    
+    model = ML_MODELS.get(model_name)
+    if not model:
+        return jsonify({
+            'status': 'error',
+            'message': f'Model {model_name} not found. Available: {list(ML_MODELS.keys())}'
+        }), 400
+    
+    if not items and not station_ids:
+        return jsonify({
+            'status': 'error',
+            'message': 'items or station_ids is required'
+        }), 400
+    
+    message = validate_batch_request(hours_ahead, items, station_ids)
+    if message:
+        return jsonify({
+            'status': 'error',
+            'message': message
+        }), 400
+    
+    if len(items or station_ids) > MAX_BATCH_PREDICTIONS:
+        return jsonify({
+            'status': 'error',
+            'message': f'At most {MAX_BATCH_PREDICTIONS} predictions per request'
+        }), 400
+    
+    errors = []
+    if items:
+        stations = [item.get('station_id') for item in items]
+        features_df = pd.DataFrame.from_records([item.get('features') or {} for item in items])
+    else:
+        features_df = build_station_features(db.get_station_feature_snapshots(station_ids))
+        stations = features_df['station_id'].tolist() if not features_df.empty else []
+        missing = set(station_ids) - set(stations)
+        errors.extend({'station_id': station_id, 'message': 'No recent PM2.5 readings'}
+                      for station_id in station_ids if station_id in missing)
+    
+    # Align columns with what the scaler was fitted on
+    feature_names = getattr(SCALER, 'feature_names_in_', None)
+    if feature_names is None:
+        feature_names = getattr(model, 'feature_names_in_', features_df.columns)
+    features_df = features_df.reindex(columns=list(feature_names)).apply(pd.to_numeric, errors='coerce')
+    
+    valid = features_df.notna().all(axis=1).to_numpy() & np.array([bool(s) for s in stations], dtype=bool)
+    errors.extend({'station_id': stations[i], 'message': 'station_id and all numeric features are required'}
+                  for i in np.flatnonzero(~valid))
+    
+    features_df = features_df[valid]
+    stations = [stations[i] for i in np.flatnonzero(valid)]
+    
+    if len(features_df):
+        features_scaled = SCALER.transform(features_df) if SCALER else features_df.values
+        predicted = np.asarray(model.predict(features_scaled), dtype=float)
+    else:
+        predicted = np.empty(0)
+    confidence_lower = np.maximum(0, predicted - 10)
+    confidence_upper = np.minimum(500, predicted + 10)
+    categories = categorize_aqi(predicted)
+    
+    prediction_time = datetime.now()
+    predicted_for = prediction_time + timedelta(hours=hours_ahead)
+    
+    prediction_ids = [None] * len(stations)
+    if save and stations:
+        if items:
+            features_used = [items[i].get('features') for i in np.flatnonzero(valid)]
+        else:
+            features_used = features_df.to_dict('records')
+        prediction_ids = db.bulk_insert_predictions([
+            {
+                'station_id': station_id,
+                'prediction_time': prediction_time,
+                'predicted_for': predicted_for,
+                'model_name': model_name,
+                'predicted_aqi': aqi,
+                'confidence_lower': lower,
+                'confidence_upper': upper,
+                'features_used': features
+            }
+            for station_id, aqi, lower, upper, features in zip(
+                stations, predicted.tolist(), confidence_lower.tolist(),
+                confidence_upper.tolist(), features_used)
+        ])
+    
+    header = {
+        'status': 'success',
+        'count': len(stations),
+        'model_used': model_name,
+        'predicted_for': predicted_for.isoformat(),
+        'prediction_time': prediction_time.isoformat(),
+        'errors': errors
+    }
+    rows = zip(prediction_ids, stations, np.round(predicted, 2).tolist(), categories.tolist(),
+               np.round(confidence_lower, 2).tolist(), np.round(confidence_upper, 2).tolist())
+    
+    def generate(chunk_size=1000):
+        yield json.dumps(header)[:-1] + ', "data": ['
+        separator = ''
+        while True:
+            chunk = [
+                {
+                    'prediction_id': prediction_id,
+                    'station_id': station_id,
+                    'predicted_aqi': aqi,
+                    'aqi_category': category,
+                    'confidence_interval': {'lower': lower, 'upper': upper}
+                }
+                for prediction_id, station_id, aqi, category, lower, upper in islice(rows, chunk_size)
+            ]
+            if not chunk:
+                break
+            yield separator + json.dumps(chunk)[1:-1]
+            separator = ', '
+        yield ']}'
+    
+    return Response(generate(), mimetype='application/json')
+
 @app.route('/api/predictions')
 @handle_errors
 def get_predictions():
@@ -446,7 +793,7 @@ def get_predictions():
     return jsonify({
         'status': 'success',
         'count': len(predictions),
-        'data': predictions
+        'data': format_rows(predictions)
     })
 
 @app.route('/api/predictions/<station_id>')
@@ -461,7 +808,7 @@ def get_station_predictions(station_id):
         'status': 'success',
         'station_id': station_id,
         'count': len(predictions),
-        'data': predictions
+        'data': format_rows(predictions)
     })
 
 # ============================================================================
@@ -470,6 +817,7 @@ def get_station_predictions(station_id):
 
 @app.route('/api/analytics/summary')
 @handle_errors
+@cache.cached(ttl=300)
 def get_summary():
     """Get overall system summary"""
     stats = db.get_statistics()
@@ -481,9 +829,10 @@ def get_summary():
 
 @app.route('/api/analytics/city/<city>')
 @handle_errors
+@cache.cached(ttl=300)
 def get_city_analytics(city):
     """Get analytics for a specific city"""
-    summary = db.get_city_summary(city)
+    summary, metadata = db.get_city_summary(city, with_metadata=True)
     
     if not summary or summary['total_stations'] == 0:
         return jsonify({
@@ -494,24 +843,27 @@ def get_city_analytics(city):
     return jsonify({
         'status': 'success',
         'city': city,
-        'analytics': summary
+        'analytics': summary,
+        'metadata': metadata
     })
 
 @app.route('/api/analytics/trends')
 @handle_errors
+@cache.cached(ttl=900)
 def get_trends():
     """Get pollutant trends"""
     pollutant_id = request.args.get('pollutant_id', 'PM2.5')
     days = request.args.get('days', 7, type=int)
     
-    trends = db.get_pollutant_trends(pollutant_id, days=days)
+    trends, metadata = db.get_pollutant_trends(pollutant_id, days=days, with_metadata=True)
     
     return jsonify({
         'status': 'success',
         'pollutant_id': pollutant_id,
         'days': days,
         'count': len(trends),
-        'data': trends
+        'data': trends,
+        'metadata': metadata
     })
 
 # ============================================================================
@@ -525,6 +877,7 @@ def refresh_views():
     success = db.refresh_materialized_views()
     
     if success:
+        cache.invalidate()
         return jsonify({
             'status': 'success',
             'message': 'Materialized views refreshed successfully'
@@ -619,23 +972,54 @@ def get_system_stats():
 @app.route('/api/admin/data/cleanup', methods=['POST'])
 @handle_errors
 def cleanup_old_data():
-    """Clean up old data (older than retention period)"""
-    days = request.json.get('retention_days', 90)
+    """Clean up old data (older than retention period) by dropping whole partitions"""
+    days = int((request.get_json(silent=True) or {}).get('retention_days', 90))
     
-    with db.get_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                DELETE FROM air_quality_data
-                WHERE timestamp < NOW() - INTERVAL '%s days'
-                RETURNING COUNT(*)
-            """, (days,))
-            deleted_count = cursor.fetchone()[0]
-            conn.commit()
+    result = db.partitions.apply_retention(days)
+    
+    return jsonify({
+        'status': 'success',
+        'message': (f"Dropped {len(result['dropped_partitions'])} partitions, "
+                    f"deleted {result['deleted_rows']} old records"),
+        'retention_days': days,
+        'cutoff': result['cutoff'].isoformat(),
+        'dropped_partitions': result['dropped_partitions'],
+        'deleted_rows': result['deleted_rows']
+    })
+
+@app.route('/api/admin/partitions', methods=['GET'])
+@handle_errors
+def get_partitions():
+    """List air_quality_data partitions with their ranges and sizes"""
+    partitions = db.partitions.list_partitions()
+    
+    return jsonify({
+        'status': 'success',
+        'count': len(partitions),
+        'interval': db.partitions.interval,
+        'total_bytes': sum(p['total_bytes'] for p in partitions),
+        'data': [{
+            'name': p['name'],
+            'range_start': p['range_start'].isoformat() if p['range_start'] else None,
+            'range_end': p['range_end'].isoformat() if p['range_end'] else None,
+            'is_default': p['is_default'],
+            'estimated_rows': p['estimated_rows'],
+            'total_bytes': p['total_bytes'],
+            'total_size': p['total_size']
+        } for p in partitions]
+    })
+
+@app.route('/api/admin/partitions', methods=['POST'])
+@handle_errors
+def create_partitions():
+    """Pre-create partitions ahead of time"""
+    payload = request.get_json(silent=True) or {}
+    created = db.partitions.ensure_partitions(ahead=payload.get('ahead'), force=True)
     
     return jsonify({
         'status': 'success',
-        'message': f'Deleted {deleted_count} old records',
-        'retention_days': days
+        'message': f'Created {len(created)} partitions',
+        'created': created
     })
 
 @app.route('/api/monitoring/metrics')
@@ -0,0 +1,272 @@
+"""
+Async Database Access
+Non-blocking PostgreSQL reads for the FastAPI server. Queries run on an
+async connection pool (psycopg 3) and the pandas work that reshapes their
+results runs on a bounded thread pool, so neither blocks the event loop.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Pollutant ids in the schema -> column names used by the API responses
+POLLUTANT_COLUMNS = {
+    'PM2.5': 'pm25',
+    'PM10': 'pm10',
+    'NO2': 'no2',
+    'SO2': 'so2',
+    'CO': 'co',
+    'O3': 'o3'
+}
+
+
+def _categorize(aqi, categories):
+    """Category name and health advisory for each AQI value (aqi_categories rows)"""
+    categories = sorted(categories, key=lambda c: c['min_aqi'])
+    lower = np.array([c['min_aqi'] for c in categories], dtype=float)
+    idx = np.clip(np.searchsorted(lower, aqi.to_numpy(dtype=float), side='right') - 1, 0, len(categories) - 1)
+    valid = aqi.notna().to_numpy()
+    names = np.array([c['category_name'] for c in categories], dtype=object)
+    advisories = np.array([c['health_advisory'] for c in categories], dtype=object)
+    return np.where(valid, names[idx], None), np.where(valid, advisories[idx], None)
+
+
+def _to_records(df):
+    """DataFrame -> list of dicts with NaN as None and timestamps as ISO strings"""
+    if 'timestamp' in df.columns:
+        df['timestamp'] = df['timestamp'].map(lambda ts: ts.isoformat() if pd.notna(ts) else None)
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict('records')
+
+
+def worst_station_per_city(station_rows):
+    """Latest row per city, taking the station with the highest AQI (cities without AQI are left out)"""
+    by_city = {}
+    for row in station_rows:
+        if row['aqi'] is None:
+            continue
+        current = by_city.get(row['city'])
+        if current is None or row['aqi'] > current['aqi']:
+            by_city[row['city']] = row
+    return by_city
+
+
+def pivot_hourly_readings(rows, categories):
+    """Hourly (bucket, pollutant) rows for a city -> one row per hour"""
+    if not rows:
+        return []
+    df = pd.DataFrame(rows)
+    df['pollutant'] = df['pollutant_id'].map(POLLUTANT_COLUMNS)
+
+    hours = df.groupby('timestamp').agg(aqi=('aqi', 'max'))
+    values = df.dropna(subset=['pollutant']).pivot_table(
+        index='timestamp', columns='pollutant', values='value', aggfunc='mean'
+    )
+    hours = hours.join(values.reindex(columns=['pm25', 'pm10']))
+    hours['category'], hours['recommendation'] = _categorize(hours['aqi'], categories)
+
+    return _to_records(hours.sort_index().reset_index())
+
+
+class AsyncDatabase:
+    """
+    Async PostgreSQL access with a bounded executor for CPU-bound work.
+
+    The pool is opened by `open()` (on application startup) and sized by
+    the same DB_POOL_* settings as the Flask API's pool.
+    """
+
+    def __init__(self, connection_string=None, min_size=None, max_size=None,
+                 timeout=None, executor_workers=None):
+        self.connection_string = connection_string or os.getenv('DATABASE_URL')
+        if not self.connection_string:
+            raise ValueError("DATABASE_URL environment variable not set")
+
+        self.pool = AsyncConnectionPool(
+            self.connection_string,
+            min_size=min_size if min_size is not None else int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+            max_size=max_size if max_size is not None else int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            timeout=timeout if timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 30)),
+            kwargs={'autocommit': True, 'row_factory': dict_row},
+            open=False
+        )
+        self.executor_workers = executor_workers or int(os.getenv('PANDAS_EXECUTOR_WORKERS', 0)) or min(4, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.executor_workers, thread_name_prefix='pandas')
+        self._categories = None
+
+    async def open(self):
+        await self.pool.open()
+        logger.info(f"Async connection pool opened (max {self.pool.max_size} connections, "
+                    f"{self.executor_workers} executor workers)")
+
+    async def close(self):
+        await self.pool.close()
+        self.executor.shutdown(wait=False)
+
+    async def fetch(self, query, params=None):
+        """Run a query and return all rows as dicts"""
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(query, params)
+            return await cursor.fetchall()
+
+    async def fetchone(self, query, params=None):
+        """Run a query and return the first row as a dict (or None)"""
+        async with self.pool.connection() as conn:
+            cursor = await conn.execute(query, params)
+            return await cursor.fetchone()
+
+    async def run_in_executor(self, func, *args, **kwargs):
+        """Run CPU-bound work (pandas) on the bounded executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def check_connection(self):
+        try:
+            await self.fetchone("SELECT 1")
+            return True
+        except Exception as e:
+            logger.error(f"Database connection check failed: {e}")
+            return False
+
+    def get_metrics(self):
+        """Pool counters plus executor size"""
+        stats = self.pool.get_stats()
+        stats['executor_workers'] = self.executor_workers
+        return stats
+
+    # ========================================================================
+    # READINGS
+    # ========================================================================
+
+    async def get_aqi_categories(self):
+        """AQI category bands (cached, the table is static reference data)"""
+        if self._categories is None:
+            self._categories = await self.fetch("""
+                SELECT category_name, min_aqi, max_aqi, health_advisory
+                FROM aqi_categories
+                ORDER BY min_aqi
+            """)
+        return self._categories
+
+    async def latest_rows(self):
+        """Latest reading of every active station, one row per station (pivoted in SQL)"""
+        rows = await self.fetch("""
+            WITH per_station AS (
+                SELECT
+                    s.station_id,
+                    s.station_name,
+                    s.city,
+                    s.latitude::float8 AS latitude,
+                    s.longitude::float8 AS longitude,
+                    COALESCE(MAX(l.data_source), s.data_source) AS source,
+                    MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'PM2.5')::float8 AS pm25,
+                    MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'PM10')::float8 AS pm10,
+                    MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'NO2')::float8 AS no2,
+                    MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'SO2')::float8 AS so2,
+                    MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'CO')::float8 AS co,
+                    MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'O3')::float8 AS o3,
+                    MAX(l.aqi)::float8 AS aqi,
+                    MAX(l.recorded_at) AS timestamp
+                FROM latest_station_readings l
+                JOIN stations s ON l.station_id = s.station_id
+                WHERE s.is_active = TRUE
+                GROUP BY s.station_id
+            )
+            SELECT p.*, ac.category_name AS category, ac.health_advisory AS recommendation
+            FROM per_station p
+            LEFT JOIN LATERAL (
+                SELECT category_name, health_advisory
+                FROM aqi_categories
+                WHERE min_aqi <= p.aqi
+                ORDER BY min_aqi DESC
+                LIMIT 1
+            ) ac ON TRUE
+            ORDER BY p.timestamp
+        """)
+        if not rows:
+            return None
+        for row in rows:
+            row['timestamp'] = row['timestamp'].isoformat()
+        return rows
+
+    async def latest_by_city(self):
+        """Latest reading per city (worst station)"""
+        rows = await self.latest_rows()
+        if rows is None:
+            return None
+        return worst_station_per_city(rows)
+
+    async def city_history(self, city, hours):
+        """Hourly readings for a city over the `hours` before its latest reading"""
+        if hours <= 0:
+            return []
+        rows = await self.fetch("""
+            WITH city_stations AS (
+                SELECT station_id FROM stations WHERE LOWER(city) = LOWER(%(city)s)
+            ),
+            latest AS (
+                SELECT MAX(recorded_at) AS latest_at
+                FROM air_quality_data
+                WHERE station_id IN (SELECT station_id FROM city_stations)
+            )
+            SELECT
+                DATE_TRUNC('hour', aq.recorded_at) AS timestamp,
+                aq.pollutant_id,
+                AVG(aq.pollutant_avg)::float8 AS value,
+                MAX(aq.aqi)::float8 AS aqi
+            FROM air_quality_data aq, latest
+            WHERE aq.station_id IN (SELECT station_id FROM city_stations)
+                AND aq.recorded_at > DATE_TRUNC('hour', latest.latest_at) - %(hours)s * INTERVAL '1 hour'
+            GROUP BY 1, 2
+        """, {'city': city, 'hours': hours})
+        return await self.run_in_executor(pivot_hourly_readings, rows, await self.get_aqi_categories())
+
+    async def stats(self):
+        """System statistics (None when no readings have been stored yet)"""
+        # Daily summaries keep counts and AQI sums, so totals and averages avoid
+        # a full scan; the time range comes from the recorded_at index
+        totals = await self.fetchone("""
+            SELECT
+                (SELECT COALESCE(SUM(reading_count), 0) FROM daily_air_quality_stats) AS total_readings,
+                (SELECT MAX(recorded_at) FROM air_quality_data) AS latest_reading,
+                (SELECT MIN(recorded_at) FROM air_quality_data) AS oldest_reading,
+                (SELECT ARRAY_AGG(DISTINCT data_source)::text[] FROM stations) AS data_sources,
+                (SELECT COUNT(DISTINCT city) FROM stations) AS cities_covered
+        """)
+        if not totals or not totals['total_readings']:
+            return None
+
+        city_aqi = await self.fetch("""
+            SELECT s.city, SUM(d.sum_aqi) / NULLIF(SUM(d.aqi_count), 0) AS avg_aqi,
+                   SUM(d.sum_aqi) AS sum_aqi, SUM(d.aqi_count) AS aqi_count
+            FROM daily_air_quality_stats d
+            JOIN stations s ON d.station_id = s.station_id
+            GROUP BY s.city
+        """)
+        cities = await self.fetch("SELECT DISTINCT city FROM stations ORDER BY city")
+
+        ranked = [row for row in city_aqi if row['avg_aqi'] is not None]
+        aqi_count = sum(row['aqi_count'] for row in city_aqi)
+        latest, oldest = totals['latest_reading'], totals['oldest_reading']
+
+        return {
+            'total_records': int(totals['total_readings']),
+            'cities_covered': totals['cities_covered'],
+            'cities_list': [row['city'] for row in cities],
+            'data_sources': [source for source in (totals['data_sources'] or []) if source],
+            'latest_update': latest.isoformat() if latest else None,
+            'oldest_record': oldest.isoformat() if oldest else None,
+            'date_range_days': (latest - oldest).days if latest and oldest else 0,
+            'average_aqi_all_cities': round(float(sum(row['sum_aqi'] for row in city_aqi) / aqi_count), 2) if aqi_count else None,
+            'worst_city': max(ranked, key=lambda row: row['avg_aqi'])['city'] if ranked else None,
+            'best_city': min(ranked, key=lambda row: row['avg_aqi'])['city'] if ranked else None
+        }
@@ -7,12 +7,17 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 import pandas as pd
 import os
+import sys
 from datetime import datetime
 
+sys.path.append(os.path.dirname(__file__))
+from csv_snapshot import CsvSnapshot
+
 app = Flask(__name__)
 CORS(app)
 
 CSV_FILE = 'air_quality_data.csv'
+snapshot = CsvSnapshot(CSV_FILE)
 
 
 def get_aqi_category(aqi):
@@ -47,16 +52,13 @@ def health_check():
 def get_stations():
     """Get all stations with latest readings"""
     try:
-        if not os.path.exists(CSV_FILE):
+        data = snapshot.get()
+        if data is None:
             return jsonify({'error': 'No data available'}), 404
         
-        df = pd.read_csv(CSV_FILE)
-        
-        # Get latest record for each city
-        df_latest = df.sort_values('timestamp').groupby('city').tail(1)
-        
+        # Latest record for each city (precomputed when the file is loaded)
         stations = []
-        for _, row in df_latest.iterrows():
+        for row in data.latest_rows:
             stations.append({
                 'name': row['station_name'],
                 'city': row['city'],
@@ -84,15 +86,14 @@ def get_stations():
 def get_cities():
     """Get all cities with average AQI"""
     try:
-        if not os.path.exists(CSV_FILE):
+        data = snapshot.get()
+        if data is None:
             return jsonify({'error': 'No data available'}), 404
         
-        df = pd.read_csv(CSV_FILE)
-        
-        # Group by city and get latest/average
+        # Latest reading per city
         cities = []
-        for city_name in df['city'].unique():
-            city_data = df[df['city'] == city_name].sort_values('timestamp').tail(1).iloc[0]
+        for city_name in data.cities:
+            city_data = data.latest_by_city[city_name]
             
             cities.append({
                 'city': city_name,
@@ -116,16 +117,15 @@ def get_cities():
 def get_stats():
     """Get system statistics"""
     try:
-        if not os.path.exists(CSV_FILE):
+        data = snapshot.get()
+        if data is None:
             return jsonify({'error': 'No data available'}), 404
         
-        df = pd.read_csv(CSV_FILE)
-        
         return jsonify({
-            'total_records': len(df),
-            'cities_covered': df['city'].nunique(),
-            'latest_update': df['timestamp'].max(),
-            'sources': df['source'].unique().tolist()
+            'total_records': data.total_records,
+            'cities_covered': len(data.cities),
+            'latest_update': data.latest_update,
+            'sources': data.sources
         })
         
     except Exception as e:
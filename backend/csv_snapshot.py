@@ -0,0 +1,87 @@
+"""
+CSV Data Snapshot
+In-memory snapshot of air_quality_data.csv shared by the CSV-backed APIs.
+The file is parsed once and re-read only when its mtime or size changes;
+per-city latest rows, per-city time-series positions and summary statistics
+are built at load time so requests do not scale with the file size.
+"""
+
+import logging
+import os
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Immutable view of one version of the CSV file"""
+
+    def __init__(self, df):
+        # Stable sort keeps file order for equal timestamps (the last one wins)
+        self.df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+        self.total_records = len(self.df)
+
+        # Row positions of each city in timestamp order
+        self._positions = self.df.groupby('city', sort=False).indices
+        self.cities = [city for city in df['city'].unique() if city in self._positions]
+
+        # Latest reading per city, ordered by timestamp like the original groupby().tail(1)
+        latest = self.df.groupby('city', sort=False).tail(1)
+        self.latest_rows = latest.to_dict('records')
+        by_city = {row['city']: row for row in self.latest_rows}
+        self.latest_by_city = {city: by_city[city] for city in self.cities}
+
+        self.sources = df['source'].unique().tolist() if 'source' in df.columns else []
+        self.latest_update = self.df['timestamp'].max() if self.total_records else None
+        self.oldest_record = self.df['timestamp'].min() if self.total_records else None
+        self.average_aqi = self.df['aqi'].mean()
+        self.city_average_aqi = self.df.groupby('city')['aqi'].mean()
+
+    def city_history(self, city, n):
+        """Last `n` readings for a city in timestamp order, as dicts"""
+        positions = self._positions.get(city)
+        if positions is None or n <= 0:
+            return []
+        return self.df.iloc[positions[-n:]].to_dict('records')
+
+
+class CsvSnapshot:
+    """
+    Loads `path` lazily and reloads it when the file changes.
+
+    `get()` returns the current Snapshot, or None when the file does not
+    exist. Checking for changes costs one stat() call per request.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.loads = 0
+        self._snapshot = None
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self):
+        """Current snapshot of the file (re-read if it changed), or None if missing"""
+        signature = self._file_signature()
+        if signature is None:
+            return None
+        if signature == self._signature:
+            return self._snapshot
+
+        with self._lock:
+            if signature != self._signature:
+                snapshot = Snapshot(pd.read_csv(self.path))
+                self._snapshot, self._signature = snapshot, signature
+                self.loads += 1
+                logger.info(f"Loaded snapshot of {self.path}: {snapshot.total_records} records, "
+                            f"{len(snapshot.cities)} cities")
+            return self._snapshot
@@ -4,41 +4,768 @@ Handles PostgreSQL connection, initialization, and management
 """
 
 import psycopg2
-from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2 import pool as pg_pool, sql, errors as pg_errors
+from psycopg2.extras import RealDictCursor, Json, execute_values
 from contextlib import contextmanager
+import csv
+import io
+from itertools import islice
+import numpy as np
 import os
-from datetime import datetime
+import re
+import threading
+import time
+from datetime import datetime, timedelta
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# NOTIFY channel signalled whenever readings, stations or views change
+DATA_CHANGED_CHANNEL = 'air_quality_data_changed'
+
+
+def notify_data_changed(cursor, source):
+    """Signal listeners (e.g. API response caches) once the transaction commits"""
+    cursor.execute("SELECT pg_notify(%s, %s)", (DATA_CHANGED_CHANNEL, source))
+
+
+class ConnectionPool:
+    """
+    Thread-safe PostgreSQL connection pool.
+    
+    Wraps psycopg2's ThreadedConnectionPool with a bounded wait for free
+    connections, a liveness check on checkout and basic usage metrics.
+    The underlying pool is created lazily and rebuilt after a fork so each
+    gunicorn worker owns its own connections.
+    """
+    
+    def __init__(self, connection_string, min_size=1, max_size=10,
+                 timeout=30.0, health_check_interval=30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min={min_size}, max={max_size}")
+        
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+        
+        # Metrics
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._reconnects = 0
+        self._timeouts = 0
+        self._total_checkout_time = 0.0
+        self._max_checkout_time = 0.0
+    
+    def _get_pool(self):
+        """Create the underlying pool on first use (or after a fork)"""
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = pg_pool.ThreadedConnectionPool(
+                    self.min_size, self.max_size, self.connection_string
+                )
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.max_size)
+                self._last_used = {}
+                self._in_use = 0
+                logger.info(
+                    f"Connection pool created (min={self.min_size}, max={self.max_size})"
+                )
+            return self._pool
+    
+    def _is_healthy(self, conn):
+        """Check that a pooled connection is still usable"""
+        if conn.closed:
+            return False
+        
+        # Fresh connections and recently used ones skip the ping round trip
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.health_check_interval:
+            return True
+        
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+    
+    def getconn(self):
+        """Check out a healthy connection, waiting up to `timeout` seconds"""
+        pool = self._get_pool()
+        started = time.monotonic()
+        
+        with self._lock:
+            self._waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        
+        if not acquired:
+            with self._lock:
+                self._timeouts += 1
+            raise pg_pool.PoolError(
+                f"Timed out after {self.timeout}s waiting for a database connection"
+            )
+        
+        try:
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                logger.warning("Discarding broken pooled connection, reconnecting")
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+                with self._lock:
+                    self._reconnects += 1
+        except Exception:
+            self._slots.release()
+            raise
+        
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._total_checkout_time += elapsed
+            self._max_checkout_time = max(self._max_checkout_time, elapsed)
+        return conn
+    
+    def putconn(self, conn, close=False):
+        """Return a connection to the pool, closing it if it is broken"""
+        pool = self._pool
+        try:
+            if pool is None or self._pid != os.getpid():
+                conn.close()
+                return
+            
+            close = close or conn.closed
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self._in_use = max(0, self._in_use - 1)
+            self._slots.release()
+    
+    def closeall(self):
+        """Close every connection held by the pool"""
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+            self._last_used = {}
+    
+    def get_metrics(self):
+        """Get pool usage metrics"""
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._pool._pool) if self._pool is not None else 0,
+                'waiting': self._waiting,
+                'total_checkouts': checkouts,
+                'reconnects': self._reconnects,
+                'timeouts': self._timeouts,
+                'avg_checkout_ms': round(self._total_checkout_time / checkouts * 1000, 3) if checkouts else 0.0,
+                'max_checkout_ms': round(self._max_checkout_time * 1000, 3)
+            }
+
+
+class AQICategoryIndex:
+    """
+    In-process interval index over the aqi_categories table.
+    
+    Categories are loaded once and cached; lookups are a binary search over
+    the sorted lower bounds instead of a SELECT per row. The cache is
+    reloaded after `ttl` seconds or when `invalidate()` is called, so edits
+    to aqi_categories are picked up without restarting the process.
+    """
+    
+    def __init__(self, ttl=300.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._fingerprint = None
+        self._min_aqi = np.empty(0)
+        self._max_aqi = np.empty(0)
+        self._category_ids = np.empty(0, dtype=np.int64)
+    
+    def invalidate(self):
+        """Force a reload on the next lookup"""
+        with self._lock:
+            self._loaded_at = None
+    
+    def _ensure_loaded(self, cursor):
+        """Load categories through the caller's cursor if the cache is stale"""
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return
+            
+            cursor.execute("""
+                SELECT category_id, min_aqi, max_aqi
+                FROM aqi_categories
+                ORDER BY min_aqi, category_id
+            """)
+            rows = [tuple(row.values()) if isinstance(row, dict) else tuple(row)
+                    for row in cursor.fetchall()]
+            
+            if rows != self._fingerprint:
+                self._category_ids = np.array([r[0] for r in rows], dtype=np.int64)
+                self._min_aqi = np.array([float(r[1]) for r in rows], dtype=float)
+                self._max_aqi = np.array([float(r[2]) for r in rows], dtype=float)
+                self._fingerprint = rows
+                logger.info(f"Loaded {len(rows)} AQI categories into lookup index")
+            self._loaded_at = time.monotonic()
+    
+    def lookup_many(self, cursor, aqi_values):
+        """
+        Map AQI values to category IDs in one vectorized pass.
+        
+        Matches the `aqi BETWEEN min_aqi AND max_aqi` semantics of the SQL
+        lookup; falsy or out-of-range values map to None. Pass `cursor=None`
+        to use the cached categories without a staleness check.
+        """
+        if cursor is not None:
+            self._ensure_loaded(cursor)
+        if not len(aqi_values):
+            return []
+        
+        values = np.array([float(v) if v else np.nan for v in aqi_values], dtype=float)
+        positions = np.searchsorted(self._min_aqi, values, side='right') - 1
+        clipped = np.clip(positions, 0, max(len(self._min_aqi) - 1, 0))
+        
+        if len(self._min_aqi):
+            matched = (positions >= 0) & ~np.isnan(values) & (values <= self._max_aqi[clipped])
+        else:
+            matched = np.zeros(len(values), dtype=bool)
+        
+        return [int(self._category_ids[i]) if ok else None
+                for i, ok in zip(clipped, matched)]
+    
+    def lookup(self, cursor, aqi_value):
+        """Map a single AQI value to its category ID"""
+        return self.lookup_many(cursor, [aqi_value])[0]
+
+
+class _CSVRowStream:
+    """File-like adapter that renders rows as CSV lazily for COPY FROM STDIN"""
+    
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self._pending = ''
+        self.row_count = 0
+    
+    def read(self, size=-1):
+        size = 65536 if size is None or size < 0 else size
+        
+        while len(self._pending) < size:
+            chunk = list(islice(self._rows, 500))
+            if not chunk:
+                break
+            self._writer.writerows(chunk)
+            self.row_count += len(chunk)
+            self._pending += self._buffer.getvalue()
+            self._buffer.seek(0)
+            self._buffer.truncate()
+        
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+    
+    readline = read
+
+
+def copy_merge(cursor, table, columns, rows, key_columns, update_columns=None,
+               before_merge=None):
+    """
+    Stream rows into `table` through a COPY-loaded staging table.
+    
+    Rows are sent with `COPY ... FROM STDIN` (CSV) into a temporary table and
+    merged into the target in a single INSERT ... SELECT. Rows whose key
+    already exists are skipped (ON CONFLICT DO NOTHING semantics) unless
+    `update_columns` is given, in which case they are updated in place; the
+    latter requires a unique constraint on `key_columns`. `before_merge`, if
+    given, is called with the cursor once the rows are staged, e.g. to upsert
+    parent rows discovered while streaming.
+    
+    Returns a dict with `staged`, `inserted`, `updated` and `duplicates` counts.
+    """
+    staging = sql.Identifier(f"_staging_{table}")
+    target = sql.Identifier(table)
+    cols = sql.SQL(', ').join(map(sql.Identifier, columns))
+    keys = sql.SQL(', ').join(map(sql.Identifier, key_columns))
+    
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(staging))
+    cursor.execute(sql.SQL(
+        "CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA"
+    ).format(staging, cols, target))
+    # Input position of each staged row, to pick a winner among duplicate keys
+    cursor.execute(sql.SQL(
+        "ALTER TABLE {} ADD COLUMN _staging_ordinal BIGINT GENERATED ALWAYS AS IDENTITY"
+    ).format(staging))
+    
+    stream = _CSVRowStream(rows)
+    cursor.copy_expert(
+        sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(staging, cols),
+        stream
+    )
+    staged = stream.row_count
+    
+    if before_merge is not None:
+        before_merge(cursor)
+    
+    def deduped(where=sql.SQL(''), last_wins=False):
+        # Like the row-by-row path: updates leave the last duplicate in the
+        # input, skipped conflicts keep the first
+        return sql.SQL(
+            "SELECT DISTINCT ON ({keys}) {cols} FROM {staging} s {where} "
+            "ORDER BY {keys}, _staging_ordinal {direction}"
+        ).format(keys=keys, cols=cols, staging=staging, where=where,
+                 direction=sql.SQL('DESC' if last_wins else 'ASC'))
+    
+    if update_columns:
+        assignments = sql.SQL(', ').join(
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in update_columns
+        )
+        cursor.execute(sql.SQL("""
+            WITH merged AS (
+                INSERT INTO {target} ({cols}) {deduped}
+                ON CONFLICT ({keys}) DO UPDATE SET {assignments}
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+            FROM merged
+        """).format(target=target, cols=cols, deduped=deduped(last_wins=True), keys=keys,
+                    assignments=assignments))
+        row = cursor.fetchone()
+        inserted, updated = (row.values() if isinstance(row, dict) else row)
+    else:
+        # NOT EXISTS mirrors unique-index semantics even where the target has
+        # no unique constraint; ON CONFLICT covers concurrent loads where it does
+        matches = sql.SQL(' AND ').join(
+            sql.SQL("t.{0} = s.{0}").format(sql.Identifier(c)) for c in key_columns
+        )
+        not_stored = sql.SQL("WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE {matches})").format(
+            target=target, matches=matches)
+        cursor.execute(sql.SQL("""
+            INSERT INTO {target} ({cols})
+            {deduped}
+            ON CONFLICT DO NOTHING
+        """).format(target=target, cols=cols, deduped=deduped(not_stored)))
+        inserted, updated = cursor.rowcount, 0
+    
+    cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(staging))
+    
+    if inserted or updated:
+        notify_data_changed(cursor, table)
+    
+    return {
+        'staged': staged,
+        'inserted': inserted,
+        'updated': updated,
+        'duplicates': staged - inserted - updated
+    }
+
+
+class PartitionManager:
+    """
+    Monthly or weekly range partitions of air_quality_data on recorded_at.
+    
+    `ensure_partitions()` creates partitions ahead of time; readings outside
+    every partition land in the default partition and are moved into their
+    own partition once it is created. Retention drops whole partitions
+    instead of deleting rows, and partition pruning keeps time-range
+    queries to the partitions they touch.
+    """
+    
+    INTERVALS = ('month', 'week')
+    
+    def __init__(self, db, table='air_quality_data', interval='month', premake=3,
+                 check_interval=3600.0):
+        if interval not in self.INTERVALS:
+            raise ValueError(f"Unsupported partition interval: {interval}")
+        self.db = db
+        self.table = table
+        self.interval = interval
+        self.premake = premake
+        self.check_interval = check_interval
+        self._checked_at = None
+        self._lock = threading.Lock()
+    
+    @property
+    def default_partition(self):
+        return f"{self.table}_default"
+    
+    def period_start(self, ts):
+        """Start of the partition period containing `ts`"""
+        start = datetime(ts.year, ts.month, ts.day)
+        if self.interval == 'month':
+            return start.replace(day=1)
+        return start - timedelta(days=start.weekday())
+    
+    def next_period(self, start):
+        """Start of the partition period after the one beginning at `start`"""
+        if self.interval == 'month':
+            return (start + timedelta(days=32)).replace(day=1)
+        return start + timedelta(days=7)
+    
+    def partition_name(self, start):
+        """e.g. air_quality_data_2025_01 (monthly) or air_quality_data_2025_w03 (weekly)"""
+        if self.interval == 'month':
+            return f"{self.table}_{start:%Y_%m}"
+        return f"{self.table}_{start:%G_w%V}"
+    
+    def is_partitioned(self, cursor):
+        """Check whether the table is already range partitioned"""
+        cursor.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)
+            )
+        """, (self.table,))
+        row = cursor.fetchone()
+        return bool(row['exists'] if isinstance(row, dict) else row[0])
+    
+    def _create_partition(self, cursor, start):
+        """Create the partition starting at `start`; returns its name, or None if it exists"""
+        name = self.partition_name(start)
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cursor.fetchone()[0]:
+            return None
+        
+        end = self.next_period(start)
+        params = {'start': start, 'end': end}
+        identifiers = {'parent': sql.Identifier(self.table), 'part': sql.Identifier(name),
+                       'default': sql.Identifier(self.default_partition)}
+        
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (self.default_partition,))
+        has_default = cursor.fetchone()[0]
+        if has_default:
+            cursor.execute(sql.SQL("""
+                SELECT EXISTS (
+                    SELECT 1 FROM {default} WHERE recorded_at >= %(start)s AND recorded_at < %(end)s
+                )
+            """).format(**identifiers), params)
+            has_default = cursor.fetchone()[0]
+        
+        if has_default:
+            # Readings that arrived before the partition existed sit in the
+            # default partition and would block creating it; move them over
+            cursor.execute(sql.SQL(
+                "CREATE TABLE {part} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            ).format(**identifiers))
+            cursor.execute(sql.SQL("""
+                WITH moved AS (
+                    DELETE FROM {default}
+                    WHERE recorded_at >= %(start)s AND recorded_at < %(end)s
+                    RETURNING *
+                )
+                INSERT INTO {part} SELECT * FROM moved
+            """).format(**identifiers), params)
+            cursor.execute(sql.SQL(
+                "ALTER TABLE {parent} ATTACH PARTITION {part} FOR VALUES FROM (%(start)s) TO (%(end)s)"
+            ).format(**identifiers), params)
+        else:
+            cursor.execute(sql.SQL(
+                "CREATE TABLE {part} PARTITION OF {parent} FOR VALUES FROM (%(start)s) TO (%(end)s)"
+            ).format(**identifiers), params)
+        
+        logger.info(f"Created partition {name} [{start:%Y-%m-%d}, {end:%Y-%m-%d})")
+        return name
+    
+    def ensure_partitions(self, since=None, ahead=None, force=False):
+        """
+        Create any missing partitions from `since` (default: now) through
+        `ahead` periods into the future.
+        
+        Skipped if it already ran in this process within `check_interval`
+        seconds, so ingest paths can call it on every batch. Returns the
+        names of the partitions created.
+        """
+        now = time.monotonic()
+        if not force and since is None and self._checked_at is not None \
+                and now - self._checked_at < self.check_interval:
+            return []
+        
+        with self._lock:
+            created = []
+            with self.db.get_cursor(dict_cursor=False) as cursor:
+                if not self.is_partitioned(cursor):
+                    # Throttle the catalog check on unpartitioned installs too
+                    self._checked_at = time.monotonic()
+                    return created
+                
+                start = self.period_start(since or datetime.now())
+                last = self.period_start(datetime.now())
+                for _ in range(self.premake if ahead is None else ahead):
+                    last = self.next_period(last)
+                
+                while start <= last:
+                    name = self._create_partition(cursor, start)
+                    if name:
+                        created.append(name)
+                    start = self.next_period(start)
+            
+            self._checked_at = time.monotonic()
+            return created
+    
+    def list_partitions(self):
+        """Partitions with their bounds, estimated row counts and on-disk sizes"""
+        with self.db.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT 
+                    c.relname AS name,
+                    pg_get_expr(c.relpartbound, c.oid) AS bounds,
+                    GREATEST(c.reltuples, 0)::BIGINT AS estimated_rows,
+                    pg_total_relation_size(c.oid) AS total_bytes,
+                    pg_size_pretty(pg_total_relation_size(c.oid)) AS total_size
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(%s)
+                ORDER BY c.relname
+            """, (self.table,))
+            partitions = cursor.fetchall()
+        
+        for partition in partitions:
+            bounds = re.findall(r"'([^']+)'", partition['bounds'])
+            partition['range_start'] = datetime.fromisoformat(bounds[0]) if len(bounds) == 2 else None
+            partition['range_end'] = datetime.fromisoformat(bounds[1]) if len(bounds) == 2 else None
+            partition['is_default'] = partition['bounds'] == 'DEFAULT'
+        return partitions
+    
+    def drop_partitions_before(self, cutoff):
+        """
+        Drop every partition that ends on or before `cutoff`.
+        
+        Each partition is dropped in its own short transaction together with
+        the summary rows it fed. Readings older than `cutoff` in the
+        partition straddling it are kept until that partition ages out.
+        Returns the names of the dropped partitions.
+        """
+        dropped = []
+        for partition in self.list_partitions():
+            if partition['range_end'] is None or partition['range_end'] > cutoff:
+                continue
+            
+            params = {'start': partition['range_start'], 'end': partition['range_end']}
+            with self.db.get_cursor(dict_cursor=False) as cursor:
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(partition['name'])))
+                
+                # DROP bypasses the summary triggers; partitions start at midnight,
+                # so the daily rows they fed are exactly those in their range
+                cursor.execute("""
+                    DELETE FROM daily_air_quality_stats
+                    WHERE date >= %(start)s AND date < %(end)s
+                """, params)
+                cursor.execute("""
+                    SELECT recompute_summaries(
+                        ARRAY_AGG(station_id), ARRAY_AGG(pollutant_id), ARRAY_AGG(DATE(recorded_at))
+                    )
+                    FROM latest_station_readings
+                    WHERE recorded_at >= %(start)s AND recorded_at < %(end)s
+                    HAVING COUNT(*) > 0
+                """, params)
+                notify_data_changed(cursor, 'partitions')
+            
+            logger.info(f"Dropped partition {partition['name']} "
+                        f"({partition['estimated_rows']} rows, {partition['total_size']})")
+            dropped.append(partition['name'])
+        return dropped
+    
+    def apply_retention(self, retention_days):
+        """
+        Remove readings older than `retention_days`.
+        
+        Whole partitions are dropped; only stragglers in the default
+        partition are deleted row by row. Falls back to a plain DELETE if
+        the table is not partitioned.
+        """
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        
+        with self.db.get_cursor(dict_cursor=False) as cursor:
+            partitioned = self.is_partitioned(cursor)
+        
+        dropped = self.drop_partitions_before(cutoff) if partitioned else []
+        
+        with self.db.get_cursor(dict_cursor=False) as cursor:
+            if partitioned:
+                cursor.execute(sql.SQL("""
+                    DELETE FROM {}
+                    WHERE tableoid = to_regclass(%s) AND recorded_at < %s
+                """).format(sql.Identifier(self.table)), (self.default_partition, cutoff))
+            else:
+                cursor.execute(sql.SQL("DELETE FROM {} WHERE recorded_at < %s").format(
+                    sql.Identifier(self.table)), (cutoff,))
+            deleted_rows = cursor.rowcount
+            if deleted_rows:
+                notify_data_changed(cursor, self.table)
+        
+        return {
+            'cutoff': cutoff,
+            'dropped_partitions': dropped,
+            'deleted_rows': deleted_rows
+        }
+    
+    def convert_to_partitioned(self):
+        """
+        One-off migration of an existing unpartitioned table.
+        
+        Builds a partitioned copy with the same columns, constraints, indexes
+        and triggers, moves the rows across and swaps it in, all in one
+        transaction (the table is locked for the duration). The primary key
+        becomes (id, recorded_at), as partitioned tables require.
+        """
+        legacy = f"{self.table}_unpartitioned"
+        parent = sql.Identifier(self.table)
+        
+        with self.db.get_cursor(dict_cursor=False) as cursor:
+            if self.is_partitioned(cursor):
+                return False
+            
+            cursor.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(parent))
+            
+            # Definitions are captured before the rename so they name the new table
+            cursor.execute("""
+                SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid), indisprimary
+                FROM pg_index WHERE indrelid = to_regclass(%s)
+            """, (self.table,))
+            indexes = cursor.fetchall()
+            cursor.execute("""
+                SELECT pg_get_constraintdef(oid) FROM pg_constraint
+                WHERE conrelid = to_regclass(%s) AND contype = 'f'
+            """, (self.table,))
+            foreign_keys = [row[0] for row in cursor.fetchall()]
+            cursor.execute("""
+                SELECT pg_get_triggerdef(oid) FROM pg_trigger
+                WHERE tgrelid = to_regclass(%s) AND NOT tgisinternal
+            """, (self.table,))
+            triggers = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (self.table,))
+            sequence = cursor.fetchone()[0]
+            
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                parent, sql.Identifier(legacy)))
+            for index_name, _, _ in indexes:
+                cursor.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                    sql.Identifier(index_name),
+                    sql.Identifier(f"{index_name[:48]}_unpartitioned")))
+            
+            cursor.execute(sql.SQL("""
+                CREATE TABLE {parent} (
+                    LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+                    PRIMARY KEY (id, recorded_at)
+                ) PARTITION BY RANGE (recorded_at)
+            """).format(parent=parent, legacy=sql.Identifier(legacy)))
+            for definition in foreign_keys:
+                cursor.execute(sql.SQL("ALTER TABLE {} ADD {}").format(parent, sql.SQL(definition)))
+            for _, definition, is_primary in indexes:
+                if not is_primary:
+                    cursor.execute(definition)
+            cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+                sql.Identifier(self.default_partition), parent))
+            
+            cursor.execute(sql.SQL("SELECT MIN(recorded_at) FROM {}").format(sql.Identifier(legacy)))
+            oldest = cursor.fetchone()[0]
+            start = self.period_start(oldest or datetime.now())
+            last = self.period_start(datetime.now())
+            for _ in range(self.premake):
+                last = self.next_period(last)
+            while start <= last:
+                self._create_partition(cursor, start)
+                start = self.next_period(start)
+            
+            cursor.execute(sql.SQL("INSERT INTO {} SELECT * FROM {}").format(
+                parent, sql.Identifier(legacy)))
+            moved = cursor.rowcount
+            
+            # Summaries already cover these rows, so triggers go on after the copy
+            for definition in triggers:
+                cursor.execute(definition)
+            if sequence:
+                cursor.execute(sql.SQL("ALTER SEQUENCE {} OWNED BY {}.id").format(
+                    sql.SQL(sequence), parent))
+            cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(legacy)))
+        
+        self._checked_at = time.monotonic()
+        logger.info(f"Converted {self.table} to range partitions by {self.interval} ({moved} rows)")
+        return True
+
 
 class DatabaseManager:
     """Manages all database operations"""
     
-    def __init__(self, connection_string=None):
+    def __init__(self, connection_string=None, pool_min_size=None, pool_max_size=None,
+                 pool_timeout=None, view_max_staleness=None):
         """Initialize database manager"""
         self.connection_string = connection_string or os.getenv('DATABASE_URL')
         if not self.connection_string:
             raise ValueError("DATABASE_URL environment variable not set")
+        
+        self.pool = ConnectionPool(
+            self.connection_string,
+            min_size=pool_min_size if pool_min_size is not None else int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+            max_size=pool_max_size if pool_max_size is not None else int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            timeout=pool_timeout if pool_timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 30))
+        )
+        self.aqi_categories = AQICategoryIndex()
+        
+        # Materialized views older than this are bypassed in favour of raw tables
+        self.view_max_staleness = (
+            view_max_staleness if view_max_staleness is not None
+            else float(os.getenv('VIEW_MAX_STALENESS_SECONDS', 7200))
+        )
+        
+        self.partitions = PartitionManager(
+            self,
+            interval=os.getenv('PARTITION_INTERVAL', 'month'),
+            premake=int(os.getenv('PARTITION_PREMAKE', 3))
+        )
     
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
+        """Context manager for pooled database connections"""
         conn = None
+        broken = False
         try:
-            conn = psycopg2.connect(self.connection_string)
+            conn = self.pool.getconn()
             yield conn
             conn.commit()
         except Exception as e:
             if conn:
-                conn.rollback()
+                broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+                if not conn.closed:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        broken = True
             logger.error(f"Database error: {e}")
             raise
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn, close=broken)
+    
+    def get_pool_metrics(self):
+        """Get connection pool metrics"""
+        return self.pool.get_metrics()
+    
+    def close(self):
+        """Close all pooled connections"""
+        self.pool.closeall()
     
     @contextmanager
     def get_cursor(self, dict_cursor=True):
@@ -64,6 +791,7 @@ class DatabaseManager:
                 cursor.execute(schema_sql)
                 cursor.close()
             
+            self.partitions.ensure_partitions(force=True)
             logger.info("Database schema initialized successfully")
             return True
         except Exception as e:
@@ -88,16 +816,69 @@ class DatabaseManager:
             return cursor.fetchone()
     
     def refresh_materialized_views(self):
-        """Refresh materialized views for better performance"""
+        """
+        Rebuild the summary tables from scratch.
+        
+        Triggers keep them current on every insert, update and delete, so
+        this is only a repair for data removed behind their back.
+        """
         try:
             with self.get_cursor(dict_cursor=False) as cursor:
                 cursor.execute("SELECT refresh_materialized_views()")
+                notify_data_changed(cursor, 'materialized_views')
             logger.info("Materialized views refreshed successfully")
             return True
         except Exception as e:
             logger.error(f"Failed to refresh materialized views: {e}")
             return False
     
+    def _get_view_freshness(self, cursor, view_name):
+        """
+        Decide whether a query can be served from a materialized view.
+        
+        Returns a metadata dict with `use_view`, the last refresh time, the
+        newest reading the view covers and its staleness in seconds.
+        Incrementally maintained summaries cover every reading and report a
+        staleness of zero.
+        """
+        freshness = {'view': view_name, 'use_view': False, 'refreshed_at': None,
+                     'covered_until': None, 'staleness_seconds': None}
+        try:
+            cursor.execute("SAVEPOINT view_freshness")
+            cursor.execute("""
+                SELECT refreshed_at, covered_until,
+                       CASE WHEN incremental THEN 0
+                            ELSE EXTRACT(EPOCH FROM LOCALTIMESTAMP - refreshed_at)
+                       END AS staleness_seconds
+                FROM materialized_view_refreshes
+                WHERE view_name = %s
+            """, (view_name,))
+            row = cursor.fetchone()
+            cursor.execute("RELEASE SAVEPOINT view_freshness")
+        except (pg_errors.UndefinedTable, pg_errors.UndefinedColumn):
+            # Schema predates refresh tracking
+            cursor.execute("ROLLBACK TO SAVEPOINT view_freshness")
+            return freshness
+        
+        if row:
+            row = dict(row) if isinstance(row, dict) else dict(zip(
+                ('refreshed_at', 'covered_until', 'staleness_seconds'), row))
+            freshness.update(row)
+            freshness['staleness_seconds'] = float(row['staleness_seconds'])
+            freshness['use_view'] = freshness['staleness_seconds'] <= self.view_max_staleness
+        return freshness
+    
+    @staticmethod
+    def _route_metadata(freshness):
+        """Describe where a routed query was answered from"""
+        return {
+            'source': 'materialized_view' if freshness['use_view'] else 'raw_tables',
+            'view': freshness['view'],
+            'view_refreshed_at': freshness['refreshed_at'].isoformat() if freshness['refreshed_at'] else None,
+            'view_covered_until': freshness['covered_until'].isoformat() if freshness['covered_until'] else None,
+            'view_staleness_seconds': freshness['staleness_seconds']
+        }
+    
     # ========================================================================
     # STATIONS OPERATIONS
     # ========================================================================
@@ -131,6 +912,7 @@ class DatabaseManager:
                 station_data.get('is_active', True),
                 datetime.now()
             ))
+            notify_data_changed(cursor, 'stations')
     
     def get_all_stations(self, active_only=True):
         """Get all monitoring stations"""
@@ -159,18 +941,9 @@ class DatabaseManager:
     
     def insert_air_quality_data(self, data):
         """Insert air quality reading"""
+        self.partitions.ensure_partitions()
         with self.get_cursor(dict_cursor=False) as cursor:
-            # Get AQI category ID
-            aqi_category_id = None
-            if data.get('aqi'):
-                cursor.execute("""
-                    SELECT category_id FROM aqi_categories
-                    WHERE %s BETWEEN min_aqi AND max_aqi
-                    LIMIT 1
-                """, (data['aqi'],))
-                result = cursor.fetchone()
-                if result:
-                    aqi_category_id = result[0]
+            aqi_category_id = self.aqi_categories.lookup(cursor, data.get('aqi'))
             
             cursor.execute("""
                 INSERT INTO air_quality_data (
@@ -197,25 +970,20 @@ class DatabaseManager:
                 data.get('data_source'),
                 data.get('data_quality_flag', 'GOOD')
             ))
+            notify_data_changed(cursor, 'air_quality_data')
     
-    def bulk_insert_air_quality_data(self, data_list):
-        """Bulk insert air quality readings for better performance"""
+    def bulk_insert_air_quality_data(self, data_list, batch_size=1000):
+        """Bulk insert air quality readings, one INSERT statement per batch"""
+        self.partitions.ensure_partitions()
         with self.get_cursor(dict_cursor=False) as cursor:
+            # Assign AQI categories for the whole batch at once
+            category_ids = self.aqi_categories.lookup_many(
+                cursor, [data.get('aqi') for data in data_list]
+            )
+            
             # Prepare data tuples
             values = []
-            for data in data_list:
-                # Get AQI category ID
-                aqi_category_id = None
-                if data.get('aqi'):
-                    cursor.execute("""
-                        SELECT category_id FROM aqi_categories
-                        WHERE %s BETWEEN min_aqi AND max_aqi
-                        LIMIT 1
-                    """, (data['aqi'],))
-                    result = cursor.fetchone()
-                    if result:
-                        aqi_category_id = result[0]
-                
+            for data, aqi_category_id in zip(data_list, category_ids):
                 values.append((
                     data['station_id'],
                     data['recorded_at'],
@@ -243,30 +1011,102 @@ class DatabaseManager:
                     temperature, humidity, wind_speed, wind_direction, pressure,
                     data_source, data_quality_flag
                 ) VALUES %s
-            """, values)
+            """, values, page_size=batch_size)
+            
+            if values:
+                notify_data_changed(cursor, 'air_quality_data')
             
             logger.info(f"Bulk inserted {len(values)} air quality readings")
     
-    def get_latest_readings(self, limit=50, city=None):
-        """Get latest air quality readings"""
+    def copy_air_quality_data(self, data_iter, batch_size=5000):
+        """
+        Stream air quality readings into the database with COPY.
+        
+        Accepts any iterable of reading dicts (same shape as
+        bulk_insert_air_quality_data) and loads it in a handful of statements.
+        Readings that already exist for the same station, time, pollutant and
+        source are skipped. Returns inserted/duplicate counts.
+        """
+        columns = [
+            'station_id', 'recorded_at', 'pollutant_id',
+            'pollutant_avg', 'pollutant_min', 'pollutant_max',
+            'aqi', 'aqi_category_id',
+            'temperature', 'humidity', 'wind_speed', 'wind_direction', 'pressure',
+            'data_source', 'data_quality_flag'
+        ]
+        
+        self.partitions.ensure_partitions()
+        with self.get_cursor(dict_cursor=False) as cursor:
+            def rows():
+                iterator = iter(data_iter)
+                while True:
+                    batch = list(islice(iterator, batch_size))
+                    if not batch:
+                        return
+                    # The connection is busy with COPY here, so use the cache as-is
+                    category_ids = self.aqi_categories.lookup_many(
+                        None, [data.get('aqi') for data in batch]
+                    )
+                    for data, aqi_category_id in zip(batch, category_ids):
+                        yield (
+                            data['station_id'],
+                            data['recorded_at'],
+                            data['pollutant_id'],
+                            data.get('pollutant_avg'),
+                            data.get('pollutant_min'),
+                            data.get('pollutant_max'),
+                            data.get('aqi'),
+                            aqi_category_id,
+                            data.get('temperature'),
+                            data.get('humidity'),
+                            data.get('wind_speed'),
+                            data.get('wind_direction'),
+                            data.get('pressure'),
+                            data.get('data_source'),
+                            data.get('data_quality_flag', 'GOOD')
+                        )
+            
+            # Load categories before COPY starts streaming on this connection
+            self.aqi_categories.lookup_many(cursor, [])
+            counts = copy_merge(
+                cursor, 'air_quality_data', columns, rows(),
+                key_columns=['station_id', 'pollutant_id', 'recorded_at', 'data_source']
+            )
+        
+        logger.info(
+            f"COPY loaded {counts['staged']} readings: "
+            f"{counts['inserted']} inserted, {counts['duplicates']} duplicates"
+        )
+        return counts
+    
+    _LATEST_COLUMNS = """
+        aq.id,
+        s.station_id,
+        s.station_name,
+        s.city,
+        s.state,
+        aq.recorded_at,
+        aq.pollutant_id,
+        p.pollutant_name,
+        aq.pollutant_avg,
+        aq.aqi,
+        ac.category_name AS aqi_category,
+        ac.color_code,
+        aq.temperature,
+        aq.humidity,
+        aq.data_source
+    """
+    
+    def get_latest_readings(self, limit=50, city=None, with_metadata=False):
+        """
+        Get the latest `limit` readings (optionally for one city), newest first.
+        
+        Always a top-N scan of the base table, which the recorded_at index
+        serves directly. With `with_metadata`, returns (rows, metadata).
+        """
         with self.get_cursor() as cursor:
-            query = """
-                SELECT 
-                    aq.id,
-                    s.station_id,
-                    s.station_name,
-                    s.city,
-                    s.state,
-                    aq.recorded_at,
-                    aq.pollutant_id,
-                    p.pollutant_name,
-                    aq.pollutant_avg,
-                    aq.aqi,
-                    ac.category_name AS aqi_category,
-                    ac.color_code,
-                    aq.temperature,
-                    aq.humidity,
-                    aq.data_source
+            query = f"""
+                SELECT {self._LATEST_COLUMNS}
                 FROM air_quality_data aq
                 JOIN stations s ON aq.station_id = s.station_id
                 JOIN pollutants p ON aq.pollutant_id = p.pollutant_id
@@ -274,57 +1114,215 @@ class DatabaseManager:
             """
             
             if city:
-                query += " WHERE LOWER(s.city) = LOWER(%s)"
-                query += " ORDER BY aq.recorded_at DESC LIMIT %s"
-                cursor.execute(query, (city, limit))
-            else:
-                query += " ORDER BY aq.recorded_at DESC LIMIT %s"
-                cursor.execute(query, (limit,))
+                query += " WHERE LOWER(s.city) = LOWER(%(city)s)"
+            query += " ORDER BY aq.recorded_at DESC LIMIT %(limit)s"
             
-            return cursor.fetchall()
+            cursor.execute(query, {'city': city, 'limit': limit})
+            rows = cursor.fetchall()
+        
+        if with_metadata:
+            return rows, self._route_metadata({
+                'view': None, 'use_view': False, 'refreshed_at': None,
+                'covered_until': None, 'staleness_seconds': None
+            })
+        return rows
     
-    def get_station_readings(self, station_id, hours=24):
-        """Get readings for a specific station"""
+    def get_latest_station_readings(self, limit=50, city=None, with_metadata=False):
+        """
+        Get each station/pollutant's newest reading (optionally for one city).
+        
+        Served from latest_station_readings plus any base-table rows newer
+        than the view covers, falling back to a raw DISTINCT ON scan when the
+        view is too stale. With `with_metadata`, returns (rows, metadata).
+        """
         with self.get_cursor() as cursor:
-            cursor.execute("""
-                SELECT 
-                    aq.recorded_at,
-                    aq.pollutant_id,
-                    p.pollutant_name,
-                    aq.pollutant_avg,
-                    aq.aqi,
-                    ac.category_name AS aqi_category,
-                    aq.temperature,
-                    aq.humidity
-                FROM air_quality_data aq
+            freshness = self._get_view_freshness(cursor, 'latest_station_readings')
+            
+            if freshness['use_view']:
+                source = """
+                    SELECT id, station_id, recorded_at, pollutant_id, pollutant_avg,
+                           aqi, aqi_category_id, temperature, humidity, data_source
+                    FROM latest_station_readings
+                    UNION ALL
+                    SELECT id, station_id, recorded_at, pollutant_id, pollutant_avg,
+                           aqi, aqi_category_id, temperature, humidity, data_source
+                    FROM air_quality_data
+                    WHERE recorded_at > COALESCE(%(covered_until)s::timestamp, '-infinity'::timestamp)
+                """
+            else:
+                source = """
+                    SELECT id, station_id, recorded_at, pollutant_id, pollutant_avg,
+                           aqi, aqi_category_id, temperature, humidity, data_source
+                    FROM air_quality_data
+                """
+            
+            query = f"""
+                WITH latest AS (
+                    SELECT DISTINCT ON (station_id, pollutant_id) *
+                    FROM ({source}) combined
+                    ORDER BY station_id, pollutant_id, recorded_at DESC, id DESC
+                )
+                SELECT {self._LATEST_COLUMNS}
+                FROM latest aq
+                JOIN stations s ON aq.station_id = s.station_id
                 JOIN pollutants p ON aq.pollutant_id = p.pollutant_id
                 LEFT JOIN aqi_categories ac ON aq.aqi_category_id = ac.category_id
-                WHERE aq.station_id = %s
-                    AND aq.recorded_at >= NOW() - INTERVAL '%s hours'
-                ORDER BY aq.recorded_at DESC
-            """, (station_id, hours))
-            return cursor.fetchall()
+            """
+            
+            if city:
+                query += " WHERE LOWER(s.city) = LOWER(%(city)s)"
+            query += " ORDER BY aq.recorded_at DESC LIMIT %(limit)s"
+            
+            cursor.execute(query, {
+                'covered_until': freshness['covered_until'],
+                'city': city,
+                'limit': limit
+            })
+            rows = cursor.fetchall()
+        
+        if with_metadata:
+            return rows, self._route_metadata(freshness)
+        return rows
+    
+    # Readings are paged by keyset on (recorded_at, id): `after` is the
+    # (recorded_at, id) of the last row of the previous page, so each page
+    # is an index range scan however deep the client has paged
+    
+    @staticmethod
+    def _keyset_clause(after, descending, alias='aq'):
+        if after is None:
+            return ""
+        op = '<' if descending else '>'
+        return f" AND ({alias}.recorded_at, {alias}.id) {op} (%(after_recorded_at)s, %(after_id)s)"
+    
+    @staticmethod
+    def _keyset_params(params, after, limit):
+        if after is not None:
+            params['after_recorded_at'], params['after_id'] = after
+        params['limit'] = limit
+        return params
+    
+    def _station_readings_query(self, station_id, hours, after=None, limit=None):
+        query = """
+            SELECT 
+                aq.id,
+                aq.recorded_at,
+                aq.pollutant_id,
+                p.pollutant_name,
+                aq.pollutant_avg,
+                aq.aqi,
+                ac.category_name AS aqi_category,
+                aq.temperature,
+                aq.humidity
+            FROM air_quality_data aq
+            JOIN pollutants p ON aq.pollutant_id = p.pollutant_id
+            LEFT JOIN aqi_categories ac ON aq.aqi_category_id = ac.category_id
+            WHERE aq.station_id = %(station_id)s
+                AND aq.recorded_at >= NOW() - %(hours)s * INTERVAL '1 hour'
+        """ + self._keyset_clause(after, descending=True) + """
+            ORDER BY aq.recorded_at DESC, aq.id DESC
+            LIMIT %(limit)s
+        """
+        return query, self._keyset_params({'station_id': station_id, 'hours': hours}, after, limit)
     
-    def get_time_series_data(self, station_id, pollutant_id, days=7):
-        """Get time-series data for ML training"""
+    def _city_readings_query(self, city, days=None, after=None, limit=None):
+        query = """
+            SELECT 
+                aq.id,
+                s.station_id,
+                s.station_name,
+                s.city,
+                s.state,
+                aq.recorded_at,
+                aq.pollutant_id,
+                p.pollutant_name,
+                aq.pollutant_avg,
+                aq.aqi,
+                ac.category_name AS aqi_category,
+                ac.color_code,
+                aq.temperature,
+                aq.humidity,
+                aq.data_source
+            FROM air_quality_data aq
+            JOIN stations s ON aq.station_id = s.station_id
+            JOIN pollutants p ON aq.pollutant_id = p.pollutant_id
+            LEFT JOIN aqi_categories ac ON aq.aqi_category_id = ac.category_id
+            WHERE LOWER(s.city) = LOWER(%(city)s)
+        """
+        if days is not None:
+            query += " AND aq.recorded_at >= NOW() - %(days)s * INTERVAL '1 day'"
+        query += self._keyset_clause(after, descending=True) + """
+            ORDER BY aq.recorded_at DESC, aq.id DESC
+            LIMIT %(limit)s
+        """
+        return query, self._keyset_params({'city': city, 'days': days}, after, limit)
+    
+    def _time_series_query(self, station_id, pollutant_id, days, after=None, limit=None):
+        query = """
+            SELECT 
+                id,
+                recorded_at,
+                pollutant_avg,
+                aqi,
+                temperature,
+                humidity,
+                wind_speed,
+                pressure
+            FROM air_quality_data aq
+            WHERE station_id = %(station_id)s
+                AND pollutant_id = %(pollutant_id)s
+                AND recorded_at >= NOW() - %(days)s * INTERVAL '1 day'
+        """ + self._keyset_clause(after, descending=False) + """
+            ORDER BY recorded_at ASC, id ASC
+            LIMIT %(limit)s
+        """
+        return query, self._keyset_params(
+            {'station_id': station_id, 'pollutant_id': pollutant_id, 'days': days}, after, limit)
+    
+    def _fetch_all(self, query, params):
         with self.get_cursor() as cursor:
-            cursor.execute("""
-                SELECT 
-                    recorded_at,
-                    pollutant_avg,
-                    aqi,
-                    temperature,
-                    humidity,
-                    wind_speed,
-                    pressure
-                FROM air_quality_data
-                WHERE station_id = %s
-                    AND pollutant_id = %s
-                    AND recorded_at >= NOW() - INTERVAL '%s days'
-                ORDER BY recorded_at ASC
-            """, (station_id, pollutant_id, days))
+            cursor.execute(query, params)
             return cursor.fetchall()
     
+    def stream_query(self, query, params=None, itersize=2000):
+        """
+        Yield rows from a server-side (named) cursor, fetching `itersize` at
+        a time, so memory stays flat however many rows match. The pooled
+        connection is held until the generator is exhausted or closed.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor(name=f"stream_{os.urandom(6).hex()}", cursor_factory=RealDictCursor)
+            cursor.itersize = itersize
+            try:
+                cursor.execute(query, params)
+                yield from cursor
+            finally:
+                cursor.close()
+    
+    def get_station_readings(self, station_id, hours=24, after=None, limit=None):
+        """Get readings for a specific station, newest first (optionally one keyset page)"""
+        return self._fetch_all(*self._station_readings_query(station_id, hours, after, limit))
+    
+    def stream_station_readings(self, station_id, hours=24, after=None):
+        """Stream a station's readings, newest first, through a server-side cursor"""
+        return self.stream_query(*self._station_readings_query(station_id, hours, after))
+    
+    def get_city_readings(self, city, days=None, after=None, limit=None):
+        """Get readings for every station in a city, newest first (optionally one keyset page)"""
+        return self._fetch_all(*self._city_readings_query(city, days, after, limit))
+    
+    def stream_city_readings(self, city, days=None, after=None):
+        """Stream a city's readings, newest first, through a server-side cursor"""
+        return self.stream_query(*self._city_readings_query(city, days, after))
+    
+    def get_time_series_data(self, station_id, pollutant_id, days=7, after=None, limit=None):
+        """Get time-series data for ML training, oldest first (optionally one keyset page)"""
+        return self._fetch_all(*self._time_series_query(station_id, pollutant_id, days, after, limit))
+    
+    def stream_time_series_data(self, station_id, pollutant_id, days=7, after=None):
+        """Stream time-series data, oldest first, through a server-side cursor"""
+        return self.stream_query(*self._time_series_query(station_id, pollutant_id, days, after))
+    
     # ========================================================================
     # PREDICTIONS OPERATIONS
     # ========================================================================
@@ -332,17 +1330,9 @@ class DatabaseManager:
     def insert_prediction(self, prediction_data):
         """Insert AQI prediction"""
         with self.get_cursor(dict_cursor=False) as cursor:
-            # Get predicted category ID
-            predicted_category_id = None
-            if prediction_data.get('predicted_aqi'):
-                cursor.execute("""
-                    SELECT category_id FROM aqi_categories
-                    WHERE %s BETWEEN min_aqi AND max_aqi
-                    LIMIT 1
-                """, (prediction_data['predicted_aqi'],))
-                result = cursor.fetchone()
-                if result:
-                    predicted_category_id = result[0]
+            predicted_category_id = self.aqi_categories.lookup(
+                cursor, prediction_data.get('predicted_aqi')
+            )
             
             cursor.execute("""
                 INSERT INTO predictions (
@@ -367,6 +1357,128 @@ class DatabaseManager:
             
             return cursor.fetchone()[0]
     
+    def bulk_insert_predictions(self, predictions):
+        """Insert many AQI predictions in one statement; returns their ids in order"""
+        if not predictions:
+            return []
+        
+        with self.get_cursor(dict_cursor=False) as cursor:
+            category_ids = self.aqi_categories.lookup_many(
+                cursor, [prediction.get('predicted_aqi') for prediction in predictions]
+            )
+            
+            now = datetime.now()
+            values = [
+                (
+                    prediction['station_id'],
+                    prediction.get('prediction_time', now),
+                    prediction['predicted_for'],
+                    prediction['model_name'],
+                    prediction['predicted_aqi'],
+                    predicted_category_id,
+                    prediction.get('confidence_lower'),
+                    prediction.get('confidence_upper'),
+                    prediction.get('model_version', '1.0'),
+                    Json(prediction['features_used']) if prediction.get('features_used') is not None else None
+                )
+                for prediction, predicted_category_id in zip(predictions, category_ids)
+            ]
+            
+            rows = execute_values(cursor, """
+                INSERT INTO predictions (
+                    station_id, prediction_time, predicted_for,
+                    model_name, predicted_aqi, predicted_category_id,
+                    confidence_lower, confidence_upper,
+                    model_version, features_used
+                ) VALUES %s
+                RETURNING id
+            """, values, page_size=len(values), fetch=True)
+            
+            logger.info(f"Bulk inserted {len(rows)} predictions")
+            return [row[0] for row in rows]
+    
+    def get_station_feature_snapshots(self, station_ids):
+        """
+        Current model inputs for many stations in one query.
+        
+        For each station: the latest value of every pollutant, the latest
+        weather reading, and PM2.5 lags and rolling statistics relative to
+        its latest PM2.5 reading. Time-of-day features are left to the caller.
+        """
+        with self.get_cursor() as cursor:
+            cursor.execute("""
+                WITH ids AS (
+                    SELECT DISTINCT unnest(%s::varchar[]) AS station_id
+                ),
+                latest AS (
+                    SELECT 
+                        l.station_id,
+                        MAX(l.recorded_at) FILTER (WHERE l.pollutant_id = 'PM2.5') AS recorded_at,
+                        MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'PM2.5') AS pm25,
+                        MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'PM10') AS pm10,
+                        MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'NO2') AS no2,
+                        MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'SO2') AS so2,
+                        MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'CO') AS co,
+                        MAX(l.pollutant_avg) FILTER (WHERE l.pollutant_id = 'O3') AS o3
+                    FROM latest_station_readings l
+                    JOIN ids ON ids.station_id = l.station_id
+                    GROUP BY l.station_id
+                )
+                SELECT 
+                    latest.*,
+                    w.temperature,
+                    w.humidity,
+                    w.wind_speed,
+                    w.pressure,
+                    w.temperature_lag_1h,
+                    h.pm25_lag_1h,
+                    h.pm25_lag_3h,
+                    h.pm25_lag_24h,
+                    h.pm25_rolling_mean_6h,
+                    h.pm25_rolling_std_6h,
+                    h.pm25_rolling_mean_24h
+                FROM latest
+                LEFT JOIN LATERAL (
+                    SELECT 
+                        (ARRAY_AGG(aq.temperature ORDER BY aq.recorded_at DESC))[1] AS temperature,
+                        (ARRAY_AGG(aq.humidity ORDER BY aq.recorded_at DESC))[1] AS humidity,
+                        (ARRAY_AGG(aq.wind_speed ORDER BY aq.recorded_at DESC))[1] AS wind_speed,
+                        (ARRAY_AGG(aq.pressure ORDER BY aq.recorded_at DESC))[1] AS pressure,
+                        (ARRAY_AGG(aq.temperature ORDER BY aq.recorded_at DESC)
+                            FILTER (WHERE aq.recorded_at <= latest.recorded_at - INTERVAL '1 hour'))[1]
+                            AS temperature_lag_1h
+                    FROM air_quality_data aq
+                    WHERE aq.station_id = latest.station_id
+                        AND aq.pollutant_id = 'PM2.5'
+                        AND aq.temperature IS NOT NULL
+                        AND aq.recorded_at > latest.recorded_at - INTERVAL '25 hours'
+                        AND aq.recorded_at <= latest.recorded_at
+                ) w ON TRUE
+                LEFT JOIN LATERAL (
+                    SELECT 
+                        (ARRAY_AGG(aq.pollutant_avg ORDER BY aq.recorded_at DESC)
+                            FILTER (WHERE aq.recorded_at <= latest.recorded_at - INTERVAL '1 hour'))[1] AS pm25_lag_1h,
+                        (ARRAY_AGG(aq.pollutant_avg ORDER BY aq.recorded_at DESC)
+                            FILTER (WHERE aq.recorded_at <= latest.recorded_at - INTERVAL '3 hours'))[1] AS pm25_lag_3h,
+                        (ARRAY_AGG(aq.pollutant_avg ORDER BY aq.recorded_at DESC)
+                            FILTER (WHERE aq.recorded_at <= latest.recorded_at - INTERVAL '24 hours'))[1] AS pm25_lag_24h,
+                        AVG(aq.pollutant_avg)
+                            FILTER (WHERE aq.recorded_at > latest.recorded_at - INTERVAL '6 hours') AS pm25_rolling_mean_6h,
+                        STDDEV_SAMP(aq.pollutant_avg)
+                            FILTER (WHERE aq.recorded_at > latest.recorded_at - INTERVAL '6 hours') AS pm25_rolling_std_6h,
+                        AVG(aq.pollutant_avg)
+                            FILTER (WHERE aq.recorded_at > latest.recorded_at - INTERVAL '24 hours') AS pm25_rolling_mean_24h
+                    FROM air_quality_data aq
+                    WHERE aq.station_id = latest.station_id
+                        AND aq.pollutant_id = 'PM2.5'
+                        AND aq.pollutant_avg IS NOT NULL
+                        AND aq.recorded_at > latest.recorded_at - INTERVAL '25 hours'
+                        AND aq.recorded_at <= latest.recorded_at
+                ) h ON TRUE
+                WHERE latest.recorded_at IS NOT NULL
+            """, (list(station_ids),))
+            return cursor.fetchall()
+    
     def get_predictions(self, station_id=None, hours_ahead=24):
         """Get predictions"""
         with self.get_cursor() as cursor:
@@ -404,24 +1516,45 @@ class DatabaseManager:
     # ANALYTICS
     # ========================================================================
     
-    def get_city_summary(self, city):
-        """Get summary statistics for a city"""
+    def get_city_summary(self, city, with_metadata=False):
+        """
+        Get summary statistics for a city.
+        
+        Uses latest_station_readings plus base-table rows newer than the view
+        covers when the view is fresh enough, otherwise scans the raw table.
+        With `with_metadata`, returns (row, metadata).
+        """
         with self.get_cursor() as cursor:
-            cursor.execute("""
-                WITH latest_readings AS (
-                    SELECT DISTINCT ON (s.station_id, aq.pollutant_id)
-                        s.station_id,
-                        s.station_name,
-                        aq.pollutant_id,
-                        aq.pollutant_avg,
-                        aq.aqi,
-                        ac.category_name,
-                        aq.recorded_at
+            freshness = self._get_view_freshness(cursor, 'latest_station_readings')
+            
+            if freshness['use_view']:
+                source = """
+                    SELECT v.station_id, v.pollutant_id, v.aqi, v.recorded_at
+                    FROM latest_station_readings v
+                    JOIN stations s ON v.station_id = s.station_id
+                    WHERE LOWER(s.city) = LOWER(%(city)s)
+                    UNION ALL
+                    SELECT aq.station_id, aq.pollutant_id, aq.aqi, aq.recorded_at
+                    FROM air_quality_data aq
+                    JOIN stations s ON aq.station_id = s.station_id
+                    WHERE LOWER(s.city) = LOWER(%(city)s)
+                        AND aq.recorded_at > COALESCE(%(covered_until)s::timestamp, '-infinity'::timestamp)
+                """
+            else:
+                source = """
+                    SELECT aq.station_id, aq.pollutant_id, aq.aqi, aq.recorded_at
                     FROM air_quality_data aq
                     JOIN stations s ON aq.station_id = s.station_id
-                    LEFT JOIN aqi_categories ac ON aq.aqi_category_id = ac.category_id
-                    WHERE LOWER(s.city) = LOWER(%s)
-                    ORDER BY s.station_id, aq.pollutant_id, aq.recorded_at DESC
+                    WHERE LOWER(s.city) = LOWER(%(city)s)
+                """
+            
+            cursor.execute("""
+                WITH readings AS (""" + source + """),
+                latest_readings AS (
+                    SELECT DISTINCT ON (station_id, pollutant_id)
+                        station_id, aqi, recorded_at
+                    FROM readings
+                    ORDER BY station_id, pollutant_id, recorded_at DESC
                 )
                 SELECT 
                     COUNT(DISTINCT station_id) AS total_stations,
@@ -430,26 +1563,88 @@ class DatabaseManager:
                     MIN(aqi) AS min_aqi,
                     MAX(recorded_at) AS last_updated
                 FROM latest_readings
-            """, (city,))
-            return cursor.fetchone()
+            """, {'city': city, 'covered_until': freshness['covered_until']})
+            row = cursor.fetchone()
+        
+        if with_metadata:
+            return row, self._route_metadata(freshness)
+        return row
     
-    def get_pollutant_trends(self, pollutant_id, days=7):
-        """Get pollutant trends across all stations"""
+    def get_pollutant_trends(self, pollutant_id, days=7, with_metadata=False):
+        """
+        Get pollutant trends across all stations.
+        
+        Whole days covered by daily_air_quality_stats are read from the view;
+        the partial first day of the window and days since the last refresh
+        come from the base table. Mixed results count only readings with a
+        value, as the view does. With `with_metadata`, returns (rows, metadata).
+        """
         with self.get_cursor() as cursor:
-            cursor.execute("""
-                SELECT 
-                    DATE(recorded_at) AS date,
-                    AVG(pollutant_avg) AS avg_concentration,
-                    MIN(pollutant_avg) AS min_concentration,
-                    MAX(pollutant_avg) AS max_concentration,
-                    COUNT(*) AS reading_count
-                FROM air_quality_data
-                WHERE pollutant_id = %s
-                    AND recorded_at >= NOW() - INTERVAL '%s days'
-                GROUP BY DATE(recorded_at)
-                ORDER BY date DESC
-            """, (pollutant_id, days))
-            return cursor.fetchall()
+            freshness = self._get_view_freshness(cursor, 'daily_air_quality_stats')
+            
+            if freshness['use_view']:
+                cursor.execute("""
+                    WITH bounds AS (
+                        SELECT 
+                            NOW()::timestamp - %(days)s * INTERVAL '1 day' AS window_start,
+                            DATE_TRUNC('day', COALESCE(%(covered_until)s::timestamp, '-infinity'::timestamp)) AS raw_from
+                    ),
+                    daily AS (
+                        SELECT 
+                            d.date,
+                            SUM(d.avg_pollutant * d.reading_count) AS total,
+                            MIN(d.min_pollutant) AS min_concentration,
+                            MAX(d.max_pollutant) AS max_concentration,
+                            SUM(d.reading_count) AS reading_count
+                        FROM daily_air_quality_stats d, bounds b
+                        WHERE d.pollutant_id = %(pollutant_id)s
+                            AND d.date > DATE(b.window_start)
+                            AND d.date < b.raw_from
+                        GROUP BY d.date
+                        UNION ALL
+                        SELECT 
+                            DATE(aq.recorded_at),
+                            SUM(aq.pollutant_avg),
+                            MIN(aq.pollutant_avg),
+                            MAX(aq.pollutant_avg),
+                            COUNT(aq.pollutant_avg)
+                        FROM air_quality_data aq, bounds b
+                        WHERE aq.pollutant_id = %(pollutant_id)s
+                            AND aq.recorded_at >= b.window_start
+                            AND (aq.recorded_at < DATE_TRUNC('day', b.window_start) + INTERVAL '1 day'
+                                 OR aq.recorded_at >= b.raw_from)
+                        GROUP BY DATE(aq.recorded_at)
+                    )
+                    SELECT 
+                        date,
+                        SUM(total) / NULLIF(SUM(reading_count), 0) AS avg_concentration,
+                        MIN(min_concentration) AS min_concentration,
+                        MAX(max_concentration) AS max_concentration,
+                        SUM(reading_count) AS reading_count
+                    FROM daily
+                    GROUP BY date
+                    ORDER BY date DESC
+                """, {'pollutant_id': pollutant_id, 'days': days,
+                      'covered_until': freshness['covered_until']})
+            else:
+                cursor.execute("""
+                    SELECT 
+                        DATE(recorded_at) AS date,
+                        AVG(pollutant_avg) AS avg_concentration,
+                        MIN(pollutant_avg) AS min_concentration,
+                        MAX(pollutant_avg) AS max_concentration,
+                        COUNT(*) AS reading_count
+                    FROM air_quality_data
+                    WHERE pollutant_id = %s
+                        AND recorded_at >= NOW() - INTERVAL '%s days'
+                    GROUP BY DATE(recorded_at)
+                    ORDER BY date DESC
+                """, (pollutant_id, days))
+            rows = cursor.fetchall()
+        
+        if with_metadata:
+            return rows, self._route_metadata(freshness)
+        return rows
     
     def get_cities_list(self):
         """Get list of all cities with data"""
@@ -4,9 +4,12 @@
 -- ============================================================================
 
 -- Drop existing tables (for clean setup)
+DROP TABLE IF EXISTS materialized_view_refreshes CASCADE;
 DROP TABLE IF EXISTS predictions CASCADE;
 DROP TABLE IF EXISTS air_quality_data CASCADE;
 DROP TABLE IF EXISTS stations CASCADE;
+DROP TABLE IF EXISTS latest_station_readings CASCADE;
+DROP TABLE IF EXISTS daily_air_quality_stats CASCADE;
 DROP TABLE IF EXISTS pollutants CASCADE;
 DROP TABLE IF EXISTS aqi_categories CASCADE;
 
@@ -84,9 +87,11 @@ CREATE INDEX idx_stations_data_source ON stations(data_source);
 CREATE INDEX idx_stations_location ON stations(latitude, longitude);
 CREATE INDEX idx_stations_active ON stations(is_active);
 
--- Air Quality Time-Series Data (main table)
+-- Air Quality Time-Series Data (main table), range partitioned on recorded_at.
+-- Monthly partitions are created ahead of time by PartitionManager
+-- (db_manager.py); readings outside every partition go to the default one
 CREATE TABLE air_quality_data (
-    id BIGSERIAL PRIMARY KEY,
+    id BIGSERIAL,
     station_id VARCHAR(50) NOT NULL REFERENCES stations(station_id) ON DELETE CASCADE,
     recorded_at TIMESTAMP NOT NULL,
     pollutant_id VARCHAR(10) NOT NULL REFERENCES pollutants(pollutant_id),
@@ -102,8 +107,11 @@ CREATE TABLE air_quality_data (
     pressure DECIMAL(7,2), -- hPa
     data_source VARCHAR(50),
     data_quality_flag VARCHAR(10) DEFAULT 'GOOD', -- GOOD, SUSPECT, INVALID
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+
+CREATE TABLE air_quality_data_default PARTITION OF air_quality_data DEFAULT;
 
 -- Critical indexes for time-series queries
 CREATE INDEX idx_aq_recorded_at ON air_quality_data(recorded_at DESC);
@@ -117,9 +125,6 @@ CREATE INDEX idx_aq_composite ON air_quality_data(station_id, pollutant_id, reco
 CREATE INDEX idx_aq_city_time ON air_quality_data(station_id, recorded_at DESC) 
     WHERE aqi IS NOT NULL;
 
--- Convert to TimescaleDB hypertable for better time-series performance (optional)
--- SELECT create_hypertable('air_quality_data', 'recorded_at', chunk_time_interval => INTERVAL '7 days');
-
 -- ============================================================================
 -- ML PREDICTIONS TABLE
 -- ============================================================================
@@ -146,56 +151,321 @@ CREATE INDEX idx_pred_model ON predictions(model_name);
 CREATE INDEX idx_pred_prediction_time ON predictions(prediction_time DESC);
 
 -- ============================================================================
--- MATERIALIZED VIEWS FOR PERFORMANCE
+-- SUMMARY TABLES (INCREMENTALLY MAINTAINED)
 -- ============================================================================
 
--- Latest readings per station (refreshed periodically)
-CREATE MATERIALIZED VIEW latest_station_readings AS
-SELECT DISTINCT ON (station_id, pollutant_id)
-    station_id,
-    pollutant_id,
-    recorded_at,
-    pollutant_avg,
-    aqi,
-    aqi_category_id,
-    temperature,
-    humidity
-FROM air_quality_data
-ORDER BY station_id, pollutant_id, recorded_at DESC;
-
-CREATE UNIQUE INDEX idx_latest_station_poll ON latest_station_readings(station_id, pollutant_id);
+-- Latest reading per station and pollutant
+CREATE TABLE latest_station_readings (
+    id BIGINT NOT NULL,
+    station_id VARCHAR(50) NOT NULL,
+    pollutant_id VARCHAR(10) NOT NULL,
+    recorded_at TIMESTAMP NOT NULL,
+    pollutant_avg DECIMAL(10,2),
+    aqi DECIMAL(10,2),
+    aqi_category_id INTEGER,
+    temperature DECIMAL(5,2),
+    humidity DECIMAL(5,2),
+    data_source VARCHAR(50),
+    PRIMARY KEY (station_id, pollutant_id)
+);
 
--- Daily aggregates for fast historical queries
-CREATE MATERIALIZED VIEW daily_air_quality_stats AS
-SELECT 
-    station_id,
-    pollutant_id,
-    DATE(recorded_at) AS date,
-    AVG(pollutant_avg) AS avg_pollutant,
-    MIN(pollutant_avg) AS min_pollutant,
-    MAX(pollutant_avg) AS max_pollutant,
-    AVG(aqi) AS avg_aqi,
-    MAX(aqi) AS max_aqi,
-    AVG(temperature) AS avg_temp,
-    AVG(humidity) AS avg_humidity,
-    COUNT(*) AS reading_count
-FROM air_quality_data
-WHERE pollutant_avg IS NOT NULL
-GROUP BY station_id, pollutant_id, DATE(recorded_at);
+-- Daily aggregates for fast historical queries. Sums and non-null counts are
+-- kept next to the averages so new readings can be folded in without a rescan
+CREATE TABLE daily_air_quality_stats (
+    station_id VARCHAR(50) NOT NULL,
+    pollutant_id VARCHAR(10) NOT NULL,
+    date DATE NOT NULL,
+    avg_pollutant NUMERIC,
+    min_pollutant DECIMAL(10,2),
+    max_pollutant DECIMAL(10,2),
+    avg_aqi NUMERIC,
+    max_aqi DECIMAL(10,2),
+    avg_temp NUMERIC,
+    avg_humidity NUMERIC,
+    reading_count BIGINT NOT NULL,
+    sum_pollutant NUMERIC NOT NULL,
+    sum_aqi NUMERIC NOT NULL DEFAULT 0,
+    aqi_count BIGINT NOT NULL DEFAULT 0,
+    sum_temp NUMERIC NOT NULL DEFAULT 0,
+    temp_count BIGINT NOT NULL DEFAULT 0,
+    sum_humidity NUMERIC NOT NULL DEFAULT 0,
+    humidity_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (station_id, pollutant_id, date)
+);
 
 CREATE INDEX idx_daily_stats_station_date ON daily_air_quality_stats(station_id, date DESC);
 CREATE INDEX idx_daily_stats_pollutant_date ON daily_air_quality_stats(pollutant_id, date DESC);
 
+-- Fold a batch of new readings into the summaries. Runs once per INSERT
+-- statement, so the work is proportional to the batch, not the table
+CREATE OR REPLACE FUNCTION summaries_apply_inserts()
+RETURNS trigger AS $$
+BEGIN
+    INSERT INTO latest_station_readings AS l
+        (id, station_id, pollutant_id, recorded_at, pollutant_avg, aqi,
+         aqi_category_id, temperature, humidity, data_source)
+    SELECT DISTINCT ON (station_id, pollutant_id)
+        id, station_id, pollutant_id, recorded_at, pollutant_avg, aqi,
+        aqi_category_id, temperature, humidity, data_source
+    FROM new_rows
+    ORDER BY station_id, pollutant_id, recorded_at DESC, id DESC
+    ON CONFLICT (station_id, pollutant_id) DO UPDATE
+    SET id = EXCLUDED.id,
+        recorded_at = EXCLUDED.recorded_at,
+        pollutant_avg = EXCLUDED.pollutant_avg,
+        aqi = EXCLUDED.aqi,
+        aqi_category_id = EXCLUDED.aqi_category_id,
+        temperature = EXCLUDED.temperature,
+        humidity = EXCLUDED.humidity,
+        data_source = EXCLUDED.data_source
+    WHERE (EXCLUDED.recorded_at, EXCLUDED.id) > (l.recorded_at, l.id);
+    
+    INSERT INTO daily_air_quality_stats AS d
+        (station_id, pollutant_id, date, avg_pollutant, min_pollutant, max_pollutant,
+         avg_aqi, max_aqi, avg_temp, avg_humidity, reading_count, sum_pollutant,
+         sum_aqi, aqi_count, sum_temp, temp_count, sum_humidity, humidity_count)
+    SELECT 
+        station_id, pollutant_id, DATE(recorded_at),
+        AVG(pollutant_avg), MIN(pollutant_avg), MAX(pollutant_avg),
+        AVG(aqi), MAX(aqi), AVG(temperature), AVG(humidity),
+        COUNT(*), SUM(pollutant_avg),
+        COALESCE(SUM(aqi), 0), COUNT(aqi),
+        COALESCE(SUM(temperature), 0), COUNT(temperature),
+        COALESCE(SUM(humidity), 0), COUNT(humidity)
+    FROM new_rows
+    WHERE pollutant_avg IS NOT NULL
+    GROUP BY station_id, pollutant_id, DATE(recorded_at)
+    ON CONFLICT (station_id, pollutant_id, date) DO UPDATE
+    SET reading_count = d.reading_count + EXCLUDED.reading_count,
+        sum_pollutant = d.sum_pollutant + EXCLUDED.sum_pollutant,
+        avg_pollutant = (d.sum_pollutant + EXCLUDED.sum_pollutant)
+                        / (d.reading_count + EXCLUDED.reading_count),
+        min_pollutant = LEAST(d.min_pollutant, EXCLUDED.min_pollutant),
+        max_pollutant = GREATEST(d.max_pollutant, EXCLUDED.max_pollutant),
+        sum_aqi = d.sum_aqi + EXCLUDED.sum_aqi,
+        aqi_count = d.aqi_count + EXCLUDED.aqi_count,
+        avg_aqi = (d.sum_aqi + EXCLUDED.sum_aqi) / NULLIF(d.aqi_count + EXCLUDED.aqi_count, 0),
+        max_aqi = GREATEST(d.max_aqi, EXCLUDED.max_aqi),
+        sum_temp = d.sum_temp + EXCLUDED.sum_temp,
+        temp_count = d.temp_count + EXCLUDED.temp_count,
+        avg_temp = (d.sum_temp + EXCLUDED.sum_temp) / NULLIF(d.temp_count + EXCLUDED.temp_count, 0),
+        sum_humidity = d.sum_humidity + EXCLUDED.sum_humidity,
+        humidity_count = d.humidity_count + EXCLUDED.humidity_count,
+        avg_humidity = (d.sum_humidity + EXCLUDED.sum_humidity)
+                       / NULLIF(d.humidity_count + EXCLUDED.humidity_count, 0);
+    
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Recompute the summaries for specific (station, pollutant, day) keys from the
+-- base table. Used after deletes and updates, where aggregates cannot simply
+-- be subtracted (MIN/MAX), and for repairs after bulk removals
+CREATE OR REPLACE FUNCTION recompute_summaries(
+    p_station_ids VARCHAR[], p_pollutant_ids VARCHAR[], p_dates DATE[]
+)
+RETURNS void AS $$
+BEGIN
+    WITH k AS (
+        SELECT DISTINCT * FROM unnest(p_station_ids, p_pollutant_ids, p_dates)
+            AS u(station_id, pollutant_id, date)
+    )
+    DELETE FROM daily_air_quality_stats d
+    USING k
+    WHERE d.station_id = k.station_id
+        AND d.pollutant_id = k.pollutant_id
+        AND d.date = k.date;
+    
+    WITH k AS (
+        SELECT DISTINCT * FROM unnest(p_station_ids, p_pollutant_ids, p_dates)
+            AS u(station_id, pollutant_id, date)
+    )
+    INSERT INTO daily_air_quality_stats
+        (station_id, pollutant_id, date, avg_pollutant, min_pollutant, max_pollutant,
+         avg_aqi, max_aqi, avg_temp, avg_humidity, reading_count, sum_pollutant,
+         sum_aqi, aqi_count, sum_temp, temp_count, sum_humidity, humidity_count)
+    SELECT 
+        aq.station_id, aq.pollutant_id, k.date,
+        AVG(aq.pollutant_avg), MIN(aq.pollutant_avg), MAX(aq.pollutant_avg),
+        AVG(aq.aqi), MAX(aq.aqi), AVG(aq.temperature), AVG(aq.humidity),
+        COUNT(*), SUM(aq.pollutant_avg),
+        COALESCE(SUM(aq.aqi), 0), COUNT(aq.aqi),
+        COALESCE(SUM(aq.temperature), 0), COUNT(aq.temperature),
+        COALESCE(SUM(aq.humidity), 0), COUNT(aq.humidity)
+    FROM k
+    JOIN air_quality_data aq
+        ON aq.station_id = k.station_id
+        AND aq.pollutant_id = k.pollutant_id
+        AND aq.recorded_at >= k.date
+        AND aq.recorded_at < k.date + 1
+    WHERE aq.pollutant_avg IS NOT NULL
+    GROUP BY aq.station_id, aq.pollutant_id, k.date;
+    
+    WITH k AS (
+        SELECT DISTINCT * FROM unnest(p_station_ids, p_pollutant_ids)
+            AS u(station_id, pollutant_id)
+    )
+    DELETE FROM latest_station_readings l
+    USING k
+    WHERE l.station_id = k.station_id
+        AND l.pollutant_id = k.pollutant_id;
+    
+    WITH k AS (
+        SELECT DISTINCT * FROM unnest(p_station_ids, p_pollutant_ids)
+            AS u(station_id, pollutant_id)
+    )
+    INSERT INTO latest_station_readings
+        (id, station_id, pollutant_id, recorded_at, pollutant_avg, aqi,
+         aqi_category_id, temperature, humidity, data_source)
+    SELECT 
+        aq.id, aq.station_id, aq.pollutant_id, aq.recorded_at, aq.pollutant_avg, aq.aqi,
+        aq.aqi_category_id, aq.temperature, aq.humidity, aq.data_source
+    FROM k
+    CROSS JOIN LATERAL (
+        SELECT *
+        FROM air_quality_data a
+        WHERE a.station_id = k.station_id
+            AND a.pollutant_id = k.pollutant_id
+        ORDER BY a.recorded_at DESC, a.id DESC
+        LIMIT 1
+    ) aq;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION summaries_apply_deletes()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM recompute_summaries(
+        ARRAY_AGG(station_id), ARRAY_AGG(pollutant_id), ARRAY_AGG(day)
+    )
+    FROM (SELECT DISTINCT station_id, pollutant_id, DATE(recorded_at) AS day
+          FROM old_rows) k
+    HAVING COUNT(*) > 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION summaries_apply_updates()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM recompute_summaries(
+        ARRAY_AGG(station_id), ARRAY_AGG(pollutant_id), ARRAY_AGG(day)
+    )
+    FROM (SELECT station_id, pollutant_id, DATE(recorded_at) AS day FROM old_rows
+          UNION
+          SELECT station_id, pollutant_id, DATE(recorded_at) FROM new_rows) k
+    HAVING COUNT(*) > 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION summaries_apply_truncate()
+RETURNS trigger AS $$
+BEGIN
+    TRUNCATE latest_station_readings, daily_air_quality_stats;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_aq_summaries_insert
+    AFTER INSERT ON air_quality_data
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION summaries_apply_inserts();
+
+CREATE TRIGGER trg_aq_summaries_update
+    AFTER UPDATE ON air_quality_data
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION summaries_apply_updates();
+
+CREATE TRIGGER trg_aq_summaries_delete
+    AFTER DELETE ON air_quality_data
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION summaries_apply_deletes();
+
+CREATE TRIGGER trg_aq_summaries_truncate
+    AFTER TRUNCATE ON air_quality_data
+    FOR EACH STATEMENT EXECUTE FUNCTION summaries_apply_truncate();
+
+-- Signal listeners (e.g. API response caches) after any write to readings or
+-- stations, so every writer invalidates them without having to remember to.
+-- Identical notifications within a transaction are delivered once
+CREATE OR REPLACE FUNCTION notify_data_changed()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('air_quality_data_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_aq_notify_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON air_quality_data
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_data_changed();
+
+CREATE TRIGGER trg_stations_notify_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON stations
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_data_changed();
+
 -- ============================================================================
 -- HELPER FUNCTIONS
 -- ============================================================================
 
--- Function to refresh materialized views
+-- Summary bookkeeping: when each summary was last rebuilt and the newest
+-- reading it covers, so queries can judge staleness and read newer rows from
+-- the base table. Incrementally maintained summaries cover everything and
+-- are never stale
+CREATE TABLE materialized_view_refreshes (
+    view_name VARCHAR(100) PRIMARY KEY,
+    refreshed_at TIMESTAMP NOT NULL,
+    covered_until TIMESTAMP,
+    incremental BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+INSERT INTO materialized_view_refreshes (view_name, refreshed_at, covered_until, incremental) VALUES
+('latest_station_readings', NOW(), 'infinity', TRUE),
+('daily_air_quality_stats', NOW(), 'infinity', TRUE);
+
+-- Rebuild both summaries from scratch. The triggers keep them current, so
+-- this is only needed as a repair, e.g. after removing data without going
+-- through DELETE (dropping partitions, restoring backups)
 CREATE OR REPLACE FUNCTION refresh_materialized_views()
 RETURNS void AS $$
 BEGIN
-    REFRESH MATERIALIZED VIEW CONCURRENTLY latest_station_readings;
-    REFRESH MATERIALIZED VIEW CONCURRENTLY daily_air_quality_stats;
+    LOCK TABLE air_quality_data IN SHARE MODE;
+    
+    DELETE FROM latest_station_readings;
+    INSERT INTO latest_station_readings
+        (id, station_id, pollutant_id, recorded_at, pollutant_avg, aqi,
+         aqi_category_id, temperature, humidity, data_source)
+    SELECT DISTINCT ON (station_id, pollutant_id)
+        id, station_id, pollutant_id, recorded_at, pollutant_avg, aqi,
+        aqi_category_id, temperature, humidity, data_source
+    FROM air_quality_data
+    ORDER BY station_id, pollutant_id, recorded_at DESC, id DESC;
+    
+    DELETE FROM daily_air_quality_stats;
+    INSERT INTO daily_air_quality_stats
+        (station_id, pollutant_id, date, avg_pollutant, min_pollutant, max_pollutant,
+         avg_aqi, max_aqi, avg_temp, avg_humidity, reading_count, sum_pollutant,
+         sum_aqi, aqi_count, sum_temp, temp_count, sum_humidity, humidity_count)
+    SELECT 
+        station_id, pollutant_id, DATE(recorded_at),
+        AVG(pollutant_avg), MIN(pollutant_avg), MAX(pollutant_avg),
+        AVG(aqi), MAX(aqi), AVG(temperature), AVG(humidity),
+        COUNT(*), SUM(pollutant_avg),
+        COALESCE(SUM(aqi), 0), COUNT(aqi),
+        COALESCE(SUM(temperature), 0), COUNT(temperature),
+        COALESCE(SUM(humidity), 0), COUNT(humidity)
+    FROM air_quality_data
+    WHERE pollutant_avg IS NOT NULL
+    GROUP BY station_id, pollutant_id, DATE(recorded_at);
+    
+    INSERT INTO materialized_view_refreshes (view_name, refreshed_at, covered_until, incremental)
+    VALUES ('latest_station_readings', NOW(), 'infinity', TRUE),
+           ('daily_air_quality_stats', NOW(), 'infinity', TRUE)
+    ON CONFLICT (view_name) DO UPDATE
+    SET refreshed_at = EXCLUDED.refreshed_at,
+        covered_until = EXCLUDED.covered_until,
+        incremental = EXCLUDED.incremental;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -243,22 +513,6 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- ============================================================================
--- DATA PARTITIONING (for large datasets)
--- ============================================================================
-
--- Partition air_quality_data by month (uncomment if needed for large datasets)
-/*
-ALTER TABLE air_quality_data PARTITION BY RANGE (recorded_at);
-
--- Create partitions for 2025
-CREATE TABLE air_quality_data_2025_01 PARTITION OF air_quality_data
-    FOR VALUES FROM ('2025-01-01') TO ('2025-02-01');
-CREATE TABLE air_quality_data_2025_02 PARTITION OF air_quality_data
-    FOR VALUES FROM ('2025-02-01') TO ('2025-03-01');
--- Add more partitions as needed...
-*/
-
 -- ============================================================================
 -- MAINTENANCE & MONITORING
 -- ============================================================================
@@ -1,27 +1,122 @@
 """
 FastAPI Backend for AQI Prediction System (Production Version)
 Modern async API with better performance than Flask
+
+Reads from PostgreSQL through an async connection pool when DATABASE_URL is
+set, otherwise from the CSV snapshot. Blocking work (pandas, file reloads,
+SMTP) runs on bounded executors so the event loop keeps serving requests.
 """
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
 import pandas as pd
 import joblib
 import os
+import sys
 from datetime import datetime, timedelta
 import logging
 from dotenv import load_dotenv
 
+sys.path.append(os.path.dirname(__file__))
+from csv_snapshot import CsvSnapshot
+
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CSV_FILE = 'air_quality_data.csv'
+snapshot = CsvSnapshot(CSV_FILE)
+
+# Categories that trigger the `alert` flag (CSV 1-5 scale and CPCB scale names)
+ALERT_CATEGORIES = {'Poor', 'Very Poor', 'Extremely Poor', 'Severe'}
+
+
+class CsvReadings:
+    """CSV snapshot behind the same async interface as AsyncDatabase"""
+    
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        # Reloads are serialized by the snapshot anyway
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='csv-snapshot')
+    
+    async def open(self):
+        pass
+    
+    async def close(self):
+        self.executor.shutdown(wait=False)
+    
+    async def _data(self):
+        # A changed file is re-parsed inside get(), off the event loop
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.snapshot.get)
+    
+    async def check_connection(self):
+        return os.path.exists(self.snapshot.path)
+    
+    async def latest_rows(self):
+        data = await self._data()
+        return data.latest_rows if data is not None else None
+    
+    async def latest_by_city(self):
+        data = await self._data()
+        return data.latest_by_city if data is not None else None
+    
+    async def city_history(self, city, hours):
+        data = await self._data()
+        return data.city_history(city, hours) if data is not None else None
+    
+    async def stats(self):
+        data = await self._data()
+        if data is None:
+            return None
+        return {
+            'total_records': data.total_records,
+            'cities_covered': len(data.cities),
+            'cities_list': sorted(data.cities),
+            'data_sources': data.sources,
+            'latest_update': data.latest_update,
+            'oldest_record': data.oldest_record,
+            'date_range_days': (pd.to_datetime(data.latest_update) - 
+                               pd.to_datetime(data.oldest_record)).days,
+            'average_aqi_all_cities': round(float(data.average_aqi), 2),
+            'worst_city': data.city_average_aqi.idxmax(),
+            'best_city': data.city_average_aqi.idxmin()
+        }
+
+
+if os.getenv('DATABASE_URL'):
+    from async_db import AsyncDatabase
+    readings = AsyncDatabase()
+    DATA_BACKEND = 'postgresql'
+else:
+    readings = CsvReadings(snapshot)
+    DATA_BACKEND = 'csv'
+
+# AQI range of each backend's scale and the +/- margin of prediction bounds
+# (CSV: OpenWeather 1-5 index; PostgreSQL: CPCB NAQI 0-500)
+AQI_MIN, AQI_MAX, AQI_CONFIDENCE_MARGIN = {
+    'csv': (1, 6, 1),
+    'postgresql': (0, 500, 25)
+}[DATA_BACKEND]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await readings.open()
+    logger.info(f"Serving readings from {DATA_BACKEND}")
+    yield
+    await readings.close()
+
+
 app = FastAPI(
     title="AQI Prediction API",
     description="Real-time Air Quality Index prediction with ML models",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -33,8 +128,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-CSV_FILE = 'air_quality_data.csv'
-
 
 # Pydantic models for request/response validation
 class PredictRequest(BaseModel):
@@ -95,6 +188,14 @@ def get_health_recommendation(aqi: int) -> str:
         return 'Hazardous! Stay indoors and use air purifiers.'
 
 
+def describe_aqi(row):
+    """Category and recommendation for a reading (None for both when it has no AQI)"""
+    if pd.isna(row['aqi']):
+        return None, None
+    return (row.get('category') or get_aqi_category(int(row['aqi'])),
+            row.get('recommendation') or get_health_recommendation(int(row['aqi'])))
+
+
 @app.get("/", response_model=dict)
 async def root():
     """Root endpoint with API information"""
@@ -116,7 +217,7 @@ async def root():
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint for monitoring"""
-    data_exists = os.path.exists(CSV_FILE)
+    data_exists = await readings.check_connection()
     
     return HealthResponse(
         status="healthy" if data_exists else "degraded",
@@ -130,21 +231,18 @@ async def health_check():
 async def get_stations():
     """Get all monitoring stations with latest readings"""
     try:
-        if not os.path.exists(CSV_FILE):
+        latest_rows = await readings.latest_rows()
+        if latest_rows is None:
             raise HTTPException(status_code=404, detail="No data available. Run data collector first.")
         
-        df = pd.read_csv(CSV_FILE)
-        
-        # Get latest record for each city
-        df_latest = df.sort_values('timestamp').groupby('city').tail(1)
-        
         stations = []
-        for _, row in df_latest.iterrows():
+        for row in latest_rows:
+            category, recommendation = describe_aqi(row)
             stations.append({
                 'name': row['station_name'],
                 'city': row['city'],
-                'lat': float(row['latitude']),
-                'lng': float(row['longitude']),
+                'lat': float(row['latitude']) if pd.notna(row['latitude']) else None,
+                'lng': float(row['longitude']) if pd.notna(row['longitude']) else None,
                 'pm25': float(row['pm25']) if pd.notna(row['pm25']) else None,
                 'pm10': float(row['pm10']) if pd.notna(row['pm10']) else None,
                 'no2': float(row['no2']) if pd.notna(row['no2']) else None,
@@ -152,8 +250,8 @@ async def get_stations():
                 'co': float(row['co']) if pd.notna(row['co']) else None,
                 'o3': float(row['o3']) if pd.notna(row['o3']) else None,
                 'aqi': int(row['aqi']) if pd.notna(row['aqi']) else None,
-                'category': get_aqi_category(int(row['aqi'])),
-                'recommendation': get_health_recommendation(int(row['aqi'])),
+                'category': category,
+                'recommendation': recommendation,
                 'last_updated': row['timestamp'],
                 'source': row['source']
             })
@@ -172,25 +270,23 @@ async def get_stations():
 async def get_cities():
     """Get all cities with current AQI summary"""
     try:
-        if not os.path.exists(CSV_FILE):
+        latest_by_city = await readings.latest_by_city()
+        if latest_by_city is None:
             raise HTTPException(status_code=404, detail="No data available")
         
-        df = pd.read_csv(CSV_FILE)
-        
         cities = []
-        for city_name in df['city'].unique():
-            city_data = df[df['city'] == city_name].sort_values('timestamp').tail(1).iloc[0]
-            
+        for city_name, city_data in latest_by_city.items():
             aqi_value = int(city_data['aqi'])
+            category = city_data.get('category') or get_aqi_category(aqi_value)
             cities.append({
                 'city': city_name,
                 'aqi': aqi_value,
                 'pm25': round(float(city_data['pm25']), 2) if pd.notna(city_data['pm25']) else None,
                 'pm10': round(float(city_data['pm10']), 2) if pd.notna(city_data['pm10']) else None,
-                'category': get_aqi_category(aqi_value),
-                'recommendation': get_health_recommendation(aqi_value),
+                'category': category,
+                'recommendation': city_data.get('recommendation') or get_health_recommendation(aqi_value),
                 'last_updated': city_data['timestamp'],
-                'alert': aqi_value > 3  # Alert if AQI > Moderate
+                'alert': category in ALERT_CATEGORIES  # Alert if AQI > Moderate
             })
         
         # Sort by AQI (worst first)
@@ -221,18 +317,21 @@ async def predict_aqi(city: str, hours_ahead: int = 24):
         if hours_ahead < 1 or hours_ahead > 48:
             raise HTTPException(status_code=400, detail="hours_ahead must be between 1 and 48")
         
-        if not os.path.exists(CSV_FILE):
+        latest_by_city = await readings.latest_by_city()
+        if latest_by_city is None:
             raise HTTPException(status_code=404, detail="No data available")
         
-        df = pd.read_csv(CSV_FILE)
-        city_data = df[df['city'] == city].sort_values('timestamp').tail(24)
+        city_data = latest_by_city.get(city)
         
-        if city_data.empty:
+        if city_data is None:
             raise HTTPException(status_code=404, detail=f"No data available for {city}")
         
-        # Get current readings
-        current_aqi = int(city_data['aqi'].iloc[-1])
-        current_pm25 = float(city_data['pm25'].iloc[-1])
+        if pd.isna(city_data['aqi']):
+            raise HTTPException(status_code=404, detail=f"No AQI data available for {city}")
+        
+        # Get current readings (the reporting station may have no PM2.5 sensor)
+        current_aqi = int(city_data['aqi'])
+        current_pm25 = float(city_data['pm25']) if pd.notna(city_data['pm25']) else None
         
         # Generate predictions (using simple model for now)
         # TODO: Replace with actual trained ML models
@@ -248,11 +347,11 @@ async def predict_aqi(city: str, hours_ahead: int = 24):
                 'hour': h,
                 'timestamp': pred_time.isoformat(),
                 'predicted_aqi': pred_aqi,
-                'predicted_pm25': round(pred_pm25, 2),
-                'category': get_aqi_category(pred_aqi),
+                'predicted_pm25': round(pred_pm25, 2) if pred_pm25 is not None else None,
+                'category': city_data.get('category') or get_aqi_category(pred_aqi),
                 'confidence': 0.85,  # Model confidence score
-                'confidence_lower': max(1, pred_aqi - 1),
-                'confidence_upper': min(6, pred_aqi + 1)
+                'confidence_lower': max(AQI_MIN, pred_aqi - AQI_CONFIDENCE_MARGIN),
+                'confidence_upper': min(AQI_MAX, pred_aqi + AQI_CONFIDENCE_MARGIN)
             })
         
         logger.info(f"Generated {len(predictions)} predictions for {city}")
@@ -320,21 +419,25 @@ async def monitor_and_alert(email: str, city: str, threshold: int):
     from email.message import EmailMessage
     
     try:
-        df = pd.read_csv(CSV_FILE)
-        city_data = df[df['city'] == city].sort_values('timestamp').tail(1)
+        latest_by_city = await readings.latest_by_city()
+        city_data = latest_by_city.get(city) if latest_by_city is not None else None
         
-        if not city_data.empty:
-            current_aqi = int(city_data['aqi'].iloc[0])
+        if city_data is not None and pd.notna(city_data['aqi']):
+            current_aqi = int(city_data['aqi'])
             
             if current_aqi > threshold:
+                category, recommendation = describe_aqi(city_data)
+                pm25 = (f"{float(city_data['pm25']):.2f} µg/m³"
+                        if pd.notna(city_data['pm25']) else 'not reported')
+                
                 # Prepare email message
                 msg = EmailMessage()
                 msg.set_content(
                     f"⚠️ AQI Alert for {city}!\n\n"
                     f"Current AQI: {current_aqi}\n"
-                    f"Category: {get_aqi_category(current_aqi)}\n"
-                    f"PM2.5: {city_data['pm25'].iloc[0]:.2f} µg/m³\n\n"
-                    f"Health Recommendation:\n{get_health_recommendation(current_aqi)}\n\n"
+                    f"Category: {category}\n"
+                    f"PM2.5: {pm25}\n\n"
+                    f"Health Recommendation:\n{recommendation}\n\n"
                     f"Stay safe and limit outdoor activities!\n\n"
                     f"— AQI Monitoring System"
                 )
@@ -347,10 +450,14 @@ async def monitor_and_alert(email: str, city: str, threshold: int):
                 sender_password = os.getenv('EMAIL_PASSWORD')
                 
                 if sender_email and sender_password:
-                    context = ssl.create_default_context()
-                    with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
-                        server.login(sender_email, sender_password)
-                        server.send_message(msg)
+                    def send():
+                        context = ssl.create_default_context()
+                        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
+                            server.login(sender_email, sender_password)
+                            server.send_message(msg)
+                    
+                    # smtplib blocks; keep it off the event loop
+                    await asyncio.to_thread(send)
                     
                     logger.info(f"Alert email sent to {email} for {city} (AQI: {current_aqi})")
                 else:
@@ -364,28 +471,14 @@ async def monitor_and_alert(email: str, city: str, threshold: int):
 async def get_stats():
     """Get system statistics and metadata"""
     try:
-        if not os.path.exists(CSV_FILE):
+        data_stats = await readings.stats()
+        if data_stats is None:
             return {
                 "status": "no_data",
                 "message": "No data collected yet"
             }
         
-        df = pd.read_csv(CSV_FILE)
-        
-        stats = {
-            'status': 'operational',
-            'total_records': len(df),
-            'cities_covered': df['city'].nunique(),
-            'cities_list': sorted(df['city'].unique().tolist()),
-            'data_sources': df['source'].unique().tolist(),
-            'latest_update': df['timestamp'].max(),
-            'oldest_record': df['timestamp'].min(),
-            'date_range_days': (pd.to_datetime(df['timestamp'].max()) - 
-                               pd.to_datetime(df['timestamp'].min())).days,
-            'average_aqi_all_cities': round(df['aqi'].mean(), 2),
-            'worst_city': df.groupby('city')['aqi'].mean().idxmax(),
-            'best_city': df.groupby('city')['aqi'].mean().idxmin()
-        }
+        stats = {'status': 'operational', 'data_backend': DATA_BACKEND, **data_stats}
         
         logger.info("Stats retrieved successfully")
         return stats
@@ -405,23 +498,23 @@ async def get_trends(city: str, hours: int = 24):
     - hours: Number of hours of history (default 24)
     """
     try:
-        if not os.path.exists(CSV_FILE):
+        city_data = await readings.city_history(city, hours)
+        if city_data is None:
             raise HTTPException(status_code=404, detail="No data available")
         
-        df = pd.read_csv(CSV_FILE)
-        city_data = df[df['city'] == city].sort_values('timestamp').tail(hours)
         
-        if city_data.empty:
+        if not city_data:
             raise HTTPException(status_code=404, detail=f"No data for {city}")
         
         trends = []
-        for _, row in city_data.iterrows():
+        for row in city_data:
+            category, _ = describe_aqi(row)
             trends.append({
                 'timestamp': row['timestamp'],
-                'aqi': int(row['aqi']),
+                'aqi': int(row['aqi']) if pd.notna(row['aqi']) else None,
                 'pm25': float(row['pm25']) if pd.notna(row['pm25']) else None,
                 'pm10': float(row['pm10']) if pd.notna(row['pm10']) else None,
-                'category': get_aqi_category(int(row['aqi']))
+                'category': category
             })
         
         return {
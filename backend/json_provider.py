@@ -0,0 +1,70 @@
+"""
+Fast JSON Provider
+Flask JSON provider for database-heavy responses. Uses orjson when it is
+installed (stdlib json otherwise) and serializes Decimal, datetime/date and
+NumPy values directly: Decimals and NumPy scalars as numbers, datetimes as
+ISO 8601 strings, NumPy arrays as lists.
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+
+import numpy as np
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson  # optional dependency, ~5-10x faster than stdlib json for row lists
+except ImportError:
+    orjson = None
+
+
+def _default(obj):
+    """Fallback for types neither encoder handles itself"""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(JSONProvider):
+    """
+    JSON provider that keeps key order (no sorting) and encodes responses
+    straight to bytes. Install with `app.json = FastJSONProvider(app)`.
+    """
+
+    ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def dumps_bytes(self, obj):
+        """Serialize to UTF-8 bytes"""
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default, option=self.ORJSON_OPTIONS)
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default, option=self.ORJSON_OPTIONS).decode()
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', False)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype='application/json')
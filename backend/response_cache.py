@@ -0,0 +1,360 @@
+"""
+Response Cache
+TTL response caching for read-heavy Flask endpoints with ETag support,
+precompressed gzip/brotli variants and automatic invalidation when new data
+lands in PostgreSQL
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import pickle
+import select
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from flask import request, make_response
+
+try:
+    import brotli  # optional dependency, br is offered only when it is installed
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Content codings in server preference order (used to break Accept-Encoding ties)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 9
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(body, encoding):
+    """Compress a response body with the given content coding"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output (and so its ETag) deterministic
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# Part of every Redis key; bump whenever CachedResponse's pickled layout
+# changes so entries written by older workers are never read back
+ENTRY_FORMAT_VERSION = 2
+
+
+class CachedResponse:
+    """
+    A serialized response body plus the metadata needed to replay it.
+
+    Bodies of at least `compress_min_size` bytes are also stored compressed
+    with each supported content coding, so cache hits cost no compression.
+    """
+
+    __slots__ = ('body', 'mimetype', 'etag', 'created_at', 'ttl', 'encoded')
+
+    def __init__(self, body, mimetype, ttl, compress_min_size=None):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.created_at = time.time()
+        self.ttl = ttl
+
+        self.encoded = {}
+        if compress_min_size is not None and len(body) >= compress_min_size:
+            for encoding in SUPPORTED_ENCODINGS:
+                encoded = compress(body, encoding)
+                # Skip codings that do not pay for themselves
+                if len(encoded) < len(body):
+                    self.encoded[encoding] = encoded
+
+    def negotiate(self, accept_encodings):
+        """Best stored content coding acceptable to the client, or None for identity"""
+        best, best_quality = None, 0
+        for encoding in SUPPORTED_ENCODINGS:
+            quality = accept_encodings[encoding]
+            if encoding in self.encoded and quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    @property
+    def age(self):
+        return int(time.time() - self.created_at)
+
+
+class LRUBackend:
+    """
+    In-process LRU cache with per-entry expiry.
+
+    `clear()` bumps a generation counter; a `set()` made for an older
+    generation (its value was computed before the clear) is dropped.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Shared cache backed by Redis, so every API worker sees the same entries.
+
+    Invalidation bumps a generation counter that is part of every key; stale
+    generations simply expire through their TTL. The counter is cached
+    locally and re-read at most every `generation_refresh` seconds (clears
+    made by this process take effect immediately).
+    """
+
+    def __init__(self, url, prefix='aq:respcache', generation_refresh=1.0):
+        import redis  # optional dependency, only needed for the shared backend
+        self._client = redis.Redis.from_url(url)
+        self._prefix = f"{prefix}:v{ENTRY_FORMAT_VERSION}"
+        self.generation_refresh = generation_refresh
+        self._generation = 0
+        self._generation_read_at = None
+
+    def generation(self):
+        now = time.monotonic()
+        if self._generation_read_at is None or now - self._generation_read_at >= self.generation_refresh:
+            self._generation = int(self._client.get(f"{self._prefix}:generation") or 0)
+            self._generation_read_at = now
+        return self._generation
+
+    def _key(self, key, generation):
+        return f"{self._prefix}:{generation}:{key}"
+
+    def get(self, key):
+        raw = self._client.get(self._key(key, self.generation()))
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl, generation=None):
+        # A value computed under an older generation lands under that
+        # generation's key, which is no longer read
+        if generation is None:
+            generation = self.generation()
+        self._client.set(self._key(key, generation), pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def clear(self):
+        self._generation = int(self._client.incr(f"{self._prefix}:generation"))
+        self._generation_read_at = time.monotonic()
+
+    def __len__(self):
+        return 0
+
+
+class ResponseCache:
+    """
+    Caches successful GET responses keyed by path and query string.
+
+    Responses carry a content hash ETag; a matching If-None-Match returns
+    304 without touching the view. When `compress_min_size` is set, bodies
+    at least that large are compressed once when cached and served in the
+    coding negotiated from Accept-Encoding. The cache is cleared on `invalidate()`,
+    which is also triggered by PostgreSQL NOTIFY on `channel` once
+    `listen()` has been called.
+    """
+
+    def __init__(self, backend=None, enabled=True, compress_min_size=None):
+        self.backend = backend if backend is not None else LRUBackend()
+        self.enabled = enabled
+        self.compress_min_size = compress_min_size
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        self.encoded_responses = {encoding: 0 for encoding in SUPPORTED_ENCODINGS}
+
+        self._dsn = None
+        self._channel = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from RESPONSE_CACHE_* environment variables"""
+        enabled = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+        backend = None
+
+        shared_url = os.getenv('RESPONSE_CACHE_URL')
+        if shared_url:
+            try:
+                backend = RedisBackend(shared_url)
+                logger.info("Response cache using shared Redis backend")
+            except Exception as e:
+                logger.warning(f"Shared response cache unavailable ({e}), using in-process LRU")
+
+        if backend is None:
+            backend = LRUBackend(int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 512)))
+
+        compress_min_size = None
+        if os.getenv('RESPONSE_COMPRESSION_ENABLED', 'true').lower() == 'true':
+            compress_min_size = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', 1024))
+
+        return cls(backend, enabled=enabled, compress_min_size=compress_min_size)
+
+    def make_key(self):
+        """Cache key from the request path and its sorted query parameters"""
+        args = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        return f"{request.path}?{args}"
+
+    def invalidate(self):
+        """Drop every cached response"""
+        self.backend.clear()
+        self.invalidations += 1
+        logger.info("Response cache invalidated")
+
+    def get_stats(self):
+        """Get cache hit/miss counters"""
+        return {
+            'enabled': self.enabled,
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'invalidations': self.invalidations,
+            'compression_min_size': self.compress_min_size,
+            'encoded_responses': dict(self.encoded_responses)
+        }
+
+    def _respond(self, entry):
+        """Build a response (or a 304) from a cached entry in the negotiated coding"""
+        encoding = entry.negotiate(request.accept_encodings)
+        # Each coding is a different representation and needs its own strong ETag
+        etag = f"{entry.etag}-{encoding}" if encoding else entry.etag
+
+        if etag in request.if_none_match:
+            self.not_modified += 1
+            response = make_response('', 304)
+        else:
+            response = make_response(entry.encoded[encoding] if encoding else entry.body)
+            response.mimetype = entry.mimetype
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+                self.encoded_responses[encoding] += 1
+
+        if entry.encoded:
+            response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Age'] = str(entry.age)
+        return response
+
+    def cached(self, ttl=300):
+        """Decorator caching a view's successful responses for `ttl` seconds"""
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if not self.enabled or request.method != 'GET':
+                    return f(*args, **kwargs)
+
+                self._ensure_listener()
+                key = self.make_key()
+
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    response = self._respond(entry)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self.misses += 1
+                # Captured before the view runs, so a body computed across an
+                # invalidation is not stored as fresh afterwards
+                generation = self.backend.generation()
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+
+                entry = CachedResponse(response.get_data(), response.mimetype, ttl,
+                                       compress_min_size=self.compress_min_size)
+                self.backend.set(key, entry, ttl, generation=generation)
+
+                response = self._respond(entry)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return decorated_function
+        return decorator
+
+    # ------------------------------------------------------------------------
+    # Invalidation via PostgreSQL LISTEN/NOTIFY
+    # ------------------------------------------------------------------------
+
+    def listen(self, dsn, channel):
+        """Invalidate the cache whenever `channel` is notified in PostgreSQL"""
+        self._dsn = dsn
+        self._channel = channel
+
+    def _ensure_listener(self):
+        """Start the listener thread in this process (each gunicorn worker needs one)"""
+        if self._dsn is None or self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            threading.Thread(target=self._listen_forever, name='response-cache-listener',
+                             daemon=True).start()
+
+    def _listen_forever(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self._dsn)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self._channel}")
+
+                # Anything may have changed while we were not listening
+                self.invalidate()
+
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.invalidate()
+            except Exception as e:
+                logger.warning(f"Response cache listener error: {e}, reconnecting in 5s")
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
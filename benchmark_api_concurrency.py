@@ -0,0 +1,108 @@
+"""
+Benchmark: API throughput and latency under concurrent load
+Fires the same requests at the Flask API (backend/api.py) and the FastAPI
+server (backend/fastapi_server.py) at increasing concurrency and reports
+requests/second and latency percentiles for each
+
+Start both servers against the same DATABASE_URL first, e.g.
+    RESPONSE_CACHE_ENABLED=false gunicorn -w 4 --threads 4 -b :5000 --chdir backend api:app
+    uvicorn backend.fastapi_server:app --workers 4 --port 8000
+
+(disable the Flask response cache so both servers do the same work per request)
+
+An endpoint is either a path served by both servers or a
+"flask_path,fastapi_path" pair for equivalent endpoints with different paths.
+
+Usage:
+    python benchmark_api_concurrency.py
+    python benchmark_api_concurrency.py --concurrency 1 10 50 100 --requests 2000
+    python benchmark_api_concurrency.py --endpoints /api/cities "/api/data/latest?limit=200,/api/stations"
+"""
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+
+
+async def run_load(session, url, total, concurrency):
+    """Issue `total` GETs to `url` with at most `concurrency` in flight"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    return {
+        'rps': total / elapsed,
+        'p50': np.percentile(latencies, 50),
+        'p95': np.percentile(latencies, 95),
+        'p99': np.percentile(latencies, 99),
+        'errors': errors
+    }
+
+
+async def benchmark(args):
+    servers = {'flask': args.flask_url.rstrip('/'), 'fastapi': args.fastapi_url.rstrip('/')}
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+
+    print("\n" + "="*78)
+    print("API CONCURRENCY BENCHMARK")
+    print("="*78)
+    print(f"{'Endpoint':<18} {'Server':<8} {'Conc':>5} {'Req/s':>9} {'p50 (ms)':>9} "
+          f"{'p95 (ms)':>9} {'p99 (ms)':>9} {'Errors':>7}")
+    print("-"*78)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        for endpoint in args.endpoints:
+            paths = dict(zip(servers, endpoint.split(',') if ',' in endpoint else [endpoint] * 2))
+            for concurrency in args.concurrency:
+                for name, base_url in servers.items():
+                    url = base_url + paths[name]
+                    # Warm up connections and server-side caches (CSV snapshot, categories)
+                    await run_load(session, url, min(concurrency, 10), min(concurrency, 10))
+                    result = await run_load(session, url, args.requests, concurrency)
+                    print(f"{paths[name][:18]:<18} {name:<8} {concurrency:>5} {result['rps']:>9.1f} "
+                          f"{result['p50']:>9.1f} {result['p95']:>9.1f} {result['p99']:>9.1f} "
+                          f"{result['errors']:>7}")
+            print("-"*78)
+
+    print("="*78 + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Flask vs FastAPI under concurrent load')
+    parser.add_argument('--flask-url', default='http://localhost:5000', help='Base URL of backend/api.py')
+    parser.add_argument('--fastapi-url', default='http://localhost:8000', help='Base URL of backend/fastapi_server.py')
+    parser.add_argument('--endpoints', nargs='+', default=['/api/stations', '/api/cities'],
+                        help='Paths served by both servers, or "flask_path,fastapi_path" pairs')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 100],
+                        help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per run')
+    parser.add_argument('--timeout', type=float, default=60, help='Per-request timeout in seconds')
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
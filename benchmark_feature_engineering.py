@@ -0,0 +1,115 @@
+"""
+Benchmark: prediction engine feature engineering
+Compares the grouped AQIPredictionEngine.engineer_features against the
+previous per-city loop on synthetic hourly data, up to 1000 stations x 1 year
+
+Usage:
+    python benchmark_feature_engineering.py
+    python benchmark_feature_engineering.py --stations 10 100 1000 --days 365
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from ml_prediction_engine import AQIPredictionEngine
+
+
+def legacy_engineer_features(df):
+    """Per-city loop with boolean-mask writes (previous implementation)"""
+    df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
+    df['day_of_week'] = pd.to_datetime(df['timestamp']).dt.dayofweek
+    df['month'] = pd.to_datetime(df['timestamp']).dt.month
+
+    for city in df['city'].unique():
+        city_mask = df['city'] == city
+        df.loc[city_mask, 'pm25_lag1'] = df.loc[city_mask, 'pm25'].shift(1)
+        df.loc[city_mask, 'pm25_lag3'] = df.loc[city_mask, 'pm25'].shift(3)
+        df.loc[city_mask, 'pm25_lag6'] = df.loc[city_mask, 'pm25'].shift(6)
+        df.loc[city_mask, 'pm25_rolling_mean_3h'] = df.loc[city_mask, 'pm25'].rolling(window=3, min_periods=1).mean()
+        df.loc[city_mask, 'pm25_rolling_mean_6h'] = df.loc[city_mask, 'pm25'].rolling(window=6, min_periods=1).mean()
+
+    return df.bfill().ffill()
+
+
+def create_sample_data(n_stations, days, missing_rate=0.02, seed=42):
+    """Hourly readings for `n_stations` stations over `days` days, ordered by station and time"""
+    rng = np.random.default_rng(seed)
+    hours = days * 24
+
+    timestamps = pd.date_range(end=pd.Timestamp.now().floor('h'), periods=hours, freq='h')
+    hour_of_day = timestamps.hour.to_numpy()
+    daily_cycle = 1 + 0.4 * np.sin(2 * np.pi * (hour_of_day - 8) / 24)
+
+    base = rng.uniform(30, 150, size=(n_stations, 1))
+    pm25 = base * daily_cycle[None, :] * rng.lognormal(0, 0.25, size=(n_stations, hours))
+    pm25[rng.random(pm25.shape) < missing_rate] = np.nan
+    pm25 = pm25.ravel()
+
+    return pd.DataFrame({
+        'city': pd.Categorical(np.repeat([f'Station_{i:04d}' for i in range(n_stations)], hours)),
+        'timestamp': np.tile(timestamps.to_numpy(), n_stations),
+        'pm25': pm25,
+        'pm10': pm25 * 1.6,
+        'no2': rng.uniform(10, 80, n_stations * hours),
+        'so2': rng.uniform(2, 30, n_stations * hours),
+        'co': rng.uniform(0.2, 3, n_stations * hours),
+        'o3': rng.uniform(10, 120, n_stations * hours),
+        'aqi': pm25 * 2.1
+    })
+
+
+def time_call(func, df):
+    start = time.perf_counter()
+    result = func(df.copy())
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark prediction engine feature engineering')
+    parser.add_argument('--stations', type=int, nargs='+', default=[10, 100, 1000],
+                        help='Station counts to benchmark')
+    parser.add_argument('--days', type=int, default=365, help='Days of hourly data per station')
+    parser.add_argument('--legacy-max-rows', type=int, default=1_000_000,
+                        help='Skip the per-city loop above this many rows (it is O(cities x rows))')
+    args = parser.parse_args()
+
+    engine = AQIPredictionEngine(model_type='linear')
+    feature_columns = engine.feature_columns
+
+    print("\n" + "="*78)
+    print("FEATURE ENGINEERING BENCHMARK")
+    print("="*78)
+    print(f"{'Stations':>9} {'Rows':>12} {'Grouped (s)':>12} {'Rows/s':>12} {'Loop (s)':>10} {'Speedup':>9}  Match")
+    print("-"*78)
+
+    for n_stations in args.stations:
+        df = create_sample_data(n_stations, args.days)
+        rows = len(df)
+
+        result, grouped_seconds = time_call(engine.engineer_features, df)
+
+        legacy_seconds = None
+        match = '-'
+        if rows <= args.legacy_max_rows:
+            expected, legacy_seconds = time_call(legacy_engineer_features, df)
+            match = 'yes' if np.allclose(
+                result[feature_columns].to_numpy(dtype=float),
+                expected[feature_columns].to_numpy(dtype=float),
+                rtol=1e-9, atol=1e-9, equal_nan=True
+            ) else 'NO'
+            del expected
+
+        print(f"{n_stations:>9} {rows:>12,} {grouped_seconds:>12.3f} {rows / grouped_seconds:>12,.0f} "
+              f"{legacy_seconds if legacy_seconds is not None else float('nan'):>10.2f} "
+              f"{legacy_seconds / grouped_seconds if legacy_seconds else float('nan'):>8.1f}x  {match}")
+
+        del df, result
+
+    print("="*78 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,21 @@ Automatically fetches data from CPCB, OpenWeather, and IQAir APIs
 Stores in PostgreSQL database
 """
 
-import requests
 import psycopg2
 from psycopg2.extras import execute_values
 import os
+import sys
 from datetime import datetime
-import time
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'database'))
+from db_manager import copy_merge, notify_data_changed
+from async_fetcher import fetch_all, stream_paginated_records
+
 class CloudAirQualityCollector:
     def __init__(self):
         # Get credentials from environment variables
@@ -113,102 +116,107 @@ class CloudAirQualityCollector:
     
     # ==================== CPCB DATA COLLECTION ====================
     
-    def fetch_cpcb_data(self, limit=1000):
-        """Fetch data from CPCB API"""
-        try:
-            endpoint = "https://api.data.gov.in/resource/3b01bcb8-0b14-4abf-b6f2-c1bfd384ba69"
-            params = {
-                'api-key': self.cpcb_api_key,
-                'format': 'json',
-                'limit': limit,
-                'offset': 0
-            }
-            
-            logger.info("📡 Fetching CPCB data...")
-            response = requests.get(endpoint, params=params, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"✓ CPCB: Fetched {len(data.get('records', []))} records")
-                return data
-            else:
-                logger.error(f"CPCB API error: {response.status_code}")
-                return None
-        except Exception as e:
-            logger.error(f"CPCB fetch error: {e}")
-            return None
+    def fetch_cpcb_data(self, page_size=1000, max_parallel=4):
+        """
+        Stream every CPCB record from the API.
+        
+        Returns an iterator over records: the total count is read from the
+        first page and the remaining pages are downloaded concurrently while
+        the caller consumes them.
+        """
+        endpoint = "https://api.data.gov.in/resource/3b01bcb8-0b14-4abf-b6f2-c1bfd384ba69"
+        params = {
+            'api-key': self.cpcb_api_key,
+            'format': 'json'
+        }
+        
+        logger.info("📡 Fetching CPCB data...")
+        return stream_paginated_records(
+            'cpcb', endpoint, params,
+            page_size=page_size, max_parallel=max_parallel, timeout=30
+        )
     
-    def store_cpcb_data(self, api_data):
-        """Parse and store CPCB data in PostgreSQL"""
-        if not api_data or 'records' not in api_data:
-            return 0, 0
+    def store_cpcb_data(self, records):
+        """Parse and store CPCB records in PostgreSQL as they stream in"""
+        if isinstance(records, dict):
+            records = records.get('records') or []
         
         try:
             conn = self.get_db_connection()
             cursor = conn.cursor()
             
-            stations_added = 0
-            data_points_added = 0
+            stations = {}
             
-            for record in api_data['records']:
-                try:
-                    station_name = record.get('station', 'Unknown')
-                    city = record.get('city', '')
-                    state = record.get('state', '')
-                    country = record.get('country', 'India')
-                    latitude = record.get('latitude', 0)
-                    longitude = record.get('longitude', 0)
-                    
-                    station_id = f"CPCB_{city}_{station_name}".replace(' ', '_').replace(',', '').replace('-', '_')[:255]
-                    
-                    # Insert or update station
-                    cursor.execute("""
-                        INSERT INTO stations 
-                        (station_id, station_name, city, state, country, latitude, longitude, data_source)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (station_id) DO UPDATE
-                        SET station_name = EXCLUDED.station_name,
-                            updated_at = CURRENT_TIMESTAMP
-                    """, (station_id, station_name, city, state, country, latitude, longitude, 'CPCB'))
-                    stations_added += 1
-                    
-                    # Parse timestamp
-                    last_update = record.get('last_update', '')
+            def readings():
+                for record in records:
                     try:
-                        recorded_at = datetime.strptime(last_update, "%d-%m-%Y %H:%M:%S")
-                    except:
-                        recorded_at = datetime.now()
-                    
-                    pollutant_id = record.get('pollutant_id', '')
-                    pollutant_avg = record.get('avg_value', '')
-                    pollutant_min = record.get('min_value', '')
-                    pollutant_max = record.get('max_value', '')
-                    
-                    aqi = self.calculate_aqi(pollutant_id, pollutant_avg)
-                    aqi_category = self.get_aqi_category(aqi)
-                    
-                    if pollutant_id and pollutant_avg:
-                        cursor.execute("""
-                            INSERT INTO air_quality_data 
-                            (station_id, recorded_at, data_source, pollutant_id, pollutant_avg, 
-                             pollutant_min, pollutant_max, aqi, aqi_category)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            ON CONFLICT (station_id, recorded_at, pollutant_id, data_source) DO NOTHING
-                        """, (station_id, recorded_at, 'CPCB', pollutant_id, 
-                              float(pollutant_avg), 
-                              float(pollutant_min) if pollutant_min else None,
-                              float(pollutant_max) if pollutant_max else None,
-                              aqi, aqi_category))
-                        data_points_added += 1
+                        station_name = record.get('station', 'Unknown')
+                        city = record.get('city', '')
+                        state = record.get('state', '')
+                        country = record.get('country', 'India')
+                        latitude = record.get('latitude', 0)
+                        longitude = record.get('longitude', 0)
                         
-                except Exception as e:
-                    logger.warning(f"Error processing CPCB record: {e}")
-                    continue
+                        station_id = f"CPCB_{city}_{station_name}".replace(' ', '_').replace(',', '').replace('-', '_')[:255]
+                        stations[station_id] = (station_id, station_name, city, state, country, latitude, longitude, 'CPCB')
+                        
+                        # Parse timestamp
+                        last_update = record.get('last_update', '')
+                        try:
+                            recorded_at = datetime.strptime(last_update, "%d-%m-%Y %H:%M:%S")
+                        except:
+                            recorded_at = datetime.now()
+                        
+                        pollutant_id = record.get('pollutant_id', '')
+                        pollutant_avg = record.get('avg_value', '')
+                        pollutant_min = record.get('min_value', '')
+                        pollutant_max = record.get('max_value', '')
+                        
+                        aqi = self.calculate_aqi(pollutant_id, pollutant_avg)
+                        aqi_category = self.get_aqi_category(aqi)
+                        
+                        if not (pollutant_id and pollutant_avg):
+                            continue
+                        
+                        reading = (
+                            station_id, recorded_at, 'CPCB', pollutant_id,
+                            float(pollutant_avg),
+                            float(pollutant_min) if pollutant_min else None,
+                            float(pollutant_max) if pollutant_max else None,
+                            aqi, aqi_category
+                        )
+                    except Exception as e:
+                        logger.warning(f"Error processing CPCB record: {e}")
+                        continue
+                    
+                    yield reading
+            
+            def upsert_stations(cursor):
+                # Stations must exist before readings referencing them are merged
+                execute_values(cursor, """
+                    INSERT INTO stations 
+                    (station_id, station_name, city, state, country, latitude, longitude, data_source)
+                    VALUES %s
+                    ON CONFLICT (station_id) DO UPDATE
+                    SET station_name = EXCLUDED.station_name,
+                        updated_at = CURRENT_TIMESTAMP
+                """, list(stations.values()), page_size=max(len(stations), 1))
+            
+            # Stream readings through COPY, skipping ones already stored
+            counts = copy_merge(
+                cursor, 'air_quality_data',
+                ['station_id', 'recorded_at', 'data_source', 'pollutant_id', 'pollutant_avg',
+                 'pollutant_min', 'pollutant_max', 'aqi', 'aqi_category'],
+                readings(),
+                key_columns=['station_id', 'recorded_at', 'pollutant_id', 'data_source'],
+                before_merge=upsert_stations
+            )
             
             conn.commit()
             cursor.close()
-            logger.info(f"✓ CPCB: {stations_added} stations, {data_points_added} data points")
-            return stations_added, data_points_added
+            logger.info(f"✓ CPCB: {len(stations)} stations, {counts['inserted']} data points "
+                        f"({counts['duplicates']} duplicates skipped)")
+            return len(stations), counts['inserted']
             
         except Exception as e:
             logger.error(f"CPCB storage error: {e}")
@@ -242,35 +250,36 @@ class CloudAirQualityCollector:
         logger.info("📡 Fetching OpenWeather data...")
         
         try:
+            # Fetch air pollution and weather for every city concurrently
+            aqi_url = "http://api.openweathermap.org/data/2.5/air_pollution"
+            weather_url = "http://api.openweathermap.org/data/2.5/weather"
+            requests_batch = []
+            for lat, lon, city_name in cities:
+                params = {'lat': lat, 'lon': lon, 'appid': self.openweather_api_key}
+                requests_batch.append(((city_name, 'aqi'), 'openweather', aqi_url, params))
+                requests_batch.append(((city_name, 'weather'), 'openweather', weather_url, params))
+            results = fetch_all(requests_batch)
+            
             conn = self.get_db_connection()
             cursor = conn.cursor()
             
             for lat, lon, city_name in cities:
                 try:
-                    # Get air pollution data
-                    aqi_url = "http://api.openweathermap.org/data/2.5/air_pollution"
-                    params = {'lat': lat, 'lon': lon, 'appid': self.openweather_api_key}
-                    
-                    response = requests.get(aqi_url, params=params, timeout=10)
+                    status, data = results[(city_name, 'aqi')]
                     
-                    if response.status_code == 200:
-                        data = response.json()
-                        
-                        # Get weather data
-                        weather_url = "http://api.openweathermap.org/data/2.5/weather"
-                        weather_response = requests.get(weather_url, params=params, timeout=10)
-                        weather_data = weather_response.json() if weather_response.status_code == 200 else {}
+                    if status == 200:
+                        weather_data = results[(city_name, 'weather')][1] or {}
                         
                         s, d = self.store_openweather_data(cursor, data, weather_data, city_name, lat, lon)
                         stations_added += s
                         data_points_added += d
                     
-                    time.sleep(0.5)  # Rate limiting
-                    
                 except Exception as e:
                     logger.warning(f"Error fetching OpenWeather for {city_name}: {e}")
                     continue
             
+            if data_points_added:
+                notify_data_changed(cursor, 'air_quality_data')
             conn.commit()
             cursor.close()
             logger.info(f"✓ OpenWeather: {stations_added} stations, {data_points_added} data points")
@@ -350,33 +359,30 @@ class CloudAirQualityCollector:
         logger.info("📡 Fetching IQAir data...")
         
         try:
+            url = "http://api.airvisual.com/v2/city"
+            results = fetch_all(
+                (city_name, 'iqair', url, {'city': city_name, 'country': 'India', 'key': self.iqair_api_key})
+                for city_name in cities
+            )
+            
             conn = self.get_db_connection()
             cursor = conn.cursor()
             
             for city_name in cities:
                 try:
-                    url = "http://api.airvisual.com/v2/city"
-                    params = {
-                        'city': city_name,
-                        'country': 'India',
-                        'key': self.iqair_api_key
-                    }
-                    
-                    response = requests.get(url, params=params, timeout=10)
+                    status, data = results[city_name]
                     
-                    if response.status_code == 200:
-                        data = response.json()
-                        if data.get('status') == 'success':
-                            s, d = self.store_iqair_data(cursor, data, city_name)
-                            stations_added += s
-                            data_points_added += d
-                    
-                    time.sleep(1)  # Rate limiting
+                    if status == 200 and data.get('status') == 'success':
+                        s, d = self.store_iqair_data(cursor, data, city_name)
+                        stations_added += s
+                        data_points_added += d
                     
                 except Exception as e:
                     logger.warning(f"Error fetching IQAir for {city_name}: {e}")
                     continue
             
+            if data_points_added:
+                notify_data_changed(cursor, 'air_quality_data')
             conn.commit()
             cursor.close()
             logger.info(f"✓ IQAir: {stations_added} stations, {data_points_added} data points")
@@ -511,11 +517,9 @@ class CloudAirQualityCollector:
         total_data = 0
         
         # Collect CPCB data
-        cpcb_data = self.fetch_cpcb_data(1000)
-        if cpcb_data:
-            s, d = self.store_cpcb_data(cpcb_data)
-            total_stations += s
-            total_data += d
+        s, d = self.store_cpcb_data(self.fetch_cpcb_data())
+        total_stations += s
+        total_data += d
         
         # Collect OpenWeather data
         s, d = self.fetch_openweather_data()
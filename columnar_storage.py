@@ -0,0 +1,114 @@
+"""
+Columnar (Parquet) storage for exported and processed air quality datasets
+Datasets are directories partitioned by date and source (hive layout:
+date=2024-01-01/source=CPCB/part-0.parquet), so readers load only the
+columns they ask for and skip partitions outside the requested date range
+"""
+
+import os
+import shutil
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+
+PARQUET_SUFFIX = '.parquet'
+
+
+def is_parquet_path(path):
+    """True for Parquet datasets/files, which are chosen by the `.parquet` suffix"""
+    return str(path).endswith(PARQUET_SUFFIX)
+
+
+def _partitioning(partition_cols):
+    return ds.partitioning(pa.schema([(col, pa.string()) for col in partition_cols]), flavor='hive')
+
+
+def write_dataset(df, path, partition_cols=('date', 'source'), time_col='recorded_at', mode='overwrite'):
+    """
+    Write `df` as a Parquet dataset partitioned by `partition_cols`.
+    'date' is derived from `time_col` when the frame has no such column;
+    partition columns missing from the frame are skipped.
+    mode: 'overwrite' replaces the whole dataset, 'append' adds new files
+    """
+    table_df = df.copy(deep=False)
+
+    if 'date' in partition_cols and 'date' not in table_df.columns and time_col in table_df.columns:
+        table_df[time_col] = pd.to_datetime(table_df[time_col], errors='coerce')
+        table_df['date'] = table_df[time_col].dt.strftime('%Y-%m-%d')
+
+    partition_cols = [col for col in partition_cols if col in table_df.columns]
+    for col in partition_cols:
+        table_df[col] = table_df[col].astype('string').fillna('unknown')
+
+    if mode == 'overwrite' and os.path.exists(path):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    table = pa.Table.from_pandas(table_df, preserve_index=False)
+    ds.write_dataset(
+        table, path,
+        format='parquet',
+        partitioning=_partitioning(partition_cols) if partition_cols else None,
+        basename_template=f'part-{uuid.uuid4().hex[:12]}-{{i}}.parquet',
+        existing_data_behavior='overwrite_or_ignore'
+    )
+
+    return path
+
+
+def open_dataset(path, partition_cols=('date', 'source', 'data_source')):
+    """Open a Parquet dataset (directory or single file) without reading it"""
+    if os.path.isdir(path):
+        present = {entry.split('=', 1)[0] for _, dirs, _ in os.walk(path) for entry in dirs if '=' in entry}
+        return ds.dataset(path, format='parquet',
+                          partitioning=_partitioning([col for col in partition_cols if col in present]))
+    return ds.dataset(path, format='parquet')
+
+
+def read_dataset(path, columns=None, start=None, end=None, filters=None, time_col='recorded_at'):
+    """
+    Read a Parquet dataset into a DataFrame.
+
+    columns: only these columns are read (missing ones are ignored)
+    start/end: inclusive time range on `time_col`; whole date partitions
+               outside the range are skipped and row groups are pruned
+               using Parquet statistics
+    filters: {column: value or list of values}, e.g. {'source': ['CPCB']}
+    """
+    dataset = open_dataset(path)
+    names = set(dataset.schema.names)
+
+    expression = None
+
+    def add(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    for bound, op in ((start, 'ge'), (end, 'le')):
+        if bound is None:
+            continue
+        bound = pd.Timestamp(bound)
+        if 'date' in names and dataset.schema.field('date').type == pa.string():
+            day = bound.strftime('%Y-%m-%d')
+            add(ds.field('date') >= day if op == 'ge' else ds.field('date') <= day)
+        if time_col in names:
+            field_type = dataset.schema.field(time_col).type
+            value = pa.scalar(bound.to_pydatetime(), type=field_type) if pa.types.is_timestamp(field_type) else bound
+            add(ds.field(time_col) >= value if op == 'ge' else ds.field(time_col) <= value)
+
+    for col, value in (filters or {}).items():
+        if col not in names:
+            continue
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        add(ds.field(col).isin([str(v) if col in ('date', 'source', 'data_source') else v for v in values]))
+
+    if columns is not None:
+        columns = [col for col in dict.fromkeys(columns) if col in names]
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    return table.to_pandas()
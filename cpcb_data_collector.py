@@ -5,12 +5,17 @@ Fetches air quality data from CPCB API and stores in PostgreSQL
 
 import requests
 import psycopg2
+from psycopg2.extras import execute_values
 import os
+import sys
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import json
 import time
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'database'))
+from db_manager import copy_merge
+
 load_dotenv()
 
 class CPCBDataCollector:
@@ -76,8 +81,8 @@ class CPCBDataCollector:
         print(f"Processing {len(records)} records...")
         
         cursor = self.db_conn.cursor()
-        stations_added = 0
-        data_points_added = 0
+        stations = {}
+        readings = []
         
         for record in records:
             try:
@@ -86,21 +91,7 @@ class CPCBDataCollector:
                 station_name = record.get('station', record.get('station_name', 'Unknown'))
                 city = record.get('city', record.get('area', ''))
                 state = record.get('state', '')
-                
-                # Insert or update station
-                cursor.execute("""
-                    INSERT INTO stations (station_id, station_name, city, state)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (station_id) DO UPDATE
-                    SET station_name = EXCLUDED.station_name,
-                        city = EXCLUDED.city,
-                        state = EXCLUDED.state
-                    RETURNING station_id
-                """, (station_id, station_name, city, state))
-                
-                result = cursor.fetchone()
-                if result:
-                    stations_added += 1
+                stations[station_id] = (station_id, station_name, city, state)
                 
                 # Parse timestamp
                 last_update = record.get('last_update', record.get('lastupdate', datetime.now().isoformat()))
@@ -124,21 +115,10 @@ class CPCBDataCollector:
                 aqi = record.get('aqi', record.get('aqivalue'))
                 aqi_category = record.get('aqicategory', self.get_aqi_category(aqi))
                 
-                # Insert pollutant data
                 for pollutant_id, value in pollutants.items():
                     if value is not None and value != '':
                         try:
-                            pollutant_value = float(value)
-                            cursor.execute("""
-                                INSERT INTO air_quality_data 
-                                (station_id, recorded_at, pollutant_id, pollutant_avg, aqi, aqi_category)
-                                VALUES (%s, %s, %s, %s, %s, %s)
-                                ON CONFLICT (station_id, recorded_at, pollutant_id) DO UPDATE
-                                SET pollutant_avg = EXCLUDED.pollutant_avg,
-                                    aqi = EXCLUDED.aqi,
-                                    aqi_category = EXCLUDED.aqi_category
-                            """, (station_id, recorded_at, pollutant_id, pollutant_value, aqi, aqi_category))
-                            data_points_added += 1
+                            readings.append((station_id, recorded_at, pollutant_id, float(value), aqi, aqi_category))
                         except (ValueError, TypeError):
                             continue
                 
@@ -146,12 +126,32 @@ class CPCBDataCollector:
                 print(f"Error processing record: {e}")
                 continue
         
+        # Insert or update all stations in one statement
+        execute_values(cursor, """
+            INSERT INTO stations (station_id, station_name, city, state)
+            VALUES %s
+            ON CONFLICT (station_id) DO UPDATE
+            SET station_name = EXCLUDED.station_name,
+                city = EXCLUDED.city,
+                state = EXCLUDED.state
+        """, list(stations.values()), page_size=max(len(stations), 1))
+        
+        # Stream readings through COPY and upsert them in one merge
+        counts = copy_merge(
+            cursor, 'air_quality_data',
+            ['station_id', 'recorded_at', 'pollutant_id', 'pollutant_avg', 'aqi', 'aqi_category'],
+            readings,
+            key_columns=['station_id', 'recorded_at', 'pollutant_id'],
+            update_columns=['pollutant_avg', 'aqi', 'aqi_category']
+        )
+        
         self.db_conn.commit()
         cursor.close()
         
         print(f"\nData stored successfully!")
-        print(f"Stations processed: {stations_added}")
-        print(f"Data points added: {data_points_added}")
+        print(f"Stations processed: {len(stations)}")
+        print(f"Data points added: {counts['inserted']}")
+        print(f"Data points updated: {counts['updated']}")
     
     def get_aqi_category(self, aqi):
         """Determine AQI category based on value"""
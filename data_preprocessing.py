@@ -3,24 +3,46 @@ Advanced Data Preprocessing and Feature Engineering for Air Quality Data
 Includes: Missing value imputation, outlier detection, consistency checks, temporal features
 """
 
+import contextlib
+import io
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from scipy import stats
+from sklearn.base import clone
 from sklearn.preprocessing import StandardScaler
 from sklearn.impute import KNNImputer
+from columnar_storage import is_parquet_path, write_dataset
 import warnings
 warnings.filterwarnings('ignore')
 
 
+def _bin_to_category(values, edges, labels, right=True, unknown='unknown'):
+    """
+    Bin a numeric series into a categorical column of `labels`.
+    `edges` are the inner bin boundaries; right=True puts a value equal to an
+    edge in the lower bin (`<=`), right=False in the upper one (`<`).
+    Missing values become `unknown`.
+    """
+    bins = [-np.inf, *edges, np.inf]
+    binned = pd.cut(values, bins=bins, labels=labels, right=right)
+    return binned.cat.add_categories(unknown).fillna(unknown)
+
+
 class AirQualityPreprocessor:
     """
     Comprehensive preprocessing pipeline for air quality data from multiple sources
     """
     
-    def __init__(self):
+    def __init__(self, knn_group_col='auto', knn_block_size=2000):
         self.scaler = StandardScaler()
         self.imputer = KNNImputer(n_neighbors=5)
+        # KNN neighborhoods: rows of the same station ('auto' picks station_id,
+        # then city), split into time-ordered blocks of at most knn_block_size
+        # rows. knn_group_col=None searches all rows; knn_block_size=None runs
+        # exact KNN over each whole group.
+        self.knn_group_col = knn_group_col
+        self.knn_block_size = knn_block_size
         self.outlier_stats = {}
         self.preprocessing_report = {
             'missing_values': {},
@@ -141,10 +163,93 @@ class AirQualityPreprocessor:
         
         return outliers
     
-    def handle_outliers(self, df, method='cap', iqr_multiplier=1.5, zscore_threshold=3):
+    def compute_global_statistics(self, chunks, iqr_multiplier=1.5, sample_size=200_000, seed=42):
+        """
+        First pass of the chunked pipeline: streaming outlier bounds and fill
+        values for every numeric column.
+        Mean/std are merged exactly chunk by chunk; quartiles and medians come
+        from a uniform sample of at most `sample_size` values per column.
+        """
+        numeric_cols = ['pm25', 'pm10', 'no2', 'so2', 'co', 'o3', 'nh3',
+                       'temperature', 'humidity', 'wind_speed', 'pressure', 'aqi']
+        rng = np.random.default_rng(seed)
+        moments = {}   # col -> [count, mean, M2]
+        samples = {}   # col -> (priority keys, values)
+        source_aqi = []
+        total_rows = 0
+        
+        for chunk in chunks:
+            total_rows += len(chunk)
+            
+            for col in numeric_cols:
+                if col not in chunk.columns:
+                    continue
+                values = pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=float)
+                values = values[~np.isnan(values)]
+                if len(values) == 0:
+                    continue
+                
+                # Parallel variance merge (Chan et al.)
+                count, mean, m2 = moments.get(col, (0, 0.0, 0.0))
+                chunk_count, chunk_mean = len(values), values.mean()
+                chunk_m2 = ((values - chunk_mean) ** 2).sum()
+                delta = chunk_mean - mean
+                total = count + chunk_count
+                moments[col] = (
+                    total,
+                    mean + delta * chunk_count / total,
+                    m2 + chunk_m2 + delta ** 2 * count * chunk_count / total
+                )
+                
+                # Keep the values with the smallest random keys: a uniform sample
+                keys, kept = samples.get(col, (np.empty(0), np.empty(0)))
+                keys = np.concatenate([keys, rng.random(len(values))])
+                kept = np.concatenate([kept, values])
+                if len(keys) > sample_size:
+                    keep = np.argpartition(keys, sample_size)[:sample_size]
+                    keys, kept = keys[keep], kept[keep]
+                samples[col] = (keys, kept)
+            
+            if {'city', 'source', 'aqi'}.issubset(chunk.columns):
+                aqi = pd.to_numeric(chunk['aqi'], errors='coerce')
+                source_aqi.append(aqi.groupby([chunk['city'], chunk['source']]).agg(['sum', 'count']))
+        
+        bounds = {}
+        fill_values = {}
+        for col, (count, mean, m2) in moments.items():
+            sample = samples[col][1]
+            Q1, Q3 = np.quantile(sample, [0.25, 0.75])
+            IQR = Q3 - Q1
+            bounds[col] = {
+                'Q1': Q1,
+                'Q3': Q3,
+                'IQR': IQR,
+                'lower_bound': Q1 - iqr_multiplier * IQR,
+                'upper_bound': Q3 + iqr_multiplier * IQR,
+                'mean': mean,
+                'std': np.sqrt(m2 / count),
+                'count': count
+            }
+            fill_values[col] = {'mean': mean, 'median': np.median(sample)}
+        
+        city_source_aqi = None
+        if source_aqi:
+            totals = pd.concat(source_aqi).groupby(level=[0, 1]).sum()
+            city_source_aqi = (totals['sum'] / totals['count']).dropna()
+        
+        return {
+            'rows': total_rows,
+            'bounds': bounds,
+            'fill_values': fill_values,
+            'city_source_aqi': city_source_aqi
+        }
+    
+    def handle_outliers(self, df, method='cap', iqr_multiplier=1.5, zscore_threshold=3, bounds=None):
         """
         Comprehensive outlier detection and handling
         method: 'remove', 'cap', or 'keep'
+        bounds: precomputed per-column statistics (see compute_global_statistics)
+                used instead of statistics of `df` itself
         """
         print("\n" + "="*80)
         print("🔍 OUTLIER DETECTION AND HANDLING")
@@ -160,9 +265,20 @@ class AirQualityPreprocessor:
             if col not in df.columns:
                 continue
             
-            # Detect outliers using IQR
-            outliers_iqr = self.detect_outliers_iqr(df, col, iqr_multiplier)
-            outliers_zscore = self.detect_outliers_zscore(df, col, zscore_threshold)
+            if bounds is not None:
+                if col not in bounds:
+                    continue
+                col_stats = bounds[col]
+                self.outlier_stats[col] = col_stats
+                outliers_iqr = (df[col] < col_stats['lower_bound']) | (df[col] > col_stats['upper_bound'])
+                if col_stats['std'] > 0:
+                    outliers_zscore = (df[col] - col_stats['mean']).abs() / col_stats['std'] > zscore_threshold
+                else:
+                    outliers_zscore = pd.Series(False, index=df.index)
+            else:
+                # Detect outliers using IQR
+                outliers_iqr = self.detect_outliers_iqr(df, col, iqr_multiplier)
+                outliers_zscore = self.detect_outliers_zscore(df, col, zscore_threshold)
             
             # Combine both methods (outlier if detected by either method)
             outliers = outliers_iqr | outliers_zscore
@@ -246,10 +362,75 @@ class AirQualityPreprocessor:
         
         return df
     
-    def impute_missing_values(self, df, method='knn'):
+    def _knn_neighborhoods(self, df):
+        """
+        Yield arrays of row positions that are imputed together: one per
+        station (or all rows), in time order, split into blocks of at most
+        knn_block_size rows
+        """
+        group_col = self.knn_group_col
+        if group_col == 'auto':
+            group_col = next((c for c in ('station_id', 'city') if c in df.columns), None)
+        elif group_col is not None and group_col not in df.columns:
+            group_col = None
+        
+        sort_keys = []
+        if 'recorded_at' in df.columns:
+            sort_keys.append(pd.to_datetime(df['recorded_at'], errors='coerce').to_numpy())
+        if group_col is not None:
+            group_codes = pd.factorize(df[group_col])[0]
+            sort_keys.append(group_codes)
+        order = np.lexsort(sort_keys) if sort_keys else np.arange(len(df))
+        
+        if group_col is not None:
+            boundaries = np.flatnonzero(np.diff(group_codes[order])) + 1
+            groups = np.split(order, boundaries)
+        else:
+            groups = [order]
+        
+        for positions in groups:
+            if self.knn_block_size and len(positions) > self.knn_block_size:
+                n_blocks = int(np.ceil(len(positions) / self.knn_block_size))
+                yield from np.array_split(positions, n_blocks)
+            else:
+                yield positions
+    
+    def _knn_impute(self, df, cols, fill_values=None):
+        """
+        Single KNN pass over `cols`, neighbors searched within station/time
+        blocks so the cost is linear in the number of blocks. Values a block
+        cannot impute (column empty in that block) fall back to the median.
+        """
+        values = df[cols].to_numpy(dtype=float, copy=True)
+        
+        for positions in self._knn_neighborhoods(df):
+            block = values[positions]
+            missing = np.isnan(block)
+            if not missing.any():
+                continue
+            
+            observed = ~missing.all(axis=0)
+            if observed.sum() < 2:
+                continue
+            
+            imputer = clone(self.imputer)
+            block[:, observed] = imputer.fit_transform(block[:, observed])
+            values[positions] = block
+        
+        imputed = pd.DataFrame(values, index=df.index, columns=cols)
+        medians = imputed.median()
+        for col in cols:
+            if fill_values and col in fill_values:
+                medians[col] = fill_values[col]['median']
+        df[cols] = imputed.fillna(medians)
+        return df
+    
+    def impute_missing_values(self, df, method='knn', fill_values=None):
         """
         Advanced missing value imputation
         method: 'knn', 'mean', 'median', 'forward_fill', 'interpolate'
+        fill_values: precomputed {col: {'mean': ..., 'median': ...}} used by the
+                     mean/median methods and the KNN fallback instead of `df` statistics
         """
         print("\n" + "="*80)
         print("🔧 MISSING VALUE IMPUTATION")
@@ -258,35 +439,38 @@ class AirQualityPreprocessor:
         numeric_cols = ['pm25', 'pm10', 'no2', 'so2', 'co', 'o3', 'nh3',
                        'temperature', 'humidity', 'wind_speed', 'pressure', 'aqi']
         
+        missing_counts = {col: df[col].isnull().sum() for col in numeric_cols if col in df.columns}
+        
+        if method == 'knn':
+            # KNN imputation (uses correlation with other features), all columns in one pass
+            knn_cols = [c for c in missing_counts if df[c].notnull().sum() > 0]
+            knn_ready = len(knn_cols) > 1 and any(missing_counts[c] > 0 for c in knn_cols)
+            if knn_ready:
+                df = self._knn_impute(df, knn_cols, fill_values)
+        
         imputation_summary = []
         
-        for col in numeric_cols:
-            if col not in df.columns:
-                continue
-            
-            missing_count = df[col].isnull().sum()
+        for col, missing_count in missing_counts.items():
             if missing_count == 0:
                 continue
             
             missing_pct = (missing_count / len(df) * 100)
             
+            col_fill = (fill_values or {}).get(col, {})
+            
             if method == 'knn':
-                # KNN imputation (uses correlation with other features)
-                temp_cols = [c for c in numeric_cols if c in df.columns and df[c].notnull().sum() > 0]
-                if len(temp_cols) > 1:
-                    imputer = KNNImputer(n_neighbors=5)
-                    df[temp_cols] = imputer.fit_transform(df[temp_cols])
+                if knn_ready and col in knn_cols:
                     method_used = 'KNN'
                 else:
-                    df[col].fillna(df[col].median(), inplace=True)
+                    df[col] = df[col].fillna(col_fill.get('median', df[col].median()))
                     method_used = 'Median (fallback)'
             
             elif method == 'mean':
-                df[col].fillna(df[col].mean(), inplace=True)
+                df[col] = df[col].fillna(col_fill.get('mean', df[col].mean()))
                 method_used = 'Mean'
             
             elif method == 'median':
-                df[col].fillna(df[col].median(), inplace=True)
+                df[col] = df[col].fillna(col_fill.get('median', df[col].median()))
                 method_used = 'Median'
             
             elif method == 'forward_fill':
@@ -342,30 +526,22 @@ class AirQualityPreprocessor:
         df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
         
         # Time of day categories
-        def categorize_time_of_day(hour):
-            if 6 <= hour < 12:
-                return 'morning'
-            elif 12 <= hour < 17:
-                return 'afternoon'
-            elif 17 <= hour < 21:
-                return 'evening'
-            else:
-                return 'night'
-        
-        df['time_of_day'] = df['hour'].apply(categorize_time_of_day)
+        hour = df['hour']
+        time_of_day = np.select(
+            [(hour >= 6) & (hour < 12), (hour >= 12) & (hour < 17), (hour >= 17) & (hour < 21)],
+            ['morning', 'afternoon', 'evening'],
+            default='night'
+        )
+        df['time_of_day'] = pd.Categorical(time_of_day, categories=['morning', 'afternoon', 'evening', 'night'])
         
         # Season (Northern Hemisphere - India)
-        def get_season(month):
-            if month in [3, 4, 5]:
-                return 'summer'
-            elif month in [6, 7, 8, 9]:
-                return 'monsoon'
-            elif month in [10, 11]:
-                return 'post_monsoon'
-            else:  # 12, 1, 2
-                return 'winter'
-        
-        df['season'] = df['month'].apply(get_season)
+        month = df['month']
+        season = np.select(
+            [month.isin([3, 4, 5]), month.isin([6, 7, 8, 9]), month.isin([10, 11])],
+            ['summer', 'monsoon', 'post_monsoon'],
+            default='winter'  # 12, 1, 2
+        )
+        df['season'] = pd.Categorical(season, categories=['winter', 'summer', 'monsoon', 'post_monsoon'])
         
         # Rush hour indicator (morning: 7-10, evening: 17-20)
         df['is_rush_hour'] = ((df['hour'].between(7, 10)) | (df['hour'].between(17, 20))).astype(int)
@@ -422,43 +598,17 @@ class AirQualityPreprocessor:
         
         # Pollutant severity categories
         if 'pm25' in df.columns:
-            def categorize_pm25(value):
-                if pd.isna(value):
-                    return 'unknown'
-                elif value <= 30:
-                    return 'good'
-                elif value <= 60:
-                    return 'satisfactory'
-                elif value <= 90:
-                    return 'moderate'
-                elif value <= 120:
-                    return 'poor'
-                elif value <= 250:
-                    return 'very_poor'
-                else:
-                    return 'severe'
-            
-            df['pm25_category'] = df['pm25'].apply(categorize_pm25)
+            df['pm25_category'] = _bin_to_category(
+                df['pm25'], [30, 60, 90, 120, 250],
+                ['good', 'satisfactory', 'moderate', 'poor', 'very_poor', 'severe']
+            )
             pollutant_features.append('pm25_category')
         
         if 'aqi' in df.columns:
-            def categorize_aqi(value):
-                if pd.isna(value):
-                    return 'unknown'
-                elif value <= 50:
-                    return 'good'
-                elif value <= 100:
-                    return 'moderate'
-                elif value <= 200:
-                    return 'unhealthy_sensitive'
-                elif value <= 300:
-                    return 'unhealthy'
-                elif value <= 400:
-                    return 'very_unhealthy'
-                else:
-                    return 'hazardous'
-            
-            df['aqi_category'] = df['aqi'].apply(categorize_aqi)
+            df['aqi_category'] = _bin_to_category(
+                df['aqi'], [50, 100, 200, 300, 400],
+                ['good', 'moderate', 'unhealthy_sensitive', 'unhealthy', 'very_unhealthy', 'hazardous']
+            )
             pollutant_features.append('aqi_category')
         
         print(f"✅ Created {len(pollutant_features)} pollutant features:")
@@ -481,63 +631,30 @@ class AirQualityPreprocessor:
         
         # Heat Index (feels like temperature considering humidity)
         if 'temperature' in df.columns and 'humidity' in df.columns:
-            def calculate_heat_index(temp, humidity):
-                if pd.isna(temp) or pd.isna(humidity):
-                    return np.nan
-                # Simplified heat index formula
-                hi = 0.5 * (temp + 61.0 + ((temp - 68.0) * 1.2) + (humidity * 0.094))
-                return hi
-            
-            df['heat_index'] = df.apply(lambda x: calculate_heat_index(x['temperature'], x['humidity']), axis=1)
+            # Simplified heat index formula (NaN where either input is missing)
+            temp = df['temperature']
+            df['heat_index'] = 0.5 * (temp + 61.0 + ((temp - 68.0) * 1.2) + (df['humidity'] * 0.094))
             weather_features.append('heat_index')
         
         # Temperature category
         if 'temperature' in df.columns:
-            def categorize_temp(temp):
-                if pd.isna(temp):
-                    return 'unknown'
-                elif temp < 15:
-                    return 'cold'
-                elif temp < 25:
-                    return 'moderate'
-                elif temp < 35:
-                    return 'warm'
-                else:
-                    return 'hot'
-            
-            df['temp_category'] = df['temperature'].apply(categorize_temp)
+            df['temp_category'] = _bin_to_category(
+                df['temperature'], [15, 25, 35], ['cold', 'moderate', 'warm', 'hot'], right=False
+            )
             weather_features.append('temp_category')
         
         # Humidity category
         if 'humidity' in df.columns:
-            def categorize_humidity(humidity):
-                if pd.isna(humidity):
-                    return 'unknown'
-                elif humidity < 30:
-                    return 'dry'
-                elif humidity < 60:
-                    return 'comfortable'
-                else:
-                    return 'humid'
-            
-            df['humidity_category'] = df['humidity'].apply(categorize_humidity)
+            df['humidity_category'] = _bin_to_category(
+                df['humidity'], [30, 60], ['dry', 'comfortable', 'humid'], right=False
+            )
             weather_features.append('humidity_category')
         
         # Wind speed category
         if 'wind_speed' in df.columns:
-            def categorize_wind(speed):
-                if pd.isna(speed):
-                    return 'unknown'
-                elif speed < 5:
-                    return 'calm'
-                elif speed < 15:
-                    return 'light'
-                elif speed < 25:
-                    return 'moderate'
-                else:
-                    return 'strong'
-            
-            df['wind_category'] = df['wind_speed'].apply(categorize_wind)
+            df['wind_category'] = _bin_to_category(
+                df['wind_speed'], [5, 15, 25], ['calm', 'light', 'moderate', 'strong'], right=False
+            )
             weather_features.append('wind_category')
         
         print(f"✅ Created {len(weather_features)} weather features:")
@@ -726,11 +843,135 @@ class AirQualityPreprocessor:
         
         return df
     
+    def run_chunked_pipeline(self, source, output_path='processed_air_quality_data.csv',
+                             chunksize=100_000, imputation_method='knn', outlier_method='cap',
+                             add_rolling=True, add_lags=True, windows=[3, 6, 12, 24],
+                             lags=[1, 3, 6, 12, 24]):
+        """
+        Run the preprocessing pipeline in bounded memory, one time block at a time.
+        
+        source: CSV path, or a callable returning a fresh iterator of DataFrames
+                (it is read twice), e.g. lambda: pd.read_sql(query, conn, chunksize=50000)
+        
+        Pass 1 computes outlier bounds and fill values over the whole input
+        (compute_global_statistics). Pass 2 cleans, imputes and engineers
+        features chunk by chunk and appends to `output_path` (CSV, or a
+        Parquet dataset when it ends in .parquet). The last rows of
+        each city are carried into the next chunk so rolling and lag windows
+        match an in-memory run. Input must be ordered by `recorded_at`
+        (ascending); output is ordered by city and time within each chunk.
+        Mean/median fills use statistics of the raw input, and 'remove'
+        applies every column's bounds from pass 1 rather than re-deriving them
+        after each column's removals.
+        """
+        if isinstance(source, str):
+            filepath = source
+            source = lambda: pd.read_csv(filepath, chunksize=chunksize)
+        
+        print("\n" + "🚀"*40)
+        print("STARTING CHUNKED PREPROCESSING PIPELINE")
+        print("🚀"*40)
+        
+        # Pass 1: global statistics
+        global_stats = self.compute_global_statistics(source())
+        print(f"\n📊 Pass 1: statistics over {global_stats['rows']} records "
+              f"({len(global_stats['bounds'])} numeric columns)")
+        
+        city_source_aqi = global_stats['city_source_aqi']
+        if city_source_aqi is not None:
+            by_city = city_source_aqi.groupby(level=0)
+            aqi_diff = by_city.max() - by_city.min()
+            issues = aqi_diff[(by_city.size() > 1) & (aqi_diff > 50)]
+            print(f"🔄 Cities with AQI differing by more than 50 across sources: {len(issues)}")
+        
+        # Pass 2: per-chunk processing with carried context
+        context_rows = max([*windows, *lags, 1]) if (add_rolling or add_lags) else 0
+        carry = None
+        columns = None
+        last_timestamp = None
+        rows_written = 0
+        chunk_count = 0
+        
+        for chunk in source():
+            chunk = chunk.reset_index(drop=True)
+            chunk_count += 1
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                chunk = self.clean_data_types(chunk)
+                
+                if 'recorded_at' in chunk.columns:
+                    chunk_start = chunk['recorded_at'].min()
+                    if last_timestamp is not None and chunk_start < last_timestamp:
+                        raise ValueError("run_chunked_pipeline needs input ordered by recorded_at "
+                                         f"(chunk {chunk_count} starts at {chunk_start}, "
+                                         f"before {last_timestamp})")
+                    chunk_end = chunk['recorded_at'].max()
+                    if pd.notna(chunk_end):
+                        last_timestamp = chunk_end
+                
+                chunk = self.handle_outliers(chunk, method=outlier_method, bounds=global_stats['bounds'])
+                
+                chunk['_context'] = False
+                if carry is not None and len(carry):
+                    chunk = pd.concat([carry, chunk], ignore_index=True)
+                
+                chunk = self.impute_missing_values(chunk, method=imputation_method,
+                                                   fill_values=global_stats['fill_values'])
+                
+                base_columns = [c for c in chunk.columns if c != '_context']
+                
+                chunk = self.engineer_temporal_features(chunk)
+                chunk = self.engineer_pollutant_features(chunk)
+                chunk = self.engineer_weather_features(chunk)
+                if add_rolling:
+                    chunk = self.engineer_rolling_features(chunk, windows=windows)
+                if add_lags:
+                    chunk = self.create_lag_features(chunk, lags=lags)
+            
+            if context_rows and 'city' in chunk.columns:
+                if 'recorded_at' in chunk.columns:
+                    chunk = chunk.sort_values(['city', 'recorded_at'])
+                carry = chunk.groupby('city', sort=False).tail(context_rows)[base_columns]
+                carry['_context'] = True
+            
+            output = chunk[~chunk['_context']].drop(columns='_context')
+            if columns is None:
+                columns = list(output.columns)
+            output = output.reindex(columns=columns)
+            
+            if is_parquet_path(output_path):
+                write_dataset(output, output_path, partition_cols=('date', 'source'),
+                              mode='overwrite' if rows_written == 0 else 'append')
+            else:
+                output.to_csv(output_path, mode='w' if rows_written == 0 else 'a',
+                              header=rows_written == 0, index=False)
+            rows_written += len(output)
+            print(f"   • Chunk {chunk_count}: wrote {len(output)} rows ({rows_written} total)")
+        
+        self.preprocessing_report['chunked'] = {
+            'chunks': chunk_count,
+            'rows_in': global_stats['rows'],
+            'rows_out': rows_written,
+            'context_rows': context_rows
+        }
+        self.get_preprocessing_summary()
+        
+        print("\n" + "✅"*40)
+        print(f"CHUNKED PREPROCESSING COMPLETE!")
+        print(f"💾 Wrote {rows_written} rows in {chunk_count} chunks to: {output_path}")
+        print("✅"*40 + "\n")
+        
+        return output_path
+    
     def save_processed_data(self, df, filepath='processed_air_quality_data.csv'):
         """
-        Save processed data to CSV
+        Save processed data to CSV, or to a Parquet dataset partitioned by
+        date and source when `filepath` ends in .parquet
         """
-        df.to_csv(filepath, index=False)
+        if is_parquet_path(filepath):
+            write_dataset(df, filepath, partition_cols=('date', 'source'))
+        else:
+            df.to_csv(filepath, index=False)
         print(f"💾 Saved processed data to: {filepath}")
         print(f"   • Rows: {len(df)}")
         print(f"   • Columns: {len(df.columns)}")
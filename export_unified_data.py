@@ -1,11 +1,13 @@
 """
 Export Multi-Source Air Quality Data to Unified CSV
 Merges data from CPCB, OpenWeather, and IQAir with station IDs
+Filenames ending in .parquet are written as Parquet datasets partitioned by date and source
 """
 
 import sqlite3
 import pandas as pd
 from datetime import datetime
+from columnar_storage import is_parquet_path, write_dataset
 
 class MultiSourceExporter:
     def __init__(self, db_path='air_quality_multi.db'):
@@ -83,9 +85,9 @@ class MultiSourceExporter:
             ORDER BY s.data_source, aq.recorded_at DESC, s.city, s.station_name
         """
         
-        print(f"📊 Exporting unified data to CSV...")
+        print(f"📊 Exporting unified data to {'Parquet' if is_parquet_path(filename) else 'CSV'}...")
         df = pd.read_sql_query(query, self.conn)
-        df.to_csv(filename, index=False)
+        self._write(df, filename)
         
         print(f"✓ Exported {len(df)} records to: {filename}")
         print(f"  Columns: {list(df.columns)}")
@@ -247,7 +249,7 @@ class MultiSourceExporter:
         pivot['is_weekend'] = pivot['day_of_week'].isin([5, 6]).astype(int)
         
         # Save
-        pivot.to_csv(filename, index=False)
+        self._write(pivot, filename)
         
         print(f"✓ ML-ready dataset exported to: {filename}")
         print(f"  Shape: {pivot.shape[0]} rows × {pivot.shape[1]} columns")
@@ -255,6 +257,13 @@ class MultiSourceExporter:
         
         return pivot
     
+    def _write(self, df, filename):
+        """Write CSV, or a date/source partitioned Parquet dataset for .parquet names"""
+        if is_parquet_path(filename):
+            write_dataset(df, filename, partition_cols=('date', 'data_source'))
+        else:
+            df.to_csv(filename, index=False)
+    
     def close(self):
         if self.conn:
             self.conn.close()
@@ -275,6 +284,7 @@ if __name__ == "__main__":
         print("\n📦 EXPORTING DATA")
         print("="*70)
         df = exporter.export_unified_csv('unified_air_quality_data.csv')
+        exporter.export_unified_csv('unified_air_quality_data.parquet')
         
         print()
         
@@ -285,6 +295,7 @@ if __name__ == "__main__":
         
         # Export ML-ready data
         ml_df = exporter.export_ml_ready_data('ml_ready_air_quality.csv')
+        exporter.export_ml_ready_data('ml_ready_air_quality.parquet')
         
         print("\n\n📊 SAMPLE DATA (Latest 10 Readings)")
         print("="*70)
@@ -313,6 +324,7 @@ if __name__ == "__main__":
         print("  2. ml_ready_air_quality.csv - ML-ready with time features")
         print("  3. cpcb_air_quality_data.csv - CPCB data only")
         print("  4. openweather_air_quality_data.csv - OpenWeather data only")
+        print("  5. unified_air_quality_data.parquet/, ml_ready_air_quality.parquet/ - Columnar copies (by date/source)")
         
     except Exception as e:
         print(f"Error: {e}")
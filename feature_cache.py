@@ -0,0 +1,188 @@
+"""
+Persistent feature-matrix cache for model training
+Feature matrices are stored as float32 NumPy memmaps next to a JSON sidecar
+(feature list, target, time range, source fingerprint). Repeated training and
+tuning runs map them read-only instead of rebuilding them from CSV or SQL,
+and new rows can be appended without rewriting what is already cached.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_FORMAT_VERSION = 1  # bump when the on-disk layout changes
+
+
+def fingerprint_source(source):
+    """
+    Cheap identity of a data source: path, size and mtime of every file for
+    CSV files / Parquet directories, the text itself otherwise (e.g. a query)
+    """
+    digest = hashlib.sha256()
+    path = Path(str(source))
+    if path.exists():
+        files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+        for file in files:
+            stat = file.stat()
+            digest.update(f'{file.resolve()}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    else:
+        digest.update(str(source).encode())
+    return digest.hexdigest()
+
+
+class FeatureMatrixCache:
+    """
+    Versioned store of (X, y, timestamps) matrices under `cache_dir`.
+    An entry is keyed by cache name, feature list, target and source
+    fingerprint; storing a new version of a name removes the older ones.
+    """
+
+    def __init__(self, cache_dir='feature_cache'):
+        self.cache_dir = Path(cache_dir)
+
+    def _entry_dir(self, name, features, target, source_hash):
+        key = json.dumps([CACHE_FORMAT_VERSION, name, list(features), target, source_hash])
+        return self.cache_dir / f"{name}-{hashlib.sha256(key.encode()).hexdigest()[:16]}"
+
+    @staticmethod
+    def _read_meta(entry):
+        meta_path = entry / 'meta.json'
+        if not meta_path.exists():
+            return None
+        with open(meta_path, 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write_meta(entry, meta):
+        # Sidecar is written last and atomically: it defines how many rows are valid
+        meta['updated_at'] = datetime.now().isoformat()
+        tmp_path = entry / 'meta.json.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, entry / 'meta.json')
+
+    @staticmethod
+    def _as_arrays(X, y, timestamps, features):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(features):
+            raise ValueError(f"X has shape {X.shape}, expected (rows, {len(features)})")
+        y = np.ascontiguousarray(y, dtype=np.float32)
+        ts = pd.to_datetime(pd.Series(timestamps)).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        if not (len(X) == len(y) == len(ts)):
+            raise ValueError(f"X, y and timestamps differ in length ({len(X)}, {len(y)}, {len(ts)})")
+        return X, y, ts
+
+    @staticmethod
+    def _time_range(ts, current=None):
+        if len(ts) == 0:
+            return current
+        start, end = ts.min(), ts.max()
+        if current:
+            start = min(start, pd.Timestamp(current[0]).value)
+            end = max(end, pd.Timestamp(current[1]).value)
+        return [pd.Timestamp(start).isoformat(), pd.Timestamp(end).isoformat()]
+
+    def load(self, name, features, target, source_hash):
+        """
+        Map a cached matrix read-only.
+        Returns (X, y, timestamps, meta) with X of shape (rows, len(features)),
+        or None when there is no entry for this name/features/target/source.
+        """
+        entry = self._entry_dir(name, features, target, source_hash)
+        meta = self._read_meta(entry)
+        if meta is None or meta['features'] != list(features) or meta['source_hash'] != source_hash:
+            return None
+
+        rows, n_features = meta['rows'], len(features)
+        if rows == 0:
+            return (np.empty((0, n_features), dtype=np.float32), np.empty(0, dtype=np.float32),
+                    np.empty(0, dtype='datetime64[ns]'), meta)
+
+        X = np.memmap(entry / 'X.f32', dtype=np.float32, mode='r', shape=(rows, n_features))
+        y = np.memmap(entry / 'y.f32', dtype=np.float32, mode='r', shape=(rows,))
+        timestamps = np.memmap(entry / 'timestamps.i8', dtype=np.int64, mode='r', shape=(rows,)).view('datetime64[ns]')
+        return X, y, timestamps, meta
+
+    def store(self, name, X, y, timestamps, features, target, source_hash, fill_values=None,
+              watermark=None):
+        """
+        Write a new cache entry (replacing older versions of `name`) and map it.
+        `fill_values` (column -> value used to impute missing inputs) is kept
+        in the sidecar so appended rows can be imputed the same way;
+        `watermark` records how far into the source the entry reaches (e.g.
+        the highest row id) so the next append knows where to resume.
+        """
+        X, y, ts = self._as_arrays(X, y, timestamps, features)
+        entry = self._entry_dir(name, features, target, source_hash)
+
+        for old_entry in self.cache_dir.glob(f'{name}-*'):
+            if old_entry != entry and old_entry.is_dir():
+                shutil.rmtree(old_entry, ignore_errors=True)
+        if entry.exists():
+            shutil.rmtree(entry)
+        entry.mkdir(parents=True)
+
+        X.tofile(entry / 'X.f32')
+        y.tofile(entry / 'y.f32')
+        ts.tofile(entry / 'timestamps.i8')
+
+        self._write_meta(entry, {
+            'format_version': CACHE_FORMAT_VERSION,
+            'name': name,
+            'features': list(features),
+            'target': target,
+            'source_hash': source_hash,
+            'rows': len(X),
+            'dtype': 'float32',
+            'time_range': self._time_range(ts),
+            'fill_values': fill_values,
+            'watermark': watermark,
+            'created_at': datetime.now().isoformat()
+        })
+
+        return self.load(name, features, target, source_hash)
+
+    def append(self, name, X, y, timestamps, features, target, source_hash, fill_values=None,
+               watermark=None):
+        """
+        Append rows to an existing entry (created if missing) and map the result.
+        `fill_values` is only recorded if the entry has none yet; `watermark`
+        replaces the entry's watermark when given.
+        """
+        entry = self._entry_dir(name, features, target, source_hash)
+        meta = self._read_meta(entry)
+        if meta is None:
+            return self.store(name, X, y, timestamps, features, target, source_hash, fill_values,
+                              watermark)
+
+        X, y, ts = self._as_arrays(X, y, timestamps, features)
+        if len(X) == 0:
+            if watermark is not None and watermark != meta.get('watermark'):
+                meta['watermark'] = watermark
+                self._write_meta(entry, meta)
+            return self.load(name, features, target, source_hash)
+
+        rows = meta['rows']
+        for filename, array, row_bytes in (('X.f32', X, 4 * len(features)), ('y.f32', y, 4), ('timestamps.i8', ts, 8)):
+            with open(entry / filename, 'r+b' if (entry / filename).exists() else 'w+b') as f:
+                # Drop bytes past the last committed row (interrupted append)
+                f.truncate(rows * row_bytes)
+                f.seek(0, os.SEEK_END)
+                array.tofile(f)
+
+        meta['rows'] = rows + len(X)
+        if meta.get('fill_values') is None:
+            meta['fill_values'] = fill_values
+        if watermark is not None:
+            meta['watermark'] = watermark
+        meta['time_range'] = self._time_range(ts, meta.get('time_range'))
+        self._write_meta(entry, meta)
+
+        return self.load(name, features, target, source_hash)
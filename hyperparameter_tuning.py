@@ -215,11 +215,8 @@ def main():
     # Initialize pipeline
     pipeline = AQIPredictionPipeline(target='aqi', random_state=42)
     
-    # Load data
-    pipeline.load_data('processed_air_quality_data.csv')
-    
-    # Select features
-    pipeline.select_features(feature_set='recommended')
+    # Load features (memory-mapped cache, rebuilt only when the CSV changes)
+    pipeline.load_features_cached('processed_air_quality_data.csv', feature_set='recommended')
     
     # Split data
     pipeline.time_series_split(train_size=0.7, val_size=0.15, test_size=0.15)
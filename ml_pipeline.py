@@ -27,10 +27,46 @@ from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.model_selection import RandomizedSearchCV
 from scipy.stats import uniform, randint
 
+from columnar_storage import is_parquet_path, read_dataset
+from feature_cache import FeatureMatrixCache, fingerprint_source
+
 import warnings
 warnings.filterwarnings('ignore')
 
 
+FEATURE_SETS = {
+    # Minimal set for quick training
+    'minimal': [
+        'pm25', 'pm10', 'no2', 'temperature', 'humidity',
+        'hour', 'day_of_week', 'is_weekend'
+    ],
+    
+    # Recommended balanced set
+    'recommended': [
+        # Core pollutants
+        'pm25', 'pm10', 'no2', 'so2', 'co', 'o3',
+        
+        # Weather
+        'temperature', 'humidity', 'wind_speed', 'pressure',
+        
+        # Temporal
+        'hour', 'day_of_week', 'month', 'is_weekend', 'is_rush_hour',
+        'hour_sin', 'hour_cos',
+        
+        # Lag features
+        'pm25_lag_1h', 'pm25_lag_3h', 'pm25_lag_24h',
+        'temperature_lag_1h',
+        
+        # Rolling features
+        'pm25_rolling_mean_6h', 'pm25_rolling_std_6h',
+        'pm25_rolling_mean_24h',
+        
+        # Derived metrics
+        'pm25_pm10_ratio', 'heat_index'
+    ]
+}
+
+
 class AQIPredictionPipeline:
     """
     Complete ML pipeline for AQI prediction with ensemble methods
@@ -50,18 +86,38 @@ class AQIPredictionPipeline:
         # Ensemble
         self.ensemble_model = None
         
+        # Cached (X, y) over a memory-mapped feature matrix, see load_features_cached
+        self.feature_matrix = None
+        
         print("✅ AQI Prediction Pipeline initialized")
     
-    def load_data(self, filepath='processed_air_quality_data.csv'):
+    def load_data(self, filepath='processed_air_quality_data.csv', feature_set=None, start=None, end=None):
         """
-        Load preprocessed data
+        Load preprocessed data from CSV or a Parquet dataset (.parquet)
+        feature_set: name in FEATURE_SETS or list of columns; only those
+                     features, the target and recorded_at are loaded
+        start/end: inclusive recorded_at range (pushed down for Parquet)
         """
         print("\n" + "="*80)
         print("📂 LOADING DATA")
         print("="*80)
         
-        self.df = pd.read_csv(filepath)
-        self.df['recorded_at'] = pd.to_datetime(self.df['recorded_at'])
+        columns = None
+        if feature_set is not None and feature_set != 'complete':
+            features = FEATURE_SETS[feature_set] if isinstance(feature_set, str) else feature_set
+            columns = ['recorded_at', self.target, *features]
+        
+        if is_parquet_path(filepath):
+            self.df = read_dataset(filepath, columns=columns, start=start, end=end)
+            self.df['recorded_at'] = pd.to_datetime(self.df['recorded_at'])
+        else:
+            usecols = None if columns is None else (lambda col: col in columns)
+            self.df = pd.read_csv(filepath, usecols=usecols)
+            self.df['recorded_at'] = pd.to_datetime(self.df['recorded_at'])
+            if start is not None:
+                self.df = self.df[self.df['recorded_at'] >= pd.Timestamp(start)]
+            if end is not None:
+                self.df = self.df[self.df['recorded_at'] <= pd.Timestamp(end)]
         
         print(f"✅ Loaded {len(self.df)} records")
         print(f"   • Shape: {self.df.shape}")
@@ -77,37 +133,8 @@ class AQIPredictionPipeline:
         print("🎯 FEATURE SELECTION")
         print("="*80)
         
-        if feature_set == 'minimal':
-            # Minimal set for quick training
-            features = [
-                'pm25', 'pm10', 'no2', 'temperature', 'humidity',
-                'hour', 'day_of_week', 'is_weekend'
-            ]
-        
-        elif feature_set == 'recommended':
-            # Recommended balanced set
-            features = [
-                # Core pollutants
-                'pm25', 'pm10', 'no2', 'so2', 'co', 'o3',
-                
-                # Weather
-                'temperature', 'humidity', 'wind_speed', 'pressure',
-                
-                # Temporal
-                'hour', 'day_of_week', 'month', 'is_weekend', 'is_rush_hour',
-                'hour_sin', 'hour_cos',
-                
-                # Lag features
-                'pm25_lag_1h', 'pm25_lag_3h', 'pm25_lag_24h',
-                'temperature_lag_1h',
-                
-                # Rolling features
-                'pm25_rolling_mean_6h', 'pm25_rolling_std_6h',
-                'pm25_rolling_mean_24h',
-                
-                # Derived metrics
-                'pm25_pm10_ratio', 'heat_index'
-            ]
+        if isinstance(feature_set, str) and feature_set in FEATURE_SETS:
+            features = list(FEATURE_SETS[feature_set])
         
         elif feature_set == 'complete':
             # Use all numeric features
@@ -132,6 +159,62 @@ class AQIPredictionPipeline:
         
         return features
     
+    def load_features_cached(self, filepath='processed_air_quality_data.csv', feature_set='recommended',
+                             cache_dir='feature_cache'):
+        """
+        Load the time-ordered, NaN-free feature matrix for `feature_set`
+        from the memory-mapped cache, building it from `filepath` on a miss
+        or when the file has changed. time_series_split then slices the
+        mapped matrix instead of rebuilding it.
+        """
+        print("\n" + "="*80)
+        print("🗄️ LOADING CACHED FEATURE MATRIX")
+        print("="*80)
+        
+        cache = FeatureMatrixCache(cache_dir)
+        source_hash = fingerprint_source(filepath)
+        cache_name = Path(str(filepath)).name
+        
+        cached = None
+        if isinstance(feature_set, str) and feature_set in FEATURE_SETS:
+            features = list(FEATURE_SETS[feature_set])
+        elif not isinstance(feature_set, str):
+            features = list(feature_set)
+        else:
+            features = None  # 'complete' depends on the columns in the file
+        
+        if features is not None:
+            cached = cache.load(cache_name, features, self.target, source_hash)
+        
+        if cached is None:
+            self.load_data(filepath, feature_set=feature_set)
+            features = self.select_features(feature_set)
+            df_clean = self._clean_feature_frame()
+            cached = cache.store(cache_name, df_clean[features].to_numpy(dtype=np.float32),
+                                 df_clean[self.target].to_numpy(dtype=np.float32),
+                                 df_clean['recorded_at'], features, self.target, source_hash)
+            print(f"✅ Built feature matrix cache ({len(df_clean)} rows)")
+        else:
+            self.features = features
+            print(f"✅ Mapped cached feature matrix (zero-copy)")
+        
+        X, y, timestamps, meta = cached
+        self.feature_matrix = (
+            pd.DataFrame(X, columns=features, copy=False),
+            pd.Series(y, name=self.target, copy=False)
+        )
+        
+        print(f"   • Rows: {meta['rows']}  Features: {len(features)}")
+        print(f"   • Time range: {meta['time_range'][0] if meta['time_range'] else '-'} to "
+              f"{meta['time_range'][1] if meta['time_range'] else '-'}")
+        
+        return self.feature_matrix
+    
+    def _clean_feature_frame(self):
+        """Time-ordered rows with no missing feature or target values"""
+        self.df = self.df.sort_values('recorded_at').reset_index(drop=True)
+        return self.df[self.features + [self.target, 'recorded_at']].dropna(subset=self.features + [self.target])
+    
     def time_series_split(self, train_size=0.7, val_size=0.15, test_size=0.15):
         """
         Split data using time-series-aware sampling (no shuffling!)
@@ -140,25 +223,27 @@ class AQIPredictionPipeline:
         print("📊 TIME-SERIES AWARE DATA SPLITTING")
         print("="*80)
         
-        # Sort by time
-        self.df = self.df.sort_values('recorded_at').reset_index(drop=True)
-        
-        # Remove rows with missing values in features or target
-        feature_cols = self.features + [self.target]
-        df_clean = self.df[feature_cols].dropna()
-        
-        print(f"   • Original records: {len(self.df)}")
-        print(f"   • After removing NaN: {len(df_clean)}")
-        print(f"   • Dropped: {len(self.df) - len(df_clean)} rows")
+        if self.feature_matrix is not None:
+            # Already sorted and cleaned; slices below are views of the memmap
+            X, y = self.feature_matrix
+            print(f"   • Cached records: {len(X)}")
+        else:
+            # Sort by time and remove rows with missing values in features or target
+            df_clean = self._clean_feature_frame()
+            
+            print(f"   • Original records: {len(self.df)}")
+            print(f"   • After removing NaN: {len(df_clean)}")
+            print(f"   • Dropped: {len(self.df) - len(df_clean)} rows")
+            
+            X = df_clean[self.features]
+            y = df_clean[self.target]
         
         # Calculate split indices
-        n = len(df_clean)
+        n = len(X)
         train_idx = int(n * train_size)
         val_idx = int(n * (train_size + val_size))
         
         # Split data
-        X = df_clean[self.features]
-        y = df_clean[self.target]
         
         self.X_train = X[:train_idx]
         self.X_val = X[train_idx:val_idx]
@@ -8,21 +8,74 @@ import os
 import numpy as np
 import pandas as pd
 import psycopg2
-from datetime import datetime, timedelta
+from psycopg2.extras import execute_values
+from datetime import datetime
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import xgboost as xgb
+import json
 import pickle
 import logging
 from dotenv import load_dotenv
+from training_orchestrator import train_in_parallel
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# PM2.5 concentration (µg/m³) at each Indian NAQI breakpoint (the scale the
+# stored AQI uses), used to turn a predicted AQI back into PM2.5 for
+# recursive forecasting
+AQI_BREAKPOINTS = np.array([0, 50, 100, 200, 300, 400, 500])
+PM25_BREAKPOINTS = np.array([0.0, 30.0, 60.0, 90.0, 120.0, 250.0, 380.0])
+
+# Observed PM2.5 readings needed to seed the lag features (current + lag6)
+PM25_HISTORY_HOURS = 7
+
+
+# Estimators that use more than one thread (given a share of the CPU budget)
+PARALLEL_MODEL_TYPES = ('random_forest', 'xgboost')
+
+
+def build_model(model_type, n_jobs=-1):
+    """Untrained estimator for a model type"""
+    if model_type == 'linear':
+        return LinearRegression()
+    if model_type == 'random_forest':
+        return RandomForestRegressor(
+            n_estimators=100,
+            max_depth=15,
+            min_samples_split=5,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+    if model_type == 'xgboost':
+        return xgb.XGBRegressor(
+            n_estimators=100,
+            max_depth=6,
+            learning_rate=0.1,
+            random_state=42,
+            n_jobs=n_jobs
+        )
+    raise ValueError(f"Unknown model type: {model_type}")
+
+
+def fit_model_task(arrays, n_threads, model_type):
+    """Train and evaluate one model in a worker process on shared, pre-scaled arrays"""
+    model = build_model(model_type, n_jobs=n_threads)
+    model.fit(arrays['X_train_scaled'], arrays['y_train'])
+    predictions = model.predict(arrays['X_test_scaled'])
+    
+    return model, {
+        'mae': float(mean_absolute_error(arrays['y_test'], predictions)),
+        'rmse': float(np.sqrt(mean_squared_error(arrays['y_test'], predictions))),
+        'r2': float(r2_score(arrays['y_test'], predictions)),
+        'model_type': model_type
+    }
+
 
 class AQIPredictionEngine:
     """ML-based prediction engine for AQI forecasting"""
@@ -77,25 +130,39 @@ class AQIPredictionEngine:
             return pd.DataFrame()
     
     def engineer_features(self, df):
-        """Create time-based and lag features"""
+        """
+        Create time-based and lag features.
+        
+        Rows are expected in time order within each city. Lags and rolling
+        means for all cities are computed in one grouped pass: shifts via
+        groupby().shift and windows via per-city cumulative sums.
+        """
         # Time features
-        df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
-        df['day_of_week'] = pd.to_datetime(df['timestamp']).dt.dayofweek
-        df['month'] = pd.to_datetime(df['timestamp']).dt.month
+        timestamps = pd.to_datetime(df['timestamp'])
+        df['hour'] = timestamps.dt.hour
+        df['day_of_week'] = timestamps.dt.dayofweek
+        df['month'] = timestamps.dt.month
+        
+        # Integer group codes are cheaper to group by than city names
+        city_codes = pd.factorize(df['city'])[0]
+        pm25 = df['pm25'].astype(float)
+        by_city = pm25.groupby(city_codes, sort=False)
         
         # Lag features for each city
-        for city in df['city'].unique():
-            city_mask = df['city'] == city
-            df.loc[city_mask, 'pm25_lag1'] = df.loc[city_mask, 'pm25'].shift(1)
-            df.loc[city_mask, 'pm25_lag3'] = df.loc[city_mask, 'pm25'].shift(3)
-            df.loc[city_mask, 'pm25_lag6'] = df.loc[city_mask, 'pm25'].shift(6)
-            
-            # Rolling averages
-            df.loc[city_mask, 'pm25_rolling_mean_3h'] = df.loc[city_mask, 'pm25'].rolling(window=3, min_periods=1).mean()
-            df.loc[city_mask, 'pm25_rolling_mean_6h'] = df.loc[city_mask, 'pm25'].rolling(window=6, min_periods=1).mean()
+        for lag in (1, 3, 6):
+            df[f'pm25_lag{lag}'] = by_city.shift(lag).to_numpy()
+        
+        # Rolling averages (min_periods=1, NaN-skipping): window sum and count
+        # from per-city running totals minus the totals `window` rows earlier
+        running_sum = pm25.fillna(0.0).groupby(city_codes, sort=False).cumsum()
+        running_count = pm25.notna().astype(np.int64).groupby(city_codes, sort=False).cumsum()
+        for window in (3, 6):
+            window_sum = running_sum - running_sum.groupby(city_codes, sort=False).shift(window, fill_value=0.0)
+            window_count = running_count - running_count.groupby(city_codes, sort=False).shift(window, fill_value=0)
+            df[f'pm25_rolling_mean_{window}h'] = (window_sum / window_count.where(window_count > 0)).to_numpy()
         
         # Fill NaN values
-        df = df.fillna(method='bfill').fillna(method='ffill')
+        df = df.bfill().ffill()
         
         return df
     
@@ -115,29 +182,8 @@ class AQIPredictionEngine:
     
     def train_model(self, X_train, y_train):
         """Train the selected ML model"""
-        if self.model_type == 'linear':
-            self.model = LinearRegression()
-            logger.info("Training Linear Regression model...")
-            
-        elif self.model_type == 'random_forest':
-            self.model = RandomForestRegressor(
-                n_estimators=100,
-                max_depth=15,
-                min_samples_split=5,
-                random_state=42,
-                n_jobs=-1
-            )
-            logger.info("Training Random Forest model...")
-            
-        elif self.model_type == 'xgboost':
-            self.model = xgb.XGBRegressor(
-                n_estimators=100,
-                max_depth=6,
-                learning_rate=0.1,
-                random_state=42,
-                n_jobs=-1
-            )
-            logger.info("Training XGBoost model...")
+        self.model = build_model(self.model_type)
+        logger.info(f"Training {self.model_type} model...")
         
         # Scale features
         X_train_scaled = self.scaler.fit_transform(X_train)
@@ -167,8 +213,8 @@ class AQIPredictionEngine:
             'model_type': self.model_type
         }
     
-    def save_model(self, metrics, filepath='models/'):
-        """Save trained model and scaler"""
+    def save_model(self, metrics, filepath='models/', write_metrics=True):
+        """Save trained model and scaler (and metrics.json unless write_metrics=False)"""
         os.makedirs(filepath, exist_ok=True)
         
         model_file = f"{filepath}aqi_model_{self.model_type}.pkl"
@@ -182,9 +228,9 @@ class AQIPredictionEngine:
             pickle.dump(self.scaler, f)
         
         # Save metrics
-        import json
-        with open(metrics_file, 'w') as f:
-            json.dump(metrics, f, indent=2)
+        if write_metrics:
+            with open(metrics_file, 'w') as f:
+                json.dump(metrics, f, indent=2)
         
         logger.info(f"Model saved to {model_file}")
         logger.info(f"Scaler saved to {scaler_file}")
@@ -202,64 +248,141 @@ class AQIPredictionEngine:
         
         logger.info(f"Model loaded from {model_file}")
     
-    def predict_future(self, city, hours_ahead=48):
+    def fetch_recent_data(self, cities=None, hours=24):
+        """
+        Fetch the latest `hours` readings of every city in one query, oldest
+        first. `cities=None` means every city that reported in that window.
+        """
+        conn = self.get_db_connection()
+        
+        city_filter = "AND city = ANY(%(cities)s)" if cities is not None else ""
+        query = f"""
+            SELECT *
+            FROM (
+                SELECT 
+                    *,
+                    ROW_NUMBER() OVER (PARTITION BY city ORDER BY timestamp DESC) AS recency
+                FROM raw_air_quality_data
+                WHERE timestamp >= NOW() - %(hours)s * INTERVAL '1 hour'
+                    {city_filter}
+            ) recent
+            WHERE recency <= %(hours)s
+            ORDER BY city, timestamp
+        """
+        
+        params = {'hours': hours, 'cities': list(cities) if cities is not None else None}
+        df = pd.read_sql_query(query, conn, params=params)
+        conn.close()
+        
+        return df.drop(columns=['recency'])
+    
+    def predict_future(self, city, hours_ahead=48, recursive=False):
         """Generate predictions for 1-48 hours ahead"""
+        return self.predict_future_batch([city], hours_ahead=hours_ahead, recursive=recursive)
+    
+    def predict_future_batch(self, cities=None, hours_ahead=48, recursive=False):
+        """
+        Generate 1-`hours_ahead` hour predictions for many cities at once
+        (`cities=None`: every city with readings in the last 24 hours).
+        
+        The whole horizon for every city is built as one feature matrix from
+        each city's latest engineered row, with only the time features
+        varying, and predicted in a single call. With `recursive`, each step
+        instead feeds the PM2.5 implied by the previous step's predicted AQI
+        back into the lag and rolling features: one model call per step,
+        covering all cities.
+        """
         try:
-            conn = self.get_db_connection()
-            
-            # Get latest data for the city
-            query = """
-                SELECT *
-                FROM raw_air_quality_data
-                WHERE city = %s
-                    AND timestamp >= NOW() - INTERVAL '24 hours'
-                ORDER BY timestamp DESC
-                LIMIT 24
-            """
-            
-            df = pd.read_sql_query(query, conn, params=(city,))
-            conn.close()
+            df = self.fetch_recent_data(cities)
             
+            found = set(df['city'])
+            for city in cities or []:
+                if city not in found:
+                    logger.warning(f"No recent data for {city}")
             if df.empty:
-                logger.warning(f"No recent data for {city}")
                 return []
             
             # Engineer features
             df = self.engineer_features(df)
             
-            predictions = []
-            last_timestamp = df['timestamp'].iloc[0]
+            latest = df.groupby('city', sort=True).tail(1)
+            city_names = latest['city'].to_numpy()
+            last_timestamps = pd.to_datetime(latest['timestamp']).to_numpy()
+            base = latest[self.feature_columns].to_numpy(dtype=float)
+            
+            # Prediction timestamps and their time features, shape (cities, hours)
+            steps = np.arange(1, hours_ahead + 1)
+            pred_timestamps = last_timestamps[:, None] + steps[None, :] * np.timedelta64(1, 'h')
+            pred_index = pd.DatetimeIndex(pred_timestamps.ravel())
+            time_features = {
+                'hour': pred_index.hour.to_numpy().reshape(pred_timestamps.shape),
+                'day_of_week': pred_index.dayofweek.to_numpy().reshape(pred_timestamps.shape),
+                'month': pred_index.month.to_numpy().reshape(pred_timestamps.shape)
+            }
+            col = {name: i for i, name in enumerate(self.feature_columns)}
             
-            # Generate predictions for each hour
-            for hour in range(1, hours_ahead + 1):
-                pred_timestamp = last_timestamp + timedelta(hours=hour)
-                
-                # Prepare features (using latest data)
-                features = df[self.feature_columns].iloc[0].copy()
-                features['hour'] = pred_timestamp.hour
-                features['day_of_week'] = pred_timestamp.dayofweek
-                features['month'] = pred_timestamp.month
-                
-                # Make prediction
-                X = np.array([features.values])
-                X_scaled = self.scaler.transform(X)
-                predicted_aqi = self.model.predict(X_scaled)[0]
-                
-                predictions.append({
+            if recursive:
+                predicted = self._predict_recursive(df, city_names, base, time_features, col, hours_ahead)
+            else:
+                X = np.repeat(base, hours_ahead, axis=0)
+                for name, values in time_features.items():
+                    X[:, col[name]] = values.ravel()
+                predicted = self.model.predict(self.scaler.transform(X)).reshape(len(city_names), hours_ahead)
+            
+            return [
+                {
                     'city': city,
-                    'timestamp': pred_timestamp,
-                    'predicted_aqi': float(predicted_aqi),
+                    'timestamp': timestamp,
+                    'predicted_aqi': aqi,
                     'hours_ahead': hour
-                })
-            
-            return predictions
+                }
+                for city, timestamps, row in zip(
+                    city_names,
+                    pred_index.to_pydatetime().reshape(pred_timestamps.shape),
+                    predicted.tolist()
+                )
+                for hour, timestamp, aqi in zip(steps.tolist(), timestamps, row)
+            ]
             
         except Exception as e:
-            logger.error(f"Prediction error for {city}: {e}")
+            logger.error(f"Prediction error for {', '.join(cities) if cities else 'all cities'}: {e}")
             return []
     
-    def store_predictions(self, predictions):
-        """Store predictions in database"""
+    def _predict_recursive(self, df, city_names, base, time_features, col, hours_ahead):
+        """Step through the horizon, feeding predicted PM2.5 back into the lag features"""
+        n_cities = len(city_names)
+        history = PM25_HISTORY_HOURS
+        
+        # PM2.5 series per city: the last `history` observations, then predictions
+        series = np.full((n_cities, history + hours_ahead), np.nan)
+        recency = df.groupby('city').cumcount(ascending=False).to_numpy()
+        recent = recency < history
+        rows = pd.Index(city_names).get_indexer(df['city'][recent])
+        series[rows, history - 1 - recency[recent]] = df['pm25'].to_numpy(dtype=float)[recent]
+        # Cities with a shorter history repeat their oldest reading
+        series[:, :history] = pd.DataFrame(series[:, :history]).bfill(axis=1).to_numpy()
+        
+        X = base.copy()
+        predicted = np.empty((n_cities, hours_ahead))
+        for step in range(hours_ahead):
+            now = history + step  # column the current step predicts into
+            
+            X[:, col['pm25']] = series[:, now - 1]
+            X[:, col['pm25_lag1']] = series[:, now - 2]
+            X[:, col['pm25_lag3']] = series[:, now - 4]
+            X[:, col['pm25_lag6']] = series[:, now - 7]
+            X[:, col['pm25_rolling_mean_3h']] = series[:, now - 3:now].mean(axis=1)
+            X[:, col['pm25_rolling_mean_6h']] = series[:, now - 6:now].mean(axis=1)
+            for name, values in time_features.items():
+                X[:, col[name]] = values[:, step]
+            
+            predicted[:, step] = self.model.predict(self.scaler.transform(X))
+            series[:, now] = np.interp(predicted[:, step], AQI_BREAKPOINTS, PM25_BREAKPOINTS)
+        
+        return predicted
+    
+    def store_predictions(self, predictions, page_size=1000):
+        """Upsert predictions into the database with batched INSERTs"""
         try:
             conn = self.get_db_connection()
             cursor = conn.cursor()
@@ -267,22 +390,28 @@ class AQIPredictionEngine:
             insert_query = """
                 INSERT INTO aqi_predictions 
                 (city, prediction_timestamp, predicted_aqi, hours_ahead, model_type, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (city, prediction_timestamp) 
+                VALUES %s
+                ON CONFLICT (city, prediction_timestamp, model_type) 
                 DO UPDATE SET 
                     predicted_aqi = EXCLUDED.predicted_aqi,
+                    hours_ahead = EXCLUDED.hours_ahead,
                     updated_at = NOW()
             """
             
-            for pred in predictions:
-                cursor.execute(insert_query, (
+            created_at = datetime.now()
+            values = [
+                (
                     pred['city'],
                     pred['timestamp'],
                     pred['predicted_aqi'],
                     pred['hours_ahead'],
                     self.model_type,
-                    datetime.now()
-                ))
+                    created_at
+                )
+                for pred in predictions
+            ]
+            
+            execute_values(cursor, insert_query, values, page_size=page_size)
             
             conn.commit()
             cursor.close()
@@ -293,6 +422,68 @@ class AQIPredictionEngine:
         except Exception as e:
             logger.error(f"Error storing predictions: {e}")
     
+    def forecast_all_cities(self, hours_ahead=48, recursive=False):
+        """Predict and store the forecast horizon for every city reporting data"""
+        predictions = self.predict_future_batch(None, hours_ahead=hours_ahead, recursive=recursive)
+        if predictions:
+            self.store_predictions(predictions)
+        
+        cities = sorted({pred['city'] for pred in predictions})
+        logger.info(f"Forecast {hours_ahead}h ahead for {len(cities)} cities: {', '.join(cities)}")
+        return predictions
+    
+    def train_all_models(self, model_types=('xgboost', 'random_forest', 'linear'), days=30, filepath='models/'):
+        """
+        Retrain several model types from one fetch of the training data.
+        Models train in parallel worker processes under TRAINING_CPU_BUDGET;
+        metrics.json gets one entry per model with wall time and peak RSS.
+        """
+        logger.info("\n" + "="*60)
+        logger.info("PARALLEL RETRAINING STARTED")
+        logger.info("="*60)
+        
+        df = self.fetch_training_data(days=days)
+        if len(df) < 100:
+            logger.warning("Insufficient data for retraining. Need at least 100 records.")
+            return {}
+        
+        X, y = self.prepare_data(df)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+        
+        # The scaler does not depend on the model, so it is fitted once
+        arrays = {
+            'X_train_scaled': self.scaler.fit_transform(X_train),
+            'X_test_scaled': self.scaler.transform(X_test),
+            'y_train': y_train.to_numpy(dtype=np.float64),
+            'y_test': y_test.to_numpy(dtype=np.float64)
+        }
+        tasks = {
+            model_type: (fit_model_task, model_type in PARALLEL_MODEL_TYPES, {'model_type': model_type})
+            for model_type in model_types
+        }
+        
+        all_metrics = {}
+        for model_type, (model, metrics) in train_in_parallel(arrays, tasks).items():
+            engine = AQIPredictionEngine(model_type=model_type)
+            engine.model = model
+            engine.scaler = self.scaler
+            engine.save_model(metrics, filepath=filepath, write_metrics=False)
+            all_metrics[model_type] = metrics
+            logger.info(f"{model_type}: RMSE {metrics['rmse']:.2f}, R² {metrics['r2']:.4f}")
+        
+        if all_metrics:
+            os.makedirs(filepath, exist_ok=True)
+            with open(f"{filepath}metrics.json", 'w') as f:
+                json.dump(all_metrics, f, indent=2)
+        
+        logger.info("="*60)
+        logger.info(f"PARALLEL RETRAINING COMPLETED ({len(all_metrics)}/{len(tasks)} models)")
+        logger.info("="*60 + "\n")
+        
+        return all_metrics
+    
     def auto_retrain(self, retrain_threshold_days=7):
         """Automatically retrain model with new data"""
         logger.info("\n" + "="*60)
@@ -348,10 +539,9 @@ if __name__ == "__main__":
         
         # Generate predictions for all cities
         cities = ['Delhi', 'Mumbai', 'Bangalore', 'Chennai', 'Kolkata']
-        for city in cities:
-            logger.info(f"\nGenerating 48-hour predictions for {city}...")
-            predictions = engine.predict_future(city, hours_ahead=48)
-            engine.store_predictions(predictions)
+        logger.info(f"\nGenerating 48-hour predictions for {', '.join(cities)}...")
+        predictions = engine.predict_future_batch(cities, hours_ahead=48)
+        engine.store_predictions(predictions)
         
         logger.info("\nPrediction engine ready!")
     else:
@@ -10,6 +10,7 @@ import os
 from datetime import datetime
 from dotenv import load_dotenv
 import time
+from async_fetcher import stream_paginated_records
 
 load_dotenv()
 
@@ -81,41 +82,31 @@ class MultiSourceAirQualityCollector:
     
     # ==================== CPCB DATA COLLECTION ====================
     
-    def fetch_cpcb_data(self, limit=1000):
-        """Fetch data from CPCB API"""
+    def fetch_cpcb_data(self, page_size=1000, max_parallel=4):
+        """Stream every CPCB record, downloading pages concurrently"""
         endpoint = "https://api.data.gov.in/resource/3b01bcb8-0b14-4abf-b6f2-c1bfd384ba69"
         params = {
             'api-key': self.cpcb_api_key,
-            'format': 'json',
-            'limit': limit,
-            'offset': 0
+            'format': 'json'
         }
         
-        try:
-            print("📡 Fetching CPCB data...")
-            response = requests.get(endpoint, params=params, timeout=30)
-            if response.status_code == 200:
-                data = response.json()
-                print(f"✓ CPCB: Fetched {len(data.get('records', []))} records")
-                return data
-            else:
-                print(f"✗ CPCB API error: {response.status_code}")
-                return None
-        except Exception as e:
-            print(f"✗ CPCB fetch error: {e}")
-            return None
+        print("📡 Fetching CPCB data...")
+        return stream_paginated_records(
+            'cpcb', endpoint, params,
+            page_size=page_size, max_parallel=max_parallel, timeout=30
+        )
     
-    def parse_cpcb_data(self, api_data):
-        """Parse and store CPCB data"""
-        if not api_data or 'records' not in api_data:
-            return 0, 0
+    def parse_cpcb_data(self, records):
+        """Parse and store CPCB records as they stream in"""
+        if isinstance(records, dict):
+            records = records.get('records') or []
         
         cursor = self.db_conn.cursor()
         stations_added = 0
         data_points_added = 0
         stations_seen = set()
         
-        for record in api_data['records']:
+        for record in records:
             try:
                 station_name = record.get('station', 'Unknown')
                 city = record.get('city', '')
@@ -467,12 +458,13 @@ class MultiSourceAirQualityCollector:
         total_data = 0
         
         # Collect CPCB data
-        cpcb_data = self.fetch_cpcb_data(1000)
-        if cpcb_data:
-            s, d = self.parse_cpcb_data(cpcb_data)
+        try:
+            s, d = self.parse_cpcb_data(self.fetch_cpcb_data())
             print(f"  ✓ CPCB: {s} stations, {d} data points")
             total_stations += s
             total_data += d
+        except Exception as e:
+            print(f"✗ CPCB fetch error: {e}")
         
         print()
         
@@ -5,6 +5,7 @@ Stores in PostgreSQL for ML training and predictions
 """
 
 import os
+import sys
 import requests
 import psycopg2
 from psycopg2.extras import execute_values
@@ -12,6 +13,10 @@ from datetime import datetime, timedelta
 import logging
 import time
 from dotenv import load_dotenv
+from async_fetcher import fetch_all
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'database'))
+from db_manager import notify_data_changed
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -45,112 +50,133 @@ class MultiSourceDataCollector:
         """Get PostgreSQL connection"""
         return psycopg2.connect(self.db_url)
     
+    def openweather_request(self, lat, lon):
+        """Build the OpenWeather air pollution request"""
+        url = "http://api.openweathermap.org/data/2.5/air_pollution"
+        params = {
+            'lat': lat,
+            'lon': lon,
+            'appid': self.openweather_api_key
+        }
+        return url, params
+    
+    def parse_openweather_data(self, city, lat, lon, data):
+        """Parse an OpenWeather air pollution response"""
+        if 'list' in data and len(data['list']) > 0:
+            pollution = data['list'][0]
+            components = pollution['components']
+            
+            return {
+                'source': 'openweather',
+                'city': city,
+                'latitude': lat,
+                'longitude': lon,
+                'aqi': pollution['main']['aqi'],
+                'pm25': components.get('pm2_5'),
+                'pm10': components.get('pm10'),
+                'no2': components.get('no2'),
+                'so2': components.get('so2'),
+                'co': components.get('co'),
+                'o3': components.get('o3'),
+                'nh3': components.get('nh3'),
+                'timestamp': datetime.utcfromtimestamp(pollution['dt'])
+            }
+        
+        return None
+    
     def fetch_openweather_data(self, city, lat, lon):
         """Fetch air pollution data from OpenWeather API"""
         try:
-            url = f"http://api.openweathermap.org/data/2.5/air_pollution"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': self.openweather_api_key
-            }
+            url, params = self.openweather_request(lat, lon)
             
             response = requests.get(url, params=params, timeout=10)
             response.raise_for_status()
-            data = response.json()
-            
-            if 'list' in data and len(data['list']) > 0:
-                pollution = data['list'][0]
-                components = pollution['components']
-                
-                return {
-                    'source': 'openweather',
-                    'city': city,
-                    'latitude': lat,
-                    'longitude': lon,
-                    'aqi': pollution['main']['aqi'],
-                    'pm25': components.get('pm2_5'),
-                    'pm10': components.get('pm10'),
-                    'no2': components.get('no2'),
-                    'so2': components.get('so2'),
-                    'co': components.get('co'),
-                    'o3': components.get('o3'),
-                    'nh3': components.get('nh3'),
-                    'timestamp': datetime.utcfromtimestamp(pollution['dt'])
-                }
-            
-            return None
+            return self.parse_openweather_data(city, lat, lon, response.json())
             
         except Exception as e:
             logger.error(f"OpenWeather API error for {city}: {e}")
             return None
     
+    def iqair_request(self, lat, lon):
+        """Build the IQAir nearest-city request"""
+        url = "http://api.airvisual.com/v2/nearest_city"
+        params = {
+            'lat': lat,
+            'lon': lon,
+            'key': self.iqair_api_key
+        }
+        return url, params
+    
+    def parse_iqair_data(self, city, lat, lon, data):
+        """Parse an IQAir nearest-city response"""
+        if data['status'] == 'success':
+            current = data['data']['current']['pollution']
+            
+            return {
+                'source': 'iqair',
+                'city': city,
+                'latitude': lat,
+                'longitude': lon,
+                'aqi': current['aqius'],
+                'pm25': current.get('p2', {}).get('conc'),
+                'timestamp': datetime.strptime(current['ts'], '%Y-%m-%dT%H:%M:%S.%fZ')
+            }
+        
+        return None
+    
     def fetch_iqair_data(self, city, lat, lon):
         """Fetch air quality data from IQAir API"""
         try:
-            url = "http://api.airvisual.com/v2/nearest_city"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'key': self.iqair_api_key
-            }
+            url, params = self.iqair_request(lat, lon)
             
             response = requests.get(url, params=params, timeout=10)
             response.raise_for_status()
-            data = response.json()
-            
-            if data['status'] == 'success':
-                current = data['data']['current']['pollution']
-                
-                return {
-                    'source': 'iqair',
-                    'city': city,
-                    'latitude': lat,
-                    'longitude': lon,
-                    'aqi': current['aqius'],
-                    'pm25': current.get('p2', {}).get('conc'),
-                    'timestamp': datetime.strptime(current['ts'], '%Y-%m-%dT%H:%M:%S.%fZ')
-                }
-            
-            return None
+            return self.parse_iqair_data(city, lat, lon, response.json())
             
         except Exception as e:
             logger.error(f"IQAir API error for {city}: {e}")
             return None
     
+    def cpcb_request(self, city):
+        """Build the CPCB request for a city's latest record"""
+        # CPCB API endpoint (you'll need to register for actual API key)
+        url = "https://api.data.gov.in/resource/3b01bcb8-0b14-4abf-b6f2-c1bfd384ba69"
+        params = {
+            'api-key': self.cpcb_api_key,
+            'format': 'json',
+            'filters[city]': city,
+            'limit': 1
+        }
+        return url, params
+    
+    def parse_cpcb_data(self, city, data):
+        """Parse a CPCB response"""
+        if 'records' in data and len(data['records']) > 0:
+            record = data['records'][0]
+            
+            return {
+                'source': 'cpcb',
+                'city': city,
+                'station_name': record.get('station'),
+                'pm25': float(record.get('pm2_5', 0)) if record.get('pm2_5') else None,
+                'pm10': float(record.get('pm10', 0)) if record.get('pm10') else None,
+                'no2': float(record.get('no2', 0)) if record.get('no2') else None,
+                'so2': float(record.get('so2', 0)) if record.get('so2') else None,
+                'co': float(record.get('co', 0)) if record.get('co') else None,
+                'o3': float(record.get('o3', 0)) if record.get('o3') else None,
+                'timestamp': datetime.now()
+            }
+        
+        return None
+    
     def fetch_cpcb_data(self, city):
         """Fetch data from CPCB (Central Pollution Control Board)"""
         try:
-            # CPCB API endpoint (you'll need to register for actual API key)
-            url = "https://api.data.gov.in/resource/3b01bcb8-0b14-4abf-b6f2-c1bfd384ba69"
-            params = {
-                'api-key': self.cpcb_api_key,
-                'format': 'json',
-                'filters[city]': city,
-                'limit': 1
-            }
+            url, params = self.cpcb_request(city)
             
             response = requests.get(url, params=params, timeout=15)
             response.raise_for_status()
-            data = response.json()
-            
-            if 'records' in data and len(data['records']) > 0:
-                record = data['records'][0]
-                
-                return {
-                    'source': 'cpcb',
-                    'city': city,
-                    'station_name': record.get('station'),
-                    'pm25': float(record.get('pm2_5', 0)) if record.get('pm2_5') else None,
-                    'pm10': float(record.get('pm10', 0)) if record.get('pm10') else None,
-                    'no2': float(record.get('no2', 0)) if record.get('no2') else None,
-                    'so2': float(record.get('so2', 0)) if record.get('so2') else None,
-                    'co': float(record.get('co', 0)) if record.get('co') else None,
-                    'o3': float(record.get('o3', 0)) if record.get('o3') else None,
-                    'timestamp': datetime.now()
-                }
-            
-            return None
+            return self.parse_cpcb_data(city, response.json())
             
         except Exception as e:
             logger.error(f"CPCB API error for {city}: {e}")
@@ -213,6 +239,7 @@ class MultiSourceDataCollector:
             ]
             
             execute_values(cursor, insert_query, values)
+            notify_data_changed(cursor, 'raw_air_quality_data')
             conn.commit()
             
             logger.info(f"Stored {len(values)} records in database")
@@ -224,35 +251,45 @@ class MultiSourceDataCollector:
             logger.error(f"Database error: {e}")
     
     def collect_all_sources(self):
-        """Collect data from all sources for all cities"""
+        """Collect data from all sources for all cities concurrently"""
+        requests_batch = []
+        for city, coords in self.cities.items():
+            if self.openweather_api_key:
+                url, params = self.openweather_request(coords['lat'], coords['lon'])
+                requests_batch.append(((city, 'openweather'), 'openweather', url, params))
+            if self.iqair_api_key:
+                url, params = self.iqair_request(coords['lat'], coords['lon'])
+                requests_batch.append(((city, 'iqair'), 'iqair', url, params))
+            if self.cpcb_api_key:
+                url, params = self.cpcb_request(city)
+                requests_batch.append(((city, 'cpcb'), 'cpcb', url, params))
+        
+        # Provider limits and backoff replace the old fixed per-city sleep
+        results = fetch_all(requests_batch)
+        
         all_data = []
         
         for city, coords in self.cities.items():
             logger.info(f"Collecting data for {city}...")
             
-            # Fetch from OpenWeather
-            if self.openweather_api_key:
-                ow_data = self.fetch_openweather_data(city, coords['lat'], coords['lon'])
-                if ow_data:
-                    all_data.append(ow_data)
-                    logger.info(f"  ✓ OpenWeather: AQI={ow_data.get('aqi')}, PM2.5={ow_data.get('pm25')}")
-            
-            # Fetch from IQAir
-            if self.iqair_api_key:
-                iq_data = self.fetch_iqair_data(city, coords['lat'], coords['lon'])
-                if iq_data:
-                    all_data.append(iq_data)
-                    logger.info(f"  ✓ IQAir: AQI={iq_data.get('aqi')}, PM2.5={iq_data.get('pm25')}")
-            
-            # Fetch from CPCB
-            if self.cpcb_api_key:
-                cpcb_data = self.fetch_cpcb_data(city)
-                if cpcb_data:
-                    all_data.append(cpcb_data)
-                    logger.info(f"  ✓ CPCB: PM2.5={cpcb_data.get('pm25')}, PM10={cpcb_data.get('pm10')}")
+            parsers = {
+                'openweather': lambda data: self.parse_openweather_data(city, coords['lat'], coords['lon'], data),
+                'iqair': lambda data: self.parse_iqair_data(city, coords['lat'], coords['lon'], data),
+                'cpcb': lambda data: self.parse_cpcb_data(city, data)
+            }
             
-            # Rate limiting
-            time.sleep(1)
+            for source, parse in parsers.items():
+                status, data = results.get((city, source), (None, None))
+                if data is None:
+                    continue
+                try:
+                    record = parse(data)
+                except Exception as e:
+                    logger.error(f"{source} parse error for {city}: {e}")
+                    continue
+                if record:
+                    all_data.append(record)
+                    logger.info(f"  ✓ {source}: AQI={record.get('aqi')}, PM2.5={record.get('pm25')}")
         
         return all_data
     
@@ -0,0 +1,194 @@
+"""
+Tests for the async fetch engine against a local stub HTTP server
+"""
+
+import asyncio
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from async_fetcher import AsyncFetchEngine, iter_pages
+
+
+async def _serve(handler):
+    app = web.Application()
+    app.router.add_get('/data', handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrency_limit_per_provider():
+    state = {'in_flight': 0, 'peak': 0}
+
+    async def handler(request):
+        state['in_flight'] += 1
+        state['peak'] = max(state['peak'], state['in_flight'])
+        await asyncio.sleep(0.05)
+        state['in_flight'] -= 1
+        return web.json_response({'ok': True})
+
+    async def scenario():
+        server = await _serve(handler)
+        try:
+            limits = {'stub': {'concurrency': 3, 'rate': 1000.0, 'burst': 1000}}
+            async with AsyncFetchEngine(limits) as engine:
+                results = await asyncio.gather(*(
+                    engine.get_json('stub', str(server.make_url('/data')))
+                    for _ in range(12)
+                ))
+        finally:
+            await server.close()
+        return results
+
+    results = _run(scenario())
+    assert all(status == 200 for status, _ in results)
+    assert state['peak'] == 3
+
+
+def test_token_bucket_paces_requests():
+    async def handler(request):
+        return web.json_response({'ok': True})
+
+    async def scenario():
+        server = await _serve(handler)
+        try:
+            # Burst of 2, then 20 req/s: 6 requests need ~4 refills (~0.2s)
+            limits = {'stub': {'concurrency': 10, 'rate': 20.0, 'burst': 2}}
+            async with AsyncFetchEngine(limits) as engine:
+                start = time.monotonic()
+                await asyncio.gather(*(
+                    engine.get_json('stub', str(server.make_url('/data')))
+                    for _ in range(6)
+                ))
+                return time.monotonic() - start
+        finally:
+            await server.close()
+
+    elapsed = _run(scenario())
+    assert elapsed >= 0.18
+
+
+def test_retries_on_retryable_statuses_with_retry_after():
+    calls = []
+
+    async def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return web.Response(status=429, headers={'Retry-After': '0.3'})
+        if len(calls) == 2:
+            return web.Response(status=503)
+        return web.json_response({'value': 42})
+
+    async def scenario():
+        server = await _serve(handler)
+        try:
+            async with AsyncFetchEngine(max_retries=3, backoff_base=0.01) as engine:
+                return await engine.get_json('stub', str(server.make_url('/data')))
+        finally:
+            await server.close()
+
+    status, data = _run(scenario())
+    assert (status, data) == (200, {'value': 42})
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 0.28
+
+
+def test_non_retryable_status_is_returned_immediately():
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        return web.Response(status=404)
+
+    async def scenario():
+        server = await _serve(handler)
+        try:
+            async with AsyncFetchEngine(backoff_base=0.01) as engine:
+                return await engine.get_json('stub', str(server.make_url('/data')))
+        finally:
+            await server.close()
+
+    assert _run(scenario()) == (404, None)
+    assert len(calls) == 1
+
+
+def test_slow_endpoint_times_out_with_session_default():
+    async def handler(request):
+        await asyncio.sleep(5)
+        return web.json_response({'late': True})
+
+    async def scenario():
+        server = await _serve(handler)
+        try:
+            async with AsyncFetchEngine(timeout=0.2, max_retries=1, backoff_base=0.01) as engine:
+                start = time.monotonic()
+                result = await engine.get_json('stub', str(server.make_url('/data')))
+                return result, time.monotonic() - start
+        finally:
+            await server.close()
+
+    result, elapsed = _run(scenario())
+    assert result == (None, None)
+    assert elapsed < 2
+
+
+def test_per_call_timeout_overrides_session_default():
+    async def handler(request):
+        await asyncio.sleep(0.3)
+        return web.json_response({'ok': True})
+
+    async def scenario():
+        server = await _serve(handler)
+        try:
+            async with AsyncFetchEngine(timeout=0.1, max_retries=0) as engine:
+                return await engine.get_json('stub', str(server.make_url('/data')), timeout=2)
+        finally:
+            await server.close()
+
+    assert _run(scenario()) == (200, {'ok': True})
+
+
+def _paged_handler(n_records, with_total):
+    async def handler(request):
+        offset, limit = int(request.query['offset']), int(request.query['limit'])
+        body = {'records': list(range(offset, min(offset + limit, n_records)))}
+        if with_total:
+            body['total'] = str(n_records)
+        return web.json_response(body)
+    return handler
+
+
+def _collect_pages(handler, page_size):
+    async def scenario():
+        server = await _serve(handler)
+        try:
+            async with AsyncFetchEngine() as engine:
+                return [record
+                        async for page in iter_pages(engine, 'stub', str(server.make_url('/data')),
+                                                     page_size=page_size)
+                        for record in page]
+        finally:
+            await server.close()
+
+    return _run(scenario())
+
+
+def test_iter_pages_fetches_every_page_from_total():
+    records = _collect_pages(_paged_handler(25, with_total=True), page_size=10)
+    assert sorted(records) == list(range(25))
+
+
+def test_iter_pages_without_total_pages_until_short_page():
+    records = _collect_pages(_paged_handler(25, with_total=False), page_size=10)
+    assert records == list(range(25))
+
+
+def test_iter_pages_without_total_stops_on_empty_page():
+    records = _collect_pages(_paged_handler(20, with_total=False), page_size=10)
+    assert records == list(range(20))
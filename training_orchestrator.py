@@ -0,0 +1,146 @@
+"""
+Parallel multi-model training under a CPU budget
+Training arrays are copied once into shared memory and mapped by every worker
+process; each model trains in its own process with a thread allowance so
+n_jobs=-1 style estimators do not oversubscribe the machine. Wall time and
+peak RSS are reported per model.
+"""
+
+import os
+import sys
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+from threadpoolctl import threadpool_limits
+
+logger = logging.getLogger(__name__)
+
+TRAINING_CPU_BUDGET = int(os.getenv('TRAINING_CPU_BUDGET', '0')) or (os.cpu_count() or 1)
+
+
+class SharedArrays:
+    """
+    Context manager that places named NumPy arrays in shared memory.
+    `specs` is a small picklable description that workers pass to
+    attach_shared_arrays to map the same buffers without copying.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.blocks = []
+        self.specs = {}
+
+    def __enter__(self):
+        for name, array in self.arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self.blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+        return self
+
+    def __exit__(self, *exc):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def attach_shared_arrays(specs):
+    """Map shared arrays by spec; returns (arrays, blocks) - keep blocks open while arrays are used"""
+    arrays, blocks = {}, []
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return arrays, blocks
+
+
+def allocate_threads(tasks, budget=None):
+    """
+    Split a CPU budget across tasks.
+    tasks: {name: parallel} where parallel says whether the estimator can use
+    more than one thread. Single-threaded tasks get one CPU each; the rest of
+    the budget is shared evenly between parallel tasks (at least one each).
+    Returns (max_workers, {name: threads}).
+    """
+    budget = max(1, budget or TRAINING_CPU_BUDGET)
+    max_workers = min(len(tasks), budget)
+    serial = [name for name, parallel in tasks.items() if not parallel]
+    parallel = [name for name, is_parallel in tasks.items() if is_parallel]
+
+    threads = {name: 1 for name in serial}
+    spare = budget - min(len(serial), max_workers)
+    for name in parallel:
+        threads[name] = max(1, spare // max(1, len(parallel)))
+    return max_workers, threads
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where unsupported"""
+    try:
+        import resource  # POSIX only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def _run_task(name, fit_fn, specs, n_threads, kwargs):
+    """Worker entry point: map the shared arrays, train under the thread limit, measure"""
+    arrays, blocks = attach_shared_arrays(specs)
+    try:
+        start = time.perf_counter()
+        with threadpool_limits(limits=n_threads):
+            model, metrics = fit_fn(arrays, n_threads, **kwargs)
+        metrics = dict(metrics)
+        metrics['wall_time_seconds'] = round(time.perf_counter() - start, 3)
+        metrics['peak_rss_mb'] = _peak_rss_mb()
+        metrics['threads'] = n_threads
+        return name, model, metrics
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+
+
+def train_in_parallel(arrays, tasks, budget=None):
+    """
+    Train several models concurrently.
+
+    arrays: {name: ndarray} shared with every task (copied into shared memory once)
+    tasks: {name: (fit_fn, parallel, kwargs)} where fit_fn is a module-level
+           function fit_fn(arrays, n_threads, **kwargs) -> (model, metrics)
+
+    Returns {name: (model, metrics)}; failed tasks are logged and left out.
+    """
+    max_workers, threads = allocate_threads({name: task[1] for name, task in tasks.items()}, budget)
+    logger.info(f"Training {len(tasks)} models on {max_workers} workers "
+                f"(CPU budget {budget or TRAINING_CPU_BUDGET}, threads {threads})")
+
+    results = {}
+    with SharedArrays(arrays) as shared:
+        # Fresh process per model so peak RSS is per model
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 max_tasks_per_child=1) as pool:
+            futures = {
+                pool.submit(_run_task, name, fit_fn, shared.specs, threads[name], kwargs): name
+                for name, (fit_fn, _, kwargs) in tasks.items()
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    _, model, metrics = future.result()
+                    results[name] = (model, metrics)
+                    logger.info(f"{name} trained in {metrics['wall_time_seconds']:.1f}s "
+                                f"(peak RSS {metrics['peak_rss_mb']} MB, {metrics['threads']} threads)")
+                except Exception as e:
+                    logger.error(f"Error training {name}: {e}")
+
+    return results